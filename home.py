@@ -25,6 +25,7 @@ st.write("- Processes labor invoice data and Consolidated WSR files.")
 st.write("- Allows users to input date ranges for contractors on the invoice.")
 st.write("- Calculates total hours, contract rates, and cost checks for contractors.")
 st.write("- Presents processed invoice data for review and analysis.")
+st.write("- Reviews the TO29 and TO32 invoices together against one WSR and Onboarding Tracker on the Batch Invoice Review page.")
 
 st.markdown("---")
 
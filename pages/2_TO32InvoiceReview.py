@@ -1,13 +1,23 @@
-import pandas as pd
+import time
+
 import streamlit as st
-from datetime import datetime, timedelta
-from io import BytesIO
-import base64
+from datetime import timedelta
 from openpyxl import Workbook
 import pyxlsb
 
-import matplotlib.pyplot as plt
-import seaborn as sns
+from utils.charts import chart_png, invoice_chart_stats
+from utils.exports import EXCEL_MIME, excel_export
+from utils.ingestion import load_onboarding_tracker, load_raw_invoice, load_wsr_consolidated
+from utils.instrumentation import append_stage_log
+from utils.jobs import JOB_POLL_SECONDS, JobCancelled
+from utils.loaders import parsed_frame_cache
+from utils.matching import DEFAULT_MIN_MATCH_SCORE, NameMatchIndex
+from utils.memory import memory_report
+from utils.onboarding import DUPLICATE_POLICIES, DuplicateCandidateError, build_onboarding_lookup
+from utils.reconciliation import DEFAULT_HOURS_TOLERANCE, HIGH_CONTRACT_RATE, WSR_NAME_COLUMN, WsrIndex, flag_misalignment, parse_lookbacks, sweep_lookbacks
+from utils.snapshots import SnapshotStore
+from utils.stages import StagedPipeline, clear_stored_stages, parse_stages, parse_stored_stages
+from utils.task_orders import reconcile_invoice, review_workbook, summary_statistics
 
 # Set the page configuration for the Streamlit application, including the title and icon.
 st.set_page_config(
@@ -83,48 +93,6 @@ def check_password():
 if check_password():
     is_logged_in = True
 
-    start_time = datetime.now()
-    
-    # Function that allows you to find where the header is located within an Excel sheet
-
-    @st.cache_data()
-    def find_start_row(file_path, column_name, sheet_name=None):
-        """
-        Find the starting row index containing a specific column name in an Excel sheet.
-
-        Parameters:
-        - file_path (str): The file path of the Excel file to be searched.
-        - column_name (str): The name of the column to search for within the sheet.
-        - sheet_name (str, optional): The name of the sheet in the Excel file (default is None).
-            If sheet_name is not provided, the function attempts to read the first sheet.
-
-        Returns:
-        - int: The row index where the specified column name is found.
-
-        Raises:
-        - ValueError: If the specified column name is not found in the sheet.
-
-        This function reads the Excel file specified by 'file_path' and searches for the
-        row containing the 'column_name' in the specified 'sheet_name' (or the first sheet if
-        'sheet_name' is not provided). Once the row is found, the function returns its index.
-
-        If the column name is not found in the sheet, a ValueError is raised.
-
-        Example usage:
-        start_row = find_start_row("example.xlsx", "Name", "Sheet1")
-        """
-        if sheet_name is None:
-            # If sheet_name is not provided, try to read the first sheet
-            df = pd.read_excel(file_path, header=None, index_col=None)
-        else:
-            df = pd.read_excel(file_path, header=None, index_col=None, sheet_name=sheet_name)
-
-        for row_number, row in df.iterrows():
-            if column_name in row.values:
-                return row_number
-
-        raise ValueError(f'Column "{column_name}" not found in the sheet "{sheet_name}" of the file.')
-
     # Define a function to calculate the x-week lookback for a given date
     def calculate_x_week_lookback(effective_date, x):
         return effective_date - timedelta(weeks=x)
@@ -144,6 +112,7 @@ if check_password():
         st.write("You will be prompted to add the Weekly lookback period.")
         st.write("- Extracts relevant columns from both files.")
         st.write("- Normalizes employee names by removing middle initials.")
+        st.write("- Matches invoice names that are not in the WSR to the most similar WSR contractor name, if it scores at least the 'Name Match Score'.")
         st.write("- Filters employees who have 'Final Approval' in the Onboarding Tracker.")
         st.write("- Determines which employees are above the 'Tripwire Rate' in the Hourly Cost file.")
         st.write("- Maps 'PLC Desc' to 'Correct LCAT Syntax' using data from the Onboarding Tracker.")
@@ -152,7 +121,8 @@ if check_password():
         st.write("If you want to save the processed data to an Excel file, you can:")
         st.write("- Enter a name for the Excel file in the 'Enter Excel File Name (without extension)' text field.")
         st.write("- Click the 'Save Data to Excel' button.")
-        st.write("This will generate a download link for the Excel file. Click on the link to download the processed data.")
+        st.write("This will generate a download button for the Excel file. Click on it to download the processed data.")
+        st.write("The workbook has sheets for the reconciled data (flagged rows in red, high contract rates in yellow), the Total Hour Flags, the High Contract Rate Rows and the Summary Statistics.")
         st.write("The file will be saved to the Downloads folder by default.")
 
 
@@ -165,13 +135,39 @@ if check_password():
         st.session_state.onboarding_tracker = None
     if 'raw_invoice_copy' not in st.session_state:
         st.session_state.raw_invoice_copy = None
-    if 'wsr_consolidated_copy' not in st.session_state:
-        st.session_state.wsr_consolidated_copy = None
+    if 'derived_columns' not in st.session_state:
+        st.session_state.derived_columns = None
+    if 'reconciled_stage' not in st.session_state:
+        st.session_state.reconciled_stage = None
+    if 'chart_stats' not in st.session_state:
+        st.session_state.chart_stats = None
+    if 'to32_stages' not in st.session_state:
+        st.session_state.to32_stages = StagedPipeline()
+    if 'to32_job' not in st.session_state:
+        st.session_state.to32_job = None
     if 'x_week_lookback' not in st.session_state:
         st.session_state.x_week_lookback = 4
     if 'submit_button_pressed' not in st.session_state:
         st.session_state.submit_button_pressed = False
 
+    # Memoized parse, index, reconcile, flag, summarize and render stages of this page; each
+    # rerun only recomputes the stages whose inputs or settings changed
+    pipeline = st.session_state.to32_stages
+
+    # Measure the whole rerun alongside its stages
+    page_run = pipeline.recorder.start("page")
+
+    # Show the rows processed by a background job and its speed, with a button to cancel it
+    def show_job_progress(job, label):
+        rows_done, total_rows, rows_per_second = job.progress_info()
+        status = f"{label}: {rows_done:,} of {total_rows:,} rows ({rows_per_second:,.0f} rows/sec)" if job.running() else f"{label}: waiting for a free worker"
+        st.progress(min(rows_done / total_rows, 1.0) if total_rows else 0.0, text=status)
+        if st.button("Cancel"):
+            job.cancel()
+
+    # Local store of the parsed WSR history and Onboarding Tracker shared by all sessions
+    snapshot_store = SnapshotStore()
+
     # Upload files in Streamlit
     st.write('Please ensure the TO29 Invoice has the following columns')
     st.write('["Unique ID","Name","PLC Descripintion","Effective Bill Date","Sum of Transaction Hours"]')
@@ -179,40 +175,55 @@ if check_password():
     uploaded_wsr_consolidated = st.file_uploader("Upload WSR Consolidated Excel File", type=["xlsb"])
     uploaded_onboarding_tracker = st.file_uploader("Upload Onboarding Tracker Excel File", type=["xlsx"])
 
-    # Check if files are uploaded and load data if necessary
+    # Policy for Candidate Unique IDs that appear more than once in the Onboarding Tracker
+    duplicate_id_policy = st.sidebar.selectbox(
+        "Duplicate Candidate Unique IDs", DUPLICATE_POLICIES,
+        help="first: use the first row in the Master List. latest: use the row with the latest Vendor Submission Date. error: stop and list the duplicated IDs."
+    )
+
+    # Keep the parsed WSR history and Onboarding Tracker on disk so weekly uploads only add their new weeks
+    use_snapshot_store = st.sidebar.checkbox(
+        "Keep WSR and Onboarding history on disk",
+        help="Each new WSR upload is still read in full, but only its Reporting Weeks that are not stored yet are added, and the review runs against the full stored history. Files already stored are not read again."
+    )
+    if use_snapshot_store and st.sidebar.button("Clear Stored History"):
+        clear_stored_stages(pipeline, snapshot_store, ["wsr_consolidated", "onboarding_tracker"])
+
+    # Parse the new or changed uploads concurrently in worker processes and report each failed file on its own
+    uploads = {
+        "raw_invoice": (load_raw_invoice, uploaded_raw_invoice, "Raw Invoice"),
+        "wsr_consolidated": (load_wsr_consolidated, uploaded_wsr_consolidated, "WSR Consolidated"),
+        "onboarding_tracker": (load_onboarding_tracker, uploaded_onboarding_tracker, "Onboarding Tracker"),
+    }
+    stored_keys = {"wsr_consolidated": snapshot_store.append_wsr, "onboarding_tracker": snapshot_store.load_onboarding} if use_snapshot_store else {}
+    parsed, load_errors = parse_stages(pipeline, {key: (loader, file) for key, (loader, file, _) in uploads.items() if file and key not in stored_keys})
+    stored, stored_errors = parse_stored_stages(pipeline, {key: (load_from_store, uploads[key][1]) for key, load_from_store in stored_keys.items() if uploads[key][1]})
+    parsed.update(stored)
+    load_errors.update(stored_errors)
+    for key, stage in parsed.items():
+        st.session_state[key] = stage.value
+    for key, error in load_errors.items():
+        st.warning(f"An error occurred while processing the {uploads[key][2]} file ({error}). Please make sure you've uploaded the correct file.")
+
+    wsr_index = name_match_index = onboarding_lookup = None
     try:
-        if uploaded_raw_invoice:
-            # Use the find_start_row function to identify the header row in the raw_invoice Excel file
-            start_row_raw_invoice = find_start_row(uploaded_raw_invoice, "Unique ID")
-            # Read the Excel file, starting from the identified header row
-            st.session_state.raw_invoice = pd.read_excel(uploaded_raw_invoice, skiprows=range(start_row_raw_invoice))
-            st.session_state.raw_invoice["Name"] = st.session_state.raw_invoice["Name"].str.replace(r' [A-Z]\b', '', regex=True)
-            st.session_state.raw_invoice = st.session_state.raw_invoice[st.session_state.raw_invoice["Name"] != "Grand Total"]
-
-            # Check if the "Unnamed: 0" column exists
-            if "Unnamed: 0" in st.session_state.raw_invoice.columns:
-                # Drop the "Unnamed: 0" column
-                st.session_state.raw_invoice = st.session_state.raw_invoice.drop("Unnamed: 0", axis=1)  
-
-        if uploaded_wsr_consolidated:
-            # Use the find_start_row function to identify the header row in the WSR Consolidated Excel file
-            start_row_wsr_consolidated = find_start_row(uploaded_wsr_consolidated, "Vendor Name", "Invoice Review")
-            # Read the Excel file, starting from the identified header row in the "Invoice Review" sheet
-            st.session_state.wsr_consolidated = pd.read_excel(uploaded_wsr_consolidated, skiprows=range(start_row_wsr_consolidated), sheet_name="Invoice Review")
-            st.session_state.wsr_consolidated['Reporting Week (MM/DD/YYYY)'] = pd.to_datetime(st.session_state.wsr_consolidated['Reporting Week (MM/DD/YYYY)'], unit='D', origin='1899-12-30')
-            st.session_state.wsr_consolidated["Contractor (Last Name, First Name)2"] = st.session_state.wsr_consolidated["Contractor (Last Name, First Name)2"].str.replace(r' [A-Z]\b', '', regex=True)
-            st.session_state.wsr_consolidated = st.session_state.wsr_consolidated.ffill()
-            st.session_state.wsr_consolidated = st.session_state.wsr_consolidated[st.session_state.wsr_consolidated["Vendor Name"] != "Grand Total"]
-
-        if uploaded_onboarding_tracker:
-            # Use the find_start_row function to identify the header row in the Onboarding Tracker Excel file
-            start_row_onboarding_tracker = find_start_row(uploaded_onboarding_tracker, "Candidate Unique ID", "Master List")
-            # Read the Excel file, starting from the identified header row in the "Master List" sheet
-            st.session_state.onboarding_tracker = pd.read_excel(uploaded_onboarding_tracker, skiprows=range(start_row_onboarding_tracker), sheet_name="Master List")
-            st.session_state.onboarding_tracker["Candidate Name"] = st.session_state.onboarding_tracker["Candidate Name"].str.replace(r' [A-Z]\b', '', regex=True)
+        if "wsr_consolidated" in parsed:
+            # Build the WSR lookback and name match indexes only when the parsed WSR changed, so changing the lookback only re-runs the lookups
+            wsr_index = pipeline.run("index WSR", WsrIndex, parsed["wsr_consolidated"])
+            name_match_index = pipeline.run("index WSR names", lambda wsr: NameMatchIndex(wsr[WSR_NAME_COLUMN]), parsed["wsr_consolidated"])
+
+        if "onboarding_tracker" in parsed:
+            # Build the Candidate Unique ID lookup only when the parsed tracker or the duplicate policy changed
+            onboarding_lookup = pipeline.run("index Onboarding", build_onboarding_lookup, parsed["onboarding_tracker"], duplicates=duplicate_id_policy)
+    except DuplicateCandidateError as e:
+        st.error(str(e))
     except Exception as e:
         st.warning("An error occurred while processing the uploaded files. Please make sure you've uploaded the correct files.")
 
+    # Report how often uploads were served from the parsed workbook cache shared by all sessions
+    cache_stats = parsed_frame_cache.stats()
+    st.sidebar.caption(f"Parsed file cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+
     # Display the initial DataFrame (First)
     if st.session_state.raw_invoice is not None:
         st.write(st.session_state.raw_invoice)
@@ -220,73 +231,62 @@ if check_password():
     # Input field for the number of weeks lookback
     x_week_lookback = st.sidebar.number_input("Number of Weeks Lookback", min_value=1, value=st.session_state.x_week_lookback)
 
-    # "Submit" button
-    if st.sidebar.button("Submit"):
-        if st.session_state.raw_invoice_copy is None:
-            st.session_state.raw_invoice_copy = st.session_state.raw_invoice.copy()
-            st.session_state.wsr_consolidated_copy = st.session_state.wsr_consolidated.copy()
-
-        # Create a DataFrame to store misalignment flags
-        misalignment_flags = pd.DataFrame(columns=['Name', 'Misalignment'])
-
-        # Iterate through each row in the raw_invoice_copy dataset
-        for index, raw_invoice_row in st.session_state.raw_invoice_copy.iterrows():
+    # Optionally compare several lookbacks side by side in one pass
+    sweep_mode = st.sidebar.checkbox("Compare Several Lookbacks")
+    if sweep_mode:
+        sweep_weeks_text = st.sidebar.text_input("Lookback Weeks to Compare", "2, 4, 6, 8", help='Comma-separated weeks and ranges, for example "2, 4, 6-8".')
 
-            # Extract the Unique ID from the row
-            unique_id = raw_invoice_row['Unique ID']
+    # Input field for the largest hour difference that is still treated as aligned
+    hours_tolerance = st.sidebar.number_input("Hour Flag Tolerance", min_value=0.0, value=DEFAULT_HOURS_TOLERANCE, step=0.01)
 
-            # Extract the Name from the row
-            name = raw_invoice_row['Name']
+    # Input field for the smallest score at which an invoice name is matched to a similar WSR contractor name
+    min_match_score = st.sidebar.number_input(
+        "Name Match Score", min_value=0.0, max_value=1.0, value=DEFAULT_MIN_MATCH_SCORE, step=0.05,
+        help="Invoice names with no exact match in the WSR are matched to the most similar WSR contractor name if the similarity is at least this score (1.0 = same letters)."
+    )
 
-            # Look up the corresponding row in onboarding_tracker
-            onboarding_row = st.session_state.onboarding_tracker[
-                (st.session_state.onboarding_tracker['Candidate Unique ID'] == unique_id)
-            ]
-
-            # Create a row with relevant data
-            if not onboarding_row.empty:
-                vendor_values = onboarding_row['Vendor'].values
-                if len(vendor_values) > 0:
-                    st.session_state.raw_invoice_copy.at[index, 'Vendor'] = vendor_values[0]
-                # Add handling for the case when 'Vendor' values are NaN
-                else:
-                    st.session_state.raw_invoice_copy.at[index, 'Vendor'] = None
-                st.session_state.raw_invoice_copy.at[index, 'TO'] = onboarding_row['Task Order #'].values[0]
-                st.session_state.raw_invoice_copy.at[index, 'Onboard Date'] = onboarding_row['Vendor Submission Date'].values[0]
-                st.session_state.raw_invoice_copy.at[index, 'Onboard LCAT'] = onboarding_row['Candidate Proposed LCAT'].values[0]
-
-            # Extract the Effective Bill Date from the row
-            effective_date = raw_invoice_row['Effective Bill Date']
-
-            # Calculate the start date based on the effective date
-            start_date = effective_date - timedelta(weeks=x_week_lookback)
-
-            # Filter the WSR_consolidated_copy DataFrame for the specified date range
-            filtered_wsr = st.session_state.wsr_consolidated_copy[
-                (st.session_state.wsr_consolidated_copy['Contractor (Last Name, First Name)2'] == name) &
-                (st.session_state.wsr_consolidated_copy['Reporting Week (MM/DD/YYYY)'] >= start_date) &
-                (st.session_state.wsr_consolidated_copy['Reporting Week (MM/DD/YYYY)'] <= effective_date)  # End date is the effective date
-            ]
-
-            # Calculate the total hours for that person within the specified date range
-            total_hours = filtered_wsr['Sum of Time Spent (Hours) '].sum()
-
-            # Calculate Contract Rate: Sum of Cost Calc / Sum of Time Spent (Hours)
-            contract_rate = filtered_wsr['Sum of Cost Calc'].sum() / total_hours if total_hours > 0 else 0
-            contract_rate = round(contract_rate, 2)
-            cost_check = contract_rate * total_hours
-
-            st.session_state.raw_invoice_copy.at[index, 'WSR Hours'] = total_hours
-            st.session_state.raw_invoice_copy.at[index, 'Contract Rate'] = contract_rate
-            st.session_state.raw_invoice_copy.at[index, 'Cost Check'] = cost_check
-
-            # Check for misalignment between 'Sum of Transaction Hours' and 'WSR' columns
-            misalignment = "Flagged" if raw_invoice_row['Sum of Transaction Hours'] != total_hours else "Aligned"
-            # misalignment_flags = misalignment_flags.append(pd.DataFrame({'Name': [name], 'Misalignment': [misalignment]}), ignore_index=True)
-
-            # misalignment_flags = pd.DataFrame(columns=['Name', 'Misalignment'])
-            misalignment_flags = pd.concat([misalignment_flags, pd.DataFrame({'Name': [name], 'Misalignment': [misalignment]})], ignore_index=True)
+    # "Submit" button
+    submitted = st.sidebar.button("Submit")
+    if submitted and ("raw_invoice" not in parsed or wsr_index is None or onboarding_lookup is None):
+        st.warning("Please upload the raw invoice, the WSR Consolidated file and the Onboarding Tracker.")
+    elif submitted:
+        # Enrich from the onboarding lookup and reconcile against the WSR in the background on the job pool shared
+        # by all sessions, unless the invoice, indexes and settings are unchanged. A new Submit replaces a running job.
+        # The flags are left to the "flag" stage below, so they are computed once and follow the tolerance
+        if st.session_state.to32_job is not None:
+            st.session_state.to32_job.cancel()
+        st.session_state.to32_job = pipeline.submit(
+            "reconcile", reconcile_invoice, parsed["raw_invoice"], 'Sum of Transaction Hours', wsr_index, onboarding_lookup, x_week_lookback,
+            tolerance=None, total_rows=len(parsed["raw_invoice"].value), match_index=name_match_index, min_match_score=min_match_score
+        )
 
+    # Follow the reconciliation job: show its progress while it runs and keep its result once it finishes
+    job = st.session_state.to32_job
+    if job is not None and not job.done():
+        show_job_progress(job, "Reconciling")
+    elif job is not None:
+        st.session_state.to32_job = None
+        try:
+            st.session_state.reconciled_stage = job.result()
+        except JobCancelled:
+            st.info("The reconciliation was cancelled.")
+        except Exception as e:
+            st.warning(f"An error occurred while reconciling the invoice ({e}). Please make sure you've uploaded the correct files.")
+
+    # Flag, summarize and display the last reconciliation on every rerun; the stages below only recompute
+    # when their inputs change, so changing the tolerance re-flags without a new Submit
+    reconciled = st.session_state.reconciled_stage
+    if reconciled is not None:
+        result = reconciled.value
+        st.session_state.derived_columns = result.derived_columns
+        st.session_state.raw_invoice_copy = result.invoice
+
+        # Flag misaligned hours; changing only the tolerance re-runs this stage and not the reconciliation
+        misalignment_flags = pipeline.run("flag", lambda result, tolerance: flag_misalignment(result.invoice, 'Sum of Transaction Hours', tolerance), reconciled, hours_tolerance).value
+        name_match_review = result.name_match_review
+
+        # Bin the WSR Hours and Contract Rate once; the charts are drawn from these statistics on every rerun
+        st.session_state.chart_stats = pipeline.run("summarize charts", lambda result: invoice_chart_stats(result.invoice), reconciled)
 
         # Display the updated DataFrame in Streamlit
         st.write(st.session_state.raw_invoice_copy)
@@ -296,17 +296,41 @@ if check_password():
         # st.write(misalignment_flags)
         st.write(misalignment_flags[misalignment_flags['Misalignment'] == 'Flagged'])
 
+        # Display the WSR Hours, Contract Rate and flag of every compared lookback in one wide table
+        if sweep_mode:
+            try:
+                lookback_sweep = pipeline.run(
+                    "reconcile lookback sweep", sweep_lookbacks, parsed["raw_invoice"], wsr_index, parse_lookbacks(sweep_weeks_text),
+                    'Sum of Transaction Hours', hours_tolerance, result.name_matches
+                ).value
+                st.info("Lookback Comparison (Best Lookback is the window closest to the invoiced hours):")
+                st.dataframe(lookback_sweep)
+            except ValueError as e:
+                st.warning(f"Please check the lookback weeks to compare ({e}).")
+
+        # Display the suggested name matches so they can be reviewed
+        if not name_match_review.empty:
+            st.info("Invoice Names Matched to WSR Contractors (only accepted matches are used):")
+            st.dataframe(name_match_review, hide_index=True)
+
+    # Show the memory held by this session's frames and what compacting them saved
+    with st.sidebar.expander("Session Memory"):
+        st.dataframe(memory_report({
+            "Raw Invoice": st.session_state.raw_invoice,
+            "WSR Consolidated": st.session_state.wsr_consolidated,
+            "Onboarding Tracker": st.session_state.onboarding_tracker,
+            "Reconciled Columns": st.session_state.derived_columns,
+        }), hide_index=True)
+
 
     # Allow the user to select visualizations to display
     visualizations_to_display = st.sidebar.radio("Select Insights to Display", ["Summary Statistics", "Distribution of Total Hours", "Unique Effective Bill Dates", "Total Hours vs. Contract Rate", "High Contract Rate Rows", "Distribution of Contract Rates"])
 
     # Display selected visualizations
-    @st.cache_resource()
-    def calculate_summary_statistics(dataframe):
-        return dataframe[['Sum of Transaction Hours', 'WSR Hours', 'Contract Rate', 'Cost Check']].describe()
-
     if visualizations_to_display == "Summary Statistics" and st.session_state.raw_invoice_copy is not None:
-        summary_stats = calculate_summary_statistics(st.session_state.raw_invoice_copy)
+        summary_stats = pipeline.run(
+            "summarize statistics", lambda result: summary_statistics(result.invoice, 'Sum of Transaction Hours'), st.session_state.reconciled_stage
+        ).value
         st.write("Summary Statistics:")
         st.write(summary_stats)
 
@@ -315,9 +339,8 @@ if check_password():
         # Create columns to indirectly resize the visualization
         col1, col2 = st.columns(2)
         with col1:
-            fig, ax = plt.subplots()
-            sns.histplot(st.session_state.raw_invoice_copy['WSR Hours'], kde=True, ax=ax)
-            st.pyplot(fig)
+            # Drawn once per distinct data, then served from the chart cache on every rerun
+            st.image(pipeline.run("render wsr_hours_histogram", chart_png, "wsr_hours_histogram", st.session_state.chart_stats).value, use_column_width=True)
 
     if visualizations_to_display == "Unique Effective Bill Dates" and st.session_state.raw_invoice_copy is not None:
         st.write("Unique Effective Bill Dates:")
@@ -329,17 +352,11 @@ if check_password():
         # Create columns to indirectly resize the visualization
         col1, col2 = st.columns(2)
         with col1:             
-            scatter_plot_data = st.session_state.raw_invoice_copy[['WSR Hours', 'Contract Rate']]
-        # Vectorized approach
-            # scatter_plot_data = st.session_state.raw_invoice_copy.loc[:, ['WSR Hours', 'Contract Rate']]
-
-            fig, ax = plt.subplots()
-            sns.scatterplot(x='WSR Hours', y='Contract Rate', data=scatter_plot_data, ax=ax)
-            st.pyplot(fig)
+            st.image(pipeline.run("render hours_vs_rate_scatter", lambda result: chart_png("hours_vs_rate_scatter", result.invoice), st.session_state.reconciled_stage).value, use_column_width=True)
 
     if visualizations_to_display == "High Contract Rate Rows" and st.session_state.raw_invoice_copy is not None:
 
-        high_rate_rows = st.session_state.raw_invoice_copy[st.session_state.raw_invoice_copy['Contract Rate'] > 187.50]
+        high_rate_rows = st.session_state.raw_invoice_copy[st.session_state.raw_invoice_copy['Contract Rate'] > HIGH_CONTRACT_RATE]
     # Vectorized approach
         # high_rate_rows = st.session_state.raw_invoice_copy.query('Contract Rate > 187.50')
 
@@ -351,13 +368,7 @@ if check_password():
         # Create columns to indirectly resize the visualization
         col1, col2 = st.columns(2)
         with col1: 
-            fig, ax = plt.subplots()
-
-            sns.boxplot(x=st.session_state.raw_invoice_copy['Contract Rate'], ax=ax)
-        # Vectorized approach    
-            # sns.boxplot(x='Contract Rate', data=st.session_state.raw_invoice_copy, ax=ax)
-
-            st.pyplot(fig)    
+            st.image(pipeline.run("render contract_rate_box", chart_png, "contract_rate_box", st.session_state.chart_stats).value, use_column_width=True)
 
     # Input field for Excel file name
     excel_filename = st.text_input("Enter Excel File Name (without extension)", "InvoiceReview")
@@ -365,18 +376,28 @@ if check_password():
 
     # Save to Excel button
     if st.button('Save Data to Excel') and st.session_state.raw_invoice_copy is not None:
-        # Save the filtered dataframe to an Excel file in memory
-        excel_buffer = BytesIO()
-        st.session_state.raw_invoice_copy.to_excel(excel_buffer, index=False)
-        excel_data = excel_buffer.getvalue()
-
-        # Generate a download link for the Excel file
-        b64 = base64.b64encode(excel_data).decode('utf-8')
-        excel_filename = f"{excel_filename}.xlsx"
-        href = f'<a href="data:application/vnd.openxmlformats-officedocument.spreadsheetml.sheet;base64,{b64}" download="{excel_filename}">Download Excel File</a>'
-        st.markdown(href, unsafe_allow_html=True)
-
-    end_time = datetime.now()
-    elapsed_time = end_time - start_time
-
-    st.write(f"Elapsed Time: {elapsed_time}")
\ No newline at end of file
+        # Write the reconciled data, Total Hour Flags, High Contract Rate Rows and Summary Statistics sheets
+        # in one constant-memory pass; the bytes are reused while the data does not change
+        excel_data = pipeline.run(
+            "export", lambda result, tolerance: excel_export(*review_workbook(result.invoice, 'Sum of Transaction Hours', tolerance)),
+            st.session_state.reconciled_stage, hours_tolerance
+        ).value
+
+        # Offer the Excel file through a download button
+        st.download_button("Download Excel File", excel_data, file_name=f"{excel_filename}.xlsx", mime=EXCEL_MIME)
+
+    # Show the wall time, CPU time, peak memory growth and rows of each stage this rerun computed or reused,
+    # and append the computed ones to the stage log for trend analysis
+    pipeline.recorder.finish(page_run)
+    stage_metrics = pipeline.report()
+    with st.sidebar.expander("Stage Timings"):
+        st.dataframe(stage_metrics, hide_index=True)
+    try:
+        append_stage_log(stage_metrics, "TO32 Invoice Review")
+    except OSError as e:
+        st.sidebar.caption(f"The stage log could not be written ({e}).")
+
+    # Refresh the page until the reconciliation job finishes, so its progress stays live
+    if job is not None and not job.done():
+        time.sleep(JOB_POLL_SECONDS)
+        st.experimental_rerun()
\ No newline at end of file
@@ -1,13 +1,14 @@
-import os
-import pandas as pd
+import time
 import streamlit as st
 from openpyxl import Workbook
-import base64
-from io import BytesIO
-from datetime import datetime, timedelta
 
-import matplotlib.pyplot as plt
-import seaborn as sns
+from utils.charts import chart_png, tripwire_chart_stats
+from utils.exports import EXCEL_MIME, excel_export
+from utils.instrumentation import append_stage_log
+from utils.jobs import JOB_POLL_SECONDS, JobCancelled, submit_job
+from utils.loaders import parsed_frame_cache
+from utils.stages import StagedPipeline, fingerprint
+from utils.tripwire import load_tripwire_inputs, review_tripwire
 
 # Set the page configuration for the Streamlit application, including the title and icon.
 st.set_page_config(
@@ -62,91 +63,43 @@ def check_password():
 # Check the user password using the check_password() function and sets the is_logged_in flag to True if the password is correct.
 if check_password():
     is_logged_in = True
-    
-    start_time = datetime.now()
-
-    # Function that allows you to find where the header is located within an Excel sheet
-    @st.cache_data()
-    def find_start_row(file_path, column_name, sheet_name=None):
-        """
-        Find the starting row index containing a specific column name in an Excel sheet.
-
-        Parameters:
-        - file_path (str): The file path of the Excel file to be searched.
-        - column_name (str): The name of the column to search for within the sheet.
-        - sheet_name (str, optional): The name of the sheet in the Excel file (default is None).
-            If sheet_name is not provided, the function attempts to read the first sheet.
-
-        Returns:
-        - int: The row index where the specified column name is found.
-
-        Raises:
-        - ValueError: If the specified column name is not found in the sheet.
-
-        This function reads the Excel file specified by 'file_path' and searches for the
-        row containing the 'column_name' in the specified 'sheet_name' (or the first sheet if
-        'sheet_name' is not provided). Once the row is found, the function returns its index.
-
-        If the column name is not found in the sheet, a ValueError is raised.
-
-        Example usage:
-        start_row = find_start_row("example.xlsx", "Name", "Sheet1")
-        """
-        if sheet_name is None:
-            # If sheet_name is not provided, try to read the first sheet
-            df = pd.read_excel(file_path, header=None, index_col=None)
-        else:
-            df = pd.read_excel(file_path, header=None, index_col=None, sheet_name=sheet_name)
-
-        for row_number, row in df.iterrows():
-            if column_name in row.values:
-                return row_number
-
-        raise ValueError(f'Column "{column_name}" not found in the sheet "{sheet_name}" of the file.')
-
-    # Function to generate histogram visualization
-    @st.cache_resource()
-    def generate_histogram(data):
-        fig_histogram, ax_histogram = plt.subplots()
-        sns.histplot(data["Hourly Cost $/hr"], bins=20, kde=True, ax=ax_histogram)
-        ax_histogram.set_title("Hourly Cost Distribution")
-        ax_histogram.set_xlabel("Hourly Cost $/hr")
-        ax_histogram.set_ylabel("Count")
-        st.pyplot(fig_histogram)
-
-    # Function to generate box plot visualization
-    @st.cache_resource()
-    def generate_box_plot(data):
-        fig_box_plot, ax_box_plot = plt.subplots()
-        sns.boxplot(x="Above Tripwire Rate?", y="Hourly Cost $/hr", data=data, ax=ax_box_plot)
-        ax_box_plot.set_title("Hourly Cost Distribution for Employees Above Tripwire Rate")
-        ax_box_plot.set_xlabel("Above Tripwire Rate")
-        ax_box_plot.set_ylabel("Hourly Cost $/hr")
-        st.pyplot(fig_box_plot)
-
-    # Function to generate pair plot visualization
-    @st.cache_resource()
-    def generate_pair_plot(data):
-        fig_pair_plot = sns.pairplot(data, hue="Above Tripwire Rate?")
-        fig_pair_plot.fig.suptitle("Hourly Cost Relationships", y=1.02)
-        st.pyplot(fig_pair_plot)
-
-    # Function to generate pie chart visualization
-    @st.cache_resource()
-    def generate_pie_chart(data):
-        fig_pie_chart, ax_pie_chart = plt.subplots()
-        data["Above Tripwire Rate?"].value_counts().plot.pie(autopct='%1.1f%%', ax=ax_pie_chart)
-        ax_pie_chart.set_title("Proportion of Employees Above Tripwire Rate")
-        st.pyplot(fig_pie_chart)
-
-    # Function to generate box plot for hourly cost distribution by correct LCAT syntax
-    @st.cache_resource()
-    def generate_box_plot_lcat(data):
-        fig_box_plot_lcat, ax_box_plot_lcat = plt.subplots(figsize=(12, 6))
-        sns.boxplot(x="Correct LCAT Syntax", y="Hourly Cost $/hr", data=data, ax=ax_box_plot_lcat)
-        ax_box_plot_lcat.set_xticklabels(ax_box_plot_lcat.get_xticklabels(), rotation=45, ha="right")
-        ax_box_plot_lcat.set_title("Hourly Cost Distribution by Correct LCAT Syntax")
-        st.pyplot(fig_box_plot_lcat)
+
+    # Memoized parse, review, summarize and render stages of this page; each rerun only
+    # recomputes the stages whose inputs or settings changed
+    if 'tripwire_stages' not in st.session_state:
+        st.session_state.tripwire_stages = StagedPipeline()
+    if 'tripwire_job' not in st.session_state:
+        st.session_state.tripwire_job = None
+    pipeline = st.session_state.tripwire_stages
+
+    # Measure the whole rerun alongside its stages
+    page_run = pipeline.recorder.start("page")
+
+    # Parse the uploads and review them; runs as a background job on the job pool shared by all sessions
+    def review_uploads(tracker_file, hourly_cost_file, hourly_cost_sheet_name, progress):
+        # Read the Tripwire Tracker and LCAT Normalization sheets (opening the Onboarding Tracker once)
+        # and the Hourly Cost sheet from its header row containing "Name"; Cancel stops the job between the workbooks
+        inputs = pipeline.run(
+            "parse", lambda *files: load_tripwire_inputs(*files, progress=progress), tracker_file, hourly_cost_file, hourly_cost_sheet_name
+        )
+        progress(0, total_rows=len(inputs.value[1]))
+
+        # Normalize the names and LCATs and keep the candidates above the tripwire rate without approval
+        return pipeline.run("reconcile", lambda inputs: review_tripwire(*inputs, progress=progress), inputs)
+
+    # Show the rows processed by a background job and its speed, with a button to cancel it
+    def show_job_progress(job, label):
+        rows_done, total_rows, rows_per_second = job.progress_info()
+        status = f"{label}: {rows_done:,} of {total_rows:,} rows ({rows_per_second:,.0f} rows/sec)" if job.running() else f"{label}: waiting for a free worker"
+        st.progress(min(rows_done / total_rows, 1.0) if total_rows else 0.0, text=status)
+        if st.button("Cancel"):
+            job.cancel()
+
+    # Display a chart, drawing it only when its data changed since it was last drawn. Each chart
+    # type is its own stage, so switching charts keeps the others. The images are cached rather
+    # than the st.pyplot calls, so the chart appears on every rerun
+    def show_chart(chart_type, data):
+        st.image(pipeline.run(f"render {chart_type}", chart_png, chart_type, data).value, use_column_width=True)
 
 
     # Streamlit UI
@@ -173,7 +126,7 @@ if check_password():
         st.write("If you want to save the processed data to an Excel file, you can:")
         st.write("- Enter a name for the Excel file in the 'Enter Excel File Name (without extension)' text field.")
         st.write("- Click the 'Save Data to Excel' button.")
-        st.write("This will generate a download link for the Excel file. Click on the link to download the processed data.")
+        st.write("This will generate a download button for the Excel file. Click on it to download the processed data.")
         st.write("The file will be saved to the Downloads folder by default.")
 
     # Upload Onboarding Tracker Excel file
@@ -183,103 +136,68 @@ if check_password():
     # Specify the Hourly Cost sheet name for the provided file
     hourly_cost_sheet_name = st.text_input("Enter Hourly Cost Sheet Name:")
 
-    # Specify the Tripwire Tracker sheet name in the Onboarding Tracker
-    tracker_sheet_name = 'Tripwire Tracker'
-
     # Initialize the flag to indicate whether data is loaded
     data_loaded = False
+    job = None
 
     if tracker_file is not None and hourly_cost_file is not None:
         # Check if the user has provided a sheet name for hourly_cost_df
         if not hourly_cost_sheet_name:
             st.warning("Please enter the sheet name for the Hourly Cost Excel file.")
         else:
-            # Use the find_start_row function to find the header row containing the desired column names
-            tracker_header_row_index = find_start_row(tracker_file, "Candidate Name", tracker_sheet_name)
-
-            # Read the Excel file into a Pandas DataFrame
-            tracker_df = pd.read_excel(tracker_file, sheet_name=tracker_sheet_name, header=tracker_header_row_index)
-
-            # Use the find_start_row function to find the header row containing the desired column names
-            hourly_cost_header_row_index = find_start_row(hourly_cost_file, "Name", hourly_cost_sheet_name)
-
-            # Read the Excel file into a Pandas DataFrame, specifying the header row index
-            hourly_cost_df = pd.read_excel(hourly_cost_file, sheet_name=hourly_cost_sheet_name, header=hourly_cost_header_row_index)
-
-            try:
-                tracker_df.reset_index(drop=True, inplace=True)
-                tracker_df = tracker_df[["Candidate Name", "Final Approval"]]
-
-                hourly_cost_df.reset_index(drop=True, inplace=True)
-                hourly_cost_df = hourly_cost_df[["Unique ID", "Name", "PLC Desc", "Hourly Cost $/hr", "Above Tripwire Rate?"]]
-
-                # Convert the "Hourly Cost $/hr" column to numeric (if it's not already)
-                hourly_cost_df["Hourly Cost $/hr"] = pd.to_numeric(hourly_cost_df["Hourly Cost $/hr"], errors="coerce")
-
-                # Round the "Hourly Cost $/hr" column to two decimal places
-                hourly_cost_df["Hourly Cost $/hr"] = hourly_cost_df["Hourly Cost $/hr"].round(2)
-
-                # Read LCAT Normalization data from Onboarding Tracker
-                lcat_df = pd.read_excel(tracker_file, sheet_name='LCAT Normalization')
-                lcat_df = lcat_df[["Vendor LCATs", "Correct LCAT Syntax"]]
-
-                # Remove middle initials from names in both DataFrames
-                tracker_df["Candidate Name"] = tracker_df["Candidate Name"].str.replace(r' [A-Z]\b', '', regex=True)
-                hourly_cost_df["Name"] = hourly_cost_df["Name"].str.replace(r' [A-Z]\b', '', regex=True)
-
-                # Filter Data
-                filtered_tripwire_df = tracker_df[tracker_df["Final Approval"] == "Y"]
-                names_above_tripwire = hourly_cost_df[hourly_cost_df["Above Tripwire Rate?"] == "Yes"]["Name"]
-                names_allow_exceed_tripwire = filtered_tripwire_df[
-                    filtered_tripwire_df["Final Approval"] == "Y"]["Candidate Name"]
-                names_not_in_tripwire = names_above_tripwire[~names_above_tripwire.isin(names_allow_exceed_tripwire)]
-
-                # Remove newline characters from the "PLC Desc" column in hourly_cost_df
-                hourly_cost_df["PLC Desc"] = hourly_cost_df["PLC Desc"].str.strip()
-
-                # Create a dictionary to map "Vendor LCATs" to "Correct LCAT Syntax"
-                lcat_mapping = lcat_df.set_index("Vendor LCATs")["Correct LCAT Syntax"].to_dict()
-
-                # Map the "PLC Desc" column in hourly_cost_df to get corrected LCAT syntax
-                hourly_cost_df["Correct LCAT Syntax"] = hourly_cost_df["PLC Desc"].map(lcat_mapping)
-
-                # Filter again
-                filtered_hourly_cost_df = hourly_cost_df[hourly_cost_df["Unique ID"].isin(names_not_in_tripwire)]
-
-                # Output
-                result_df = filtered_hourly_cost_df[["Unique ID", "Name", "PLC Desc", "Correct LCAT Syntax", "Hourly Cost $/hr", "Above Tripwire Rate?"]]
-
-                # Display the resulting DataFrame
-                st.subheader("Candidates Exceeding Tripwire Without Approval")
-                st.dataframe(result_df)
-
-                # Set the flag to indicate that the data is loaded
-                data_loaded = True
-
-            except KeyError as e:
-                # Inform the user to check if any tripwires are flagged
-                st.error(f"Please check if any tripwires are flagged in the excel files.")              
+            # Start the review job only when an upload or the sheet name changed, replacing a job still running
+            job_key = (fingerprint(tracker_file), fingerprint(hourly_cost_file), hourly_cost_sheet_name)
+            if st.session_state.tripwire_job is None or st.session_state.tripwire_job[0] != job_key:
+                if st.session_state.tripwire_job is not None:
+                    st.session_state.tripwire_job[1].cancel()
+                st.session_state.tripwire_job = (job_key, submit_job(review_uploads, tracker_file, hourly_cost_file, hourly_cost_sheet_name))
+            job = st.session_state.tripwire_job[1]
+
+            # Report how often uploads were served from the parsed workbook cache shared by all sessions
+            cache_stats = parsed_frame_cache.stats()
+            st.sidebar.caption(f"Parsed file cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+
+            if not job.done():
+                show_job_progress(job, "Reviewing")
+            else:
+                try:
+                    reviewed = job.result()
+                    result_df, hourly_cost_df = reviewed.value
+
+                    # Display the resulting DataFrame
+                    st.subheader("Candidates Exceeding Tripwire Without Approval")
+                    st.dataframe(result_df)
+
+                    # Bin the Hourly Cost once for the histogram and box plots
+                    chart_stats = pipeline.run("summarize charts", lambda reviewed: tripwire_chart_stats(*reviewed), reviewed)
+
+                    # Set the flag to indicate that the data is loaded
+                    data_loaded = True
+
+                except JobCancelled:
+                    st.info("The review was cancelled.")
+                    if st.button("Run Review Again"):
+                        st.session_state.tripwire_job = None
+                        st.experimental_rerun()
+
+                except KeyError as e:
+                    # Inform the user to check if any tripwires are flagged
+                    st.error(f"Please check if any tripwires are flagged in the excel files.")
+
+                except Exception as e:
+                    # A missing sheet or header, or any other error raised while the job read the files
+                    st.warning(f"An error occurred while reviewing the files ({e}). Please make sure you've uploaded the correct files and Hourly Cost sheet name.")
 
         # Input field for Excel file name
         excel_filename = st.text_input("Enter Excel File Name (without extension)", "filtered_hourly_cost")
 
         # Save to Excel button
-        if st.button('Save Data to Excel'):
-            # Save the filtered dataframe to an Excel file in memory
-            excel_buffer = BytesIO()
-            result_df.to_excel(excel_buffer, index=False)
-            excel_data = excel_buffer.getvalue()
-
-            # Generate a download link for the Excel file
-            b64 = base64.b64encode(excel_data).decode('utf-8')
-            excel_filename = f"{excel_filename}.xlsx"
-            href = f'<a href="data:application/vnd.openxmlformats-officedocument.spreadsheetml.sheet;base64,{b64}" download="{excel_filename}">Download Excel File</a>'
-            st.markdown(href, unsafe_allow_html=True)
+        if st.button('Save Data to Excel') and data_loaded:
+            # Write the workbook in constant-memory mode; the bytes are reused while the data does not change
+            excel_data = pipeline.run("export", lambda reviewed: excel_export(reviewed[0]), reviewed).value
 
-    #     end_time = datetime.now()
-    #     elapsed_time = end_time - start_time
-
-    #     st.write(f"Elapsed Time: {elapsed_time}")
+            # Offer the Excel file through a download button
+            st.download_button("Download Excel File", excel_data, file_name=f"{excel_filename}.xlsx", mime=EXCEL_MIME)
 
 
     # Visualization Selection
@@ -301,27 +219,38 @@ if check_password():
                 if result_df.empty:
                     st.warning("No data available for Histogram visualization.")
                 else:
-                    generate_histogram(result_df)
+                    show_chart("hourly_cost_histogram", chart_stats)
             elif selected_visualization == "Box Plot: Hourly Cost Distribution for Employees":
                 if hourly_cost_df.empty:
                     st.warning("No data available for Box Plot visualization.")
                 else:
-                    generate_box_plot(hourly_cost_df)
+                    show_chart("tripwire_box", chart_stats)
             # elif selected_visualization == "Pair Plot: Hourly Cost Relationships":
-            #     generate_pair_plot(result_df)
-            #     # generate_pair_plot(hourly_cost_df)
+            #     show_chart("tripwire_pair", result_df)
+            #     # show_chart("tripwire_pair", hourly_cost_df)
             elif selected_visualization == "Pie Chart: Proportion of Employees Above Tripwire Rate":
                 if hourly_cost_df.empty:
                     st.warning("No data available for Pie Chart visualization.")
                 else:
-                    generate_pie_chart(hourly_cost_df)
+                    show_chart("tripwire_pie", hourly_cost_df)
             elif selected_visualization == "Box Plot: Hourly Cost Distribution by Correct LCAT Syntax":
                 if hourly_cost_df.empty:
                     st.warning("No data available for Box Plot (LCAT Syntax) visualization.")
                 else:
-                    generate_box_plot_lcat(hourly_cost_df)
-
-    end_time = datetime.now()
-    elapsed_time = end_time - start_time
-
-    st.write(f"Elapsed Time: {elapsed_time}")
+                    show_chart("lcat_box", chart_stats)
+
+    # Show the wall time, CPU time, peak memory growth and rows of each stage this rerun computed or reused,
+    # and append the computed ones to the stage log for trend analysis
+    pipeline.recorder.finish(page_run)
+    stage_metrics = pipeline.report()
+    with st.sidebar.expander("Stage Timings"):
+        st.dataframe(stage_metrics, hide_index=True)
+    try:
+        append_stage_log(stage_metrics, "Tripwire Tracker")
+    except OSError as e:
+        st.sidebar.caption(f"The stage log could not be written ({e}).")
+
+    # Refresh the page until the review job finishes, so its progress stays live
+    if job is not None and not job.done():
+        time.sleep(JOB_POLL_SECONDS)
+        st.experimental_rerun()
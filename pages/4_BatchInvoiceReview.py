@@ -0,0 +1,229 @@
+import time
+
+import streamlit as st
+
+from utils.ingestion import load_onboarding_tracker, load_raw_invoice, load_wsr_consolidated
+from utils.instrumentation import append_stage_log
+from utils.jobs import JOB_POLL_SECONDS, JobCancelled
+from utils.loaders import parsed_frame_cache
+from utils.matching import DEFAULT_MIN_MATCH_SCORE, NameMatchIndex
+from utils.onboarding import DUPLICATE_POLICIES, DuplicateCandidateError, build_onboarding_lookup
+from utils.reconciliation import DEFAULT_HOURS_TOLERANCE, WSR_NAME_COLUMN, WsrIndex
+from utils.stages import StagedPipeline, parse_stages
+from utils.task_orders import TASK_ORDER_PROFILES, reconcile_task_orders
+
+# Set the page configuration for the Streamlit application, including the title and icon.
+st.set_page_config(
+    page_title="Iberia Advisory Batch Invoice Review",
+    page_icon="📊",
+    layout="wide"
+)
+
+# Change text color, font name, and size
+st.markdown(
+    """
+    <style>
+        /* Text color: #084F58 (Navy Blue) */
+        p {
+            color: #084F58;
+        }
+        /* Font name: Arial, sans-serif */
+        p {
+            font-family: 'Arial', sans-serif;
+        }
+        /* Font size: 20 pixels */
+        p {
+            font-size: 20px;
+        }
+    </style>
+    """, unsafe_allow_html=True
+)
+
+# Display the Iberia Advisory image on the Streamlit application.
+st.image("./Images/iberia-logo.png")
+
+################
+# AUTHENICATION
+################
+
+# Define a function check_password() that handles user authentication.
+def check_password():
+    """Returns `True` if the user had a correct password."""
+
+    def password_entered():
+        """Checks whether a password entered by the user is correct."""
+        if (
+            st.session_state["username"] in st.secrets["passwords"]
+            and st.session_state["password"]
+            == st.secrets["passwords"][st.session_state["username"]]
+        ):
+            st.session_state["password_correct"] = True
+            del st.session_state["password"]  # don't store username + password
+            del st.session_state["username"]
+        else:
+            st.session_state["password_correct"] = False
+
+    if "password_correct" not in st.session_state:
+        # First run, show inputs for username + password.
+        st.text_input("Username", on_change=password_entered, key="username")
+        st.text_input(
+            "Password", type="password", on_change=password_entered, key="password"
+        )
+        return False
+    elif not st.session_state["password_correct"]:
+        # Password not correct, show input + error.
+        st.text_input("Username", on_change=password_entered, key="username")
+        st.text_input(
+            "Password", type="password", on_change=password_entered, key="password"
+        )
+        st.error("😕 User not known or password incorrect")
+        return False
+    else:
+        # Password correct.
+        return True
+    
+# Check the user password using the check_password() function and sets the is_logged_in flag to True if the password is correct.
+if check_password():
+    is_logged_in = True
+
+    # Define the Streamlit app
+    st.title("Batch Invoice Data Analysis")
+
+    # Sidebar instructions
+    if st.sidebar.checkbox("Show Instructions"):
+        st.write("This page reviews the invoices of several task orders at once against one WSR Consolidated file and one Onboarding Tracker.")
+        st.write("Upload the raw invoice of each task order to review, the WSR Consolidated file and the Onboarding Tracker.")
+        st.write("The WSR and Onboarding Tracker are parsed once and shared by every invoice; each invoice is read with the hours column of its task order.")
+        st.write("After clicking 'Submit', each task order gets its own tab with the reconciled invoice and its Total Hour Flags, and the flagged rows of all task orders are listed together below.")
+
+    # Initialize session state (prefixed so this page does not overwrite the single task order pages)
+    if 'batch_stages' not in st.session_state:
+        st.session_state.batch_stages = StagedPipeline()
+    if 'batch_job' not in st.session_state:
+        st.session_state.batch_job = None
+
+    # Memoized parse, index and reconcile stages of this page; each rerun only recomputes the
+    # stages whose inputs or settings changed
+    pipeline = st.session_state.batch_stages
+
+    # Measure the whole rerun alongside its stages
+    page_run = pipeline.recorder.start("page")
+
+    # Show the rows processed by a background job and its speed, with a button to cancel it
+    def show_job_progress(job, label):
+        rows_done, total_rows, rows_per_second = job.progress_info()
+        status = f"{label}: {rows_done:,} of {total_rows:,} rows ({rows_per_second:,.0f} rows/sec)" if job.running() else f"{label}: waiting for a free worker"
+        st.progress(min(rows_done / total_rows, 1.0) if total_rows else 0.0, text=status)
+        if st.button("Cancel"):
+            job.cancel()
+
+    # Upload one raw invoice per task order, plus the shared WSR and Onboarding Tracker
+    uploads = {}
+    for task_order, profile in TASK_ORDER_PROFILES.items():
+        uploaded_invoice = st.file_uploader(f"Upload {task_order} Raw Invoice Excel File (hours in '{profile['hours_column']}')", type=["xlsx"])
+        uploads[task_order] = (load_raw_invoice, uploaded_invoice, f"{task_order} Raw Invoice")
+    uploaded_wsr_consolidated = st.file_uploader("Upload WSR Consolidated Excel File", type=["xlsb"])
+    uploaded_onboarding_tracker = st.file_uploader("Upload Onboarding Tracker Excel File", type=["xlsx"])
+    uploads["wsr_consolidated"] = (load_wsr_consolidated, uploaded_wsr_consolidated, "WSR Consolidated")
+    uploads["onboarding_tracker"] = (load_onboarding_tracker, uploaded_onboarding_tracker, "Onboarding Tracker")
+
+    # Policy for Candidate Unique IDs that appear more than once in the Onboarding Tracker
+    duplicate_id_policy = st.sidebar.selectbox(
+        "Duplicate Candidate Unique IDs", DUPLICATE_POLICIES,
+        help="first: use the first row in the Master List. latest: use the row with the latest Vendor Submission Date. error: stop and list the duplicated IDs."
+    )
+
+    # Parse the new or changed uploads concurrently and report each failed file on its own
+    parsed, load_errors = parse_stages(pipeline, {key: (loader, file) for key, (loader, file, _) in uploads.items() if file})
+    for key, error in load_errors.items():
+        st.warning(f"An error occurred while processing the {uploads[key][2]} file ({error}). Please make sure you've uploaded the correct file.")
+
+    wsr_index = name_match_index = onboarding_lookup = None
+    try:
+        if "wsr_consolidated" in parsed:
+            # Build the WSR lookback and name match indexes only when the parsed WSR changed, for every task order
+            wsr_index = pipeline.run("index WSR", WsrIndex, parsed["wsr_consolidated"])
+            name_match_index = pipeline.run("index WSR names", lambda wsr: NameMatchIndex(wsr[WSR_NAME_COLUMN]), parsed["wsr_consolidated"])
+
+        if "onboarding_tracker" in parsed:
+            # Build the Candidate Unique ID lookup only when the parsed tracker or the duplicate policy changed
+            onboarding_lookup = pipeline.run("index Onboarding", build_onboarding_lookup, parsed["onboarding_tracker"], duplicates=duplicate_id_policy)
+    except DuplicateCandidateError as e:
+        st.error(str(e))
+    except Exception as e:
+        st.warning("An error occurred while processing the uploaded files. Please make sure you've uploaded the correct files.")
+
+    # Report how often uploads were served from the parsed workbook cache shared by all sessions
+    cache_stats = parsed_frame_cache.stats()
+    st.sidebar.caption(f"Parsed file cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+
+    # Input fields shared by every task order
+    x_week_lookback = st.sidebar.number_input("Number of Weeks Lookback", min_value=1, value=4)
+    hours_tolerance = st.sidebar.number_input("Hour Flag Tolerance", min_value=0.0, value=DEFAULT_HOURS_TOLERANCE, step=0.01)
+    min_match_score = st.sidebar.number_input(
+        "Name Match Score", min_value=0.0, max_value=1.0, value=DEFAULT_MIN_MATCH_SCORE, step=0.05,
+        help="Invoice names with no exact match in the WSR are matched to the most similar WSR contractor name if the similarity is at least this score (1.0 = same letters)."
+    )
+
+    # "Submit" button
+    if st.sidebar.button("Submit"):
+        raw_invoices = {task_order: parsed[task_order] for task_order in TASK_ORDER_PROFILES if task_order in parsed}
+        if not raw_invoices or wsr_index is None or onboarding_lookup is None:
+            st.warning("Please upload at least one raw invoice, the WSR Consolidated file and the Onboarding Tracker.")
+        else:
+            # Reconcile every uploaded invoice against the same WSR index and onboarding lookup in the background on the
+            # job pool shared by all sessions, unless nothing changed since the last Submit. A new Submit replaces a running job
+            if st.session_state.batch_job is not None:
+                st.session_state.batch_job.cancel()
+            st.session_state.batch_job = pipeline.submit(
+                "reconcile", reconcile_task_orders, raw_invoices, wsr_index, onboarding_lookup,
+                x_week_lookback, hours_tolerance, name_match_index, min_match_score,
+                total_rows=sum(len(stage.value) for stage in raw_invoices.values())
+            )
+
+    # Follow the reconciliation job: show its progress while it runs and pick up its result once it finishes
+    reconciled = None
+    job = st.session_state.batch_job
+    if job is not None and not job.done():
+        show_job_progress(job, "Reconciling")
+    elif job is not None:
+        st.session_state.batch_job = None
+        try:
+            reconciled = job.result()
+        except JobCancelled:
+            st.info("The reconciliation was cancelled.")
+        except Exception as e:
+            st.warning(f"An error occurred while reconciling the invoices ({e}). Please make sure you've uploaded the correct files.")
+
+    if reconciled is not None:
+        results, combined_flags = reconciled.value
+
+        # Display the results of each task order in its own tab
+        for tab, (task_order, result) in zip(st.tabs(list(results)), results.items()):
+            with tab:
+                st.write(result.invoice)
+                st.warning(f"{task_order} Total Hour Flags:")
+                st.write(result.misalignment_flags[result.misalignment_flags['Misalignment'] == 'Flagged'])
+                if not result.name_match_review.empty:
+                    st.info("Invoice Names Matched to WSR Contractors (only accepted matches are used):")
+                    st.dataframe(result.name_match_review, hide_index=True)
+
+        # Display the flagged rows of every task order together
+        st.warning("Total Hour Flags Across Task Orders:")
+        st.dataframe(combined_flags, hide_index=True)
+
+    # Show the wall time, CPU time, peak memory growth and rows of each stage this rerun computed or reused,
+    # and append the computed ones to the stage log for trend analysis
+    pipeline.recorder.finish(page_run)
+    stage_metrics = pipeline.report()
+    with st.sidebar.expander("Stage Timings"):
+        st.dataframe(stage_metrics, hide_index=True)
+    try:
+        append_stage_log(stage_metrics, "Batch Invoice Review")
+    except OSError as e:
+        st.sidebar.caption(f"The stage log could not be written ({e}).")
+
+    # Refresh the page until the reconciliation job finishes, so its progress stays live
+    if job is not None and not job.done():
+        time.sleep(JOB_POLL_SECONDS)
+        st.experimental_rerun()
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from utils.charts import MAX_HISTOGRAM_BINS, distribution_stats
+
+
+@pytest.mark.parametrize("values", [
+    np.random.default_rng(1).normal(100, 10, 5_000),
+    np.random.default_rng(2).uniform(0, 1, 37),
+    np.full(10, 5.0),
+])
+def test_auto_bins_match_numpy(values):
+    stats = distribution_stats(values)
+
+    np.testing.assert_allclose(stats["edges"], np.histogram_bin_edges(values, "auto"))
+    assert stats["counts"].sum() == len(values)
+
+
+def test_far_outliers_are_clamped_before_the_edges_are_built():
+    # numpy's "auto" rule asks for about 8 billion bins here, 60 GiB of edges
+    values = np.r_[np.random.default_rng(3).normal(0, 1, 10_000), 1e9]
+
+    stats = distribution_stats(values)
+
+    assert len(stats["edges"]) == MAX_HISTOGRAM_BINS + 1
+    assert stats["counts"].sum() == len(values)
+
+
+def test_bin_counts_are_clamped():
+    values = np.arange(1_000, dtype=float)
+
+    assert len(distribution_stats(values, bins=20)["counts"]) == 20
+    assert len(distribution_stats(values, bins=10_000)["counts"]) == MAX_HISTOGRAM_BINS
+    with pytest.raises(ValueError, match="Unknown histogram bins"):
+        distribution_stats(values, bins="scott")
@@ -0,0 +1,83 @@
+import pandas as pd
+import pytest
+
+from utils.matching import MATCH_COLUMNS, NameMatchIndex, _compact, _ngrams, accepted_name_matches, review_name_matches
+from utils.names import name_key
+from utils.reconciliation import WSR_COST_COLUMN, WSR_HOURS_COLUMN, WSR_NAME_COLUMN, WSR_WEEK_COLUMN, WsrIndex
+
+WSR_NAMES = ["Doe, Jane", "Doe, John", "Smith Jones, Ann", "Roe, Richard"]
+
+
+def _dice(first, second):
+    """Dice coefficient of the trigrams of two names, computed directly."""
+    first, second = _ngrams(_compact(name_key(first))), _ngrams(_compact(name_key(second)))
+    return 2 * len(first & second) / (len(first) + len(second))
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("Doe, Jane", "Doe, Jane"),
+    ("DOE ,  jane", "Doe, Jane"),
+    ("Doe, Jane A", "Doe, Jane"),
+    ("Smith-Jones, Ann", "Smith Jones, Ann"),
+])
+def test_exact_letters_resolve_with_a_perfect_score(name, expected):
+    assert NameMatchIndex(WSR_NAMES).best_match(name) == (expected, 1.0)
+
+
+def test_same_last_name_is_scored_first():
+    match_index = NameMatchIndex(["Doe, Jan", "Joe, Janette"])
+
+    # "Doe, Jan" is good enough, so the closer name with another last name is not looked at
+    wsr_name, score = match_index.best_match("Doe, Janette", min_score=0.5)
+    assert wsr_name == "Doe, Jan"
+    assert score == pytest.approx(_dice("Doe, Janette", "Doe, Jan"))
+
+    # A last-name match below the minimum falls through to every WSR name
+    wsr_name, score = match_index.best_match("Doe, Janette", min_score=0.99)
+    assert wsr_name == "Joe, Janette"
+    assert score == pytest.approx(_dice("Doe, Janette", "Joe, Janette"))
+
+
+@pytest.mark.parametrize("name", ["Do, Jane", "Roe, Rich", "Jnes, Ann"])
+def test_trigram_search_finds_the_best_dice_score(name):
+    match_index = NameMatchIndex(WSR_NAMES)
+
+    wsr_name, score = match_index.best_match(name)
+
+    scores = {wsr_name: _dice(name, wsr_name) for wsr_name in WSR_NAMES}
+    assert score == pytest.approx(max(scores.values()))
+    assert scores[wsr_name] == pytest.approx(score)
+
+
+@pytest.mark.parametrize("name", ["Xyq, Zzv", 3.0, None])
+def test_names_without_a_shared_trigram_have_no_match(name):
+    wsr_name, score = NameMatchIndex(WSR_NAMES).best_match(name)
+
+    assert pd.isna(wsr_name)
+    assert score == 0.0
+
+
+def test_index_skips_missing_and_repeated_names():
+    match_index = NameMatchIndex(WSR_NAMES + ["Doe, Jane", None, 5])
+
+    assert len(match_index) == len(WSR_NAMES)
+    wsr_name, score = NameMatchIndex([]).best_match("Doe, Jane")
+    assert pd.isna(wsr_name)
+    assert score == 0.0
+
+
+def test_review_only_lists_names_missing_from_the_wsr():
+    wsr = pd.DataFrame({
+        WSR_NAME_COLUMN: WSR_NAMES,
+        WSR_WEEK_COLUMN: pd.to_datetime(["2023-01-06"] * len(WSR_NAMES)),
+        WSR_HOURS_COLUMN: 40.0,
+        WSR_COST_COLUMN: 4000.0,
+    })
+    invoice_names = pd.Series(["Doe, Jane", "Doe, Jane", "Roe, Rich", "Smith-Jones, Ann", "Xyq, Zzv", None])
+
+    review = review_name_matches(invoice_names, WsrIndex(wsr), NameMatchIndex(WSR_NAMES), min_score=0.9)
+
+    assert list(review.columns) == MATCH_COLUMNS
+    assert list(review["Invoice Name"]) == ["Smith-Jones, Ann", "Roe, Rich", "Xyq, Zzv"]
+    assert list(review["Accepted"]) == [True, False, False]
+    assert accepted_name_matches(review) == {"Smith-Jones, Ann": "Smith Jones, Ann"}
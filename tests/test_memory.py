@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+from utils.memory import compact_frame, memory_report
+from utils.task_orders import summary_statistics
+
+
+def _invoice(rows=500):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "Unique ID": np.arange(100000, 100000 + rows, dtype=np.int64),
+        "Vendor": rng.choice(["Acme Federal", "Birch Systems", "Cedar Group"], rows).astype(object),
+        "Total": rng.integers(0, 240, rows) / 4,
+        "WSR Hours": rng.integers(0, 240, rows) / 4,
+        "Contract Rate": rng.integers(8000, 20000, rows) / 100,
+        "Cost Check": rng.integers(0, 4_000_000, rows) / 100,
+    })
+
+
+def test_compact_frame_keeps_summary_statistics_identical():
+    invoice = _invoice()
+
+    compacted = compact_frame(invoice)
+
+    assert compacted["Total"].dtype == np.float64
+    assert compacted["Contract Rate"].dtype == np.float64
+    pd.testing.assert_frame_equal(summary_statistics(compacted, "Total"), summary_statistics(invoice, "Total"))
+
+
+def test_compact_frame_shrinks_text_and_integer_columns():
+    invoice = _invoice()
+
+    compacted = compact_frame(invoice)
+
+    assert compacted["Vendor"].dtype == "category"
+    assert compacted["Unique ID"].dtype == np.int32
+    assert (compacted.astype({"Vendor": object, "Unique ID": np.int64}) == invoice).all().all()
+    report = memory_report({"Raw Invoice": compacted, "Missing": None})
+    assert list(report["Frame"]) == ["Raw Invoice"]
+    assert report.loc[0, "Saved (MB)"] >= 0
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.onboarding import DuplicateCandidateError, ONBOARDING_COLUMNS, build_onboarding_lookup, enrich_from_onboarding
+
+
+def _onboarding_tracker():
+    """A Master List where 1002 appears three times, out of date order, and one row has no ID."""
+    return pd.DataFrame({
+        "Candidate Unique ID": [1001, 1002, 1002, 1003, 1002, np.nan],
+        "Candidate Name": ["Doe, Jane", "Roe, Richard", "Roe, Richard", "Poe, Edgar", "Roe, Richard", "Unknown, Pat"],
+        "Vendor": ["Acme Federal", "Birch Systems", "Birch Systems LLC", "Cedar Group", "Birch Holdings", "Cedar Group"],
+        "Task Order #": ["TO29", "TO29", "TO32", "TO29", "TO32", "TO29"],
+        "Vendor Submission Date": pd.to_datetime(["2022-10-01", "2022-11-01", "2023-02-01", "2022-09-15", "2022-12-01", "2023-01-01"]),
+        "Candidate Proposed LCAT": ["Analyst II", "Engineer III", "Engineer IV", "Analyst I", "Engineer III", "Analyst I"],
+    })
+
+
+def test_lookup_has_the_invoice_columns_and_one_row_per_id():
+    lookup = build_onboarding_lookup(_onboarding_tracker())
+
+    assert list(lookup.columns) == list(ONBOARDING_COLUMNS)
+    assert list(lookup.index) == [1001, 1002, 1003]
+    assert lookup.loc[1001, "Vendor"] == "Acme Federal"
+
+
+def test_first_policy_keeps_the_first_row_in_the_sheet():
+    lookup = build_onboarding_lookup(_onboarding_tracker(), duplicates="first")
+
+    assert lookup.loc[1002, "Vendor"] == "Birch Systems"
+    assert lookup.loc[1002, "TO"] == "TO29"
+
+
+def test_latest_policy_keeps_the_latest_submission():
+    lookup = build_onboarding_lookup(_onboarding_tracker(), duplicates="latest")
+
+    assert lookup.loc[1002, "Vendor"] == "Birch Systems LLC"
+    assert lookup.loc[1002, "Onboard Date"] == pd.Timestamp("2023-02-01")
+    assert list(lookup.index.sort_values()) == [1001, 1002, 1003]
+
+
+def test_latest_policy_keeps_sheet_order_for_equal_dates():
+    tracker = _onboarding_tracker()
+    tracker["Vendor Submission Date"] = pd.Timestamp("2023-01-01")
+
+    lookup = build_onboarding_lookup(tracker, duplicates="latest")
+
+    assert lookup.loc[1002, "Vendor"] == "Birch Holdings"
+
+
+def test_error_policy_raises_on_duplicates():
+    with pytest.raises(DuplicateCandidateError, match="1002"):
+        build_onboarding_lookup(_onboarding_tracker(), duplicates="error")
+
+
+def test_error_policy_accepts_unique_ids():
+    tracker = _onboarding_tracker().drop_duplicates(subset="Candidate Unique ID")
+
+    lookup = build_onboarding_lookup(tracker, duplicates="error")
+
+    assert list(lookup.index) == [1001, 1002, 1003]
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError, match="Unknown duplicate policy"):
+        build_onboarding_lookup(_onboarding_tracker(), duplicates="last")
+
+
+def test_enrichment_leaves_unknown_ids_empty():
+    raw_invoice = pd.DataFrame({"Unique ID": [1003, 9999, 1001]}, index=[10, 11, 12])
+
+    enriched = enrich_from_onboarding(raw_invoice, build_onboarding_lookup(_onboarding_tracker()))
+
+    assert list(enriched.index) == [10, 11, 12]
+    assert list(enriched["Vendor"].fillna("")) == ["Cedar Group", "", "Acme Federal"]
+    assert enriched.loc[11].isna().all()
@@ -0,0 +1,24 @@
+import os
+
+import pandas as pd
+
+from utils.pipeline import TRIPWIRE_TIMING_COLUMNS, main
+from utils.synthetic import HOURLY_COST_SHEET_NAME, generate_workbooks
+
+
+def test_tripwire_writes_its_result_and_timing_summary(tmp_path):
+    paths = generate_workbooks(str(tmp_path / "data"), 200)
+    output_path = str(tmp_path / "tripwire.xlsx")
+
+    status = main([
+        "tripwire", "--tracker", paths["onboarding_tracker"], "--hourly-cost", paths["hourly_cost"],
+        "--sheet", HOURLY_COST_SHEET_NAME, "--output", output_path,
+    ])
+
+    assert status == 0
+    assert os.path.exists(output_path)
+    summary = pd.read_csv(str(tmp_path / "tripwire_timing_summary.csv"))
+    assert list(summary.columns) == TRIPWIRE_TIMING_COLUMNS
+    assert len(summary) == 1
+    assert summary.loc[0, "Flagged Rows"] == len(pd.read_excel(output_path))
+    assert summary.loc[0, "Total (s)"] >= summary.loc[0, ["Load (s)", "Review (s)", "Write (s)"]].sum() - 1e-6
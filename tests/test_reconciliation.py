@@ -0,0 +1,216 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import task_orders
+from utils.jobs import JobCancelled
+from utils.matching import NameMatchIndex
+from utils.onboarding import build_onboarding_lookup
+from utils.reconciliation import (
+    WSR_COST_COLUMN, WSR_HOURS_COLUMN, WSR_NAME_COLUMN, WSR_VENDOR_COLUMN, WSR_WEEK_COLUMN, WsrIndex, build_wsr_cube, reconcile_wsr,
+)
+from utils.task_orders import reconcile_invoice
+
+
+def _wsr():
+    """A WSR sheet with several rows per week, weeks missing in the middle and a contractor billing once."""
+    rows = [
+        ("Acme Federal", "Doe, Jane", "2023-01-06", 8.0, 800.0),
+        ("Acme Federal", "Doe, Jane", "2023-01-06", 32.0, 3200.0),
+        ("Acme Federal", "Doe, Jane", "2023-01-13", 40.0, 4000.0),
+        # No rows for Jane Doe in the weeks of 2023-01-20 and 2023-01-27
+        ("Acme Federal", "Doe, Jane", "2023-02-03", 20.0, 2150.0),
+        ("Acme Federal", "Doe, Jane", "2023-02-10", 40.0, 4300.0),
+        ("Birch Systems", "Roe, Richard", "2023-01-13", 37.5, 5625.0),
+        ("Birch Systems", "Roe, Richard", "2023-01-20", 40.0, 6000.0),
+        ("Birch Systems", "Roe, Richard", "2023-01-27", 0.0, 0.0),
+        ("Cedar Group", "Poe, Edgar", "2023-02-10", 12.25, 1531.25),
+    ]
+    wsr = pd.DataFrame(rows, columns=[WSR_VENDOR_COLUMN, WSR_NAME_COLUMN, WSR_WEEK_COLUMN, WSR_HOURS_COLUMN, WSR_COST_COLUMN])
+    wsr[WSR_WEEK_COLUMN] = pd.to_datetime(wsr[WSR_WEEK_COLUMN])
+    return wsr
+
+
+def _invoice():
+    """Invoice rows on, between, before and after the WSR weeks, including names with no WSR rows."""
+    rows = [
+        (1001, "Doe, Jane", "2023-01-13", 80.0),
+        (1001, "Doe, Jane", "2023-01-27", 40.0),
+        (1001, "Doe, Jane", "2023-02-03", 60.0),
+        (1001, "Doe, Jane", "2023-02-10", 100.0),
+        (1001, "Doe, Jane", "2023-03-31", 0.0),
+        (1001, "Doe, Jane", "2022-12-30", 0.0),
+        (1002, "Roe, Richard", "2023-01-13", 37.5),
+        (1002, "Roe, Richard", "2023-01-27", 77.5),
+        (1003, "Poe, Edgar", "2023-02-10", 12.25),
+        (1004, "Smith, Alex", "2023-02-10", 40.0),
+        (1005, "Brown, Casey", "2023-01-20", 16.0),
+    ]
+    invoice = pd.DataFrame(rows, columns=["Unique ID", "Name", "Effective Bill Date", "Total"])
+    invoice["Effective Bill Date"] = pd.to_datetime(invoice["Effective Bill Date"])
+    return invoice
+
+
+def _onboarding_tracker():
+    return pd.DataFrame({
+        "Candidate Unique ID": [1001, 1002, 1002, 1003],
+        "Candidate Name": ["Doe, Jane", "Roe, Richard", "Roe, Richard", "Poe, Edgar"],
+        "Vendor": ["Acme Federal", "Birch Systems", "Birch Systems LLC", "Cedar Group"],
+        "Task Order #": ["TO29", "TO29", "TO32", "TO29"],
+        "Vendor Submission Date": pd.to_datetime(["2022-10-01", "2022-11-01", "2022-12-01", "2022-09-15"]),
+        "Candidate Proposed LCAT": ["Analyst II", "Engineer III", "Engineer III", "Analyst I"],
+    })
+
+
+def _reference_reconcile(raw_invoice, wsr_consolidated, onboarding_tracker, x_week_lookback):
+    """The original row-by-row reconciliation of the invoice pages, kept as the reference result."""
+    raw_invoice_copy = raw_invoice.copy()
+    for index, raw_invoice_row in raw_invoice_copy.iterrows():
+        unique_id = raw_invoice_row['Unique ID']
+        name = raw_invoice_row['Name']
+
+        onboarding_row = onboarding_tracker[(onboarding_tracker['Candidate Unique ID'] == unique_id)]
+        if not onboarding_row.empty:
+            raw_invoice_copy.at[index, 'Vendor'] = onboarding_row['Vendor'].values[0]
+            raw_invoice_copy.at[index, 'TO'] = onboarding_row['Task Order #'].values[0]
+
+        effective_date = raw_invoice_row['Effective Bill Date']
+        start_date = effective_date - timedelta(weeks=x_week_lookback)
+        filtered_wsr = wsr_consolidated[
+            (wsr_consolidated['Contractor (Last Name, First Name)2'] == name) &
+            (wsr_consolidated['Reporting Week (MM/DD/YYYY)'] >= start_date) &
+            (wsr_consolidated['Reporting Week (MM/DD/YYYY)'] <= effective_date)
+        ]
+
+        total_hours = filtered_wsr['Sum of Time Spent (Hours) '].sum()
+        contract_rate = filtered_wsr['Sum of Cost Calc'].sum() / total_hours if total_hours > 0 else 0
+        contract_rate = round(contract_rate, 2)
+        raw_invoice_copy.at[index, 'WSR Hours'] = total_hours
+        raw_invoice_copy.at[index, 'Contract Rate'] = contract_rate
+        raw_invoice_copy.at[index, 'Cost Check'] = contract_rate * total_hours
+    return raw_invoice_copy
+
+
+@pytest.mark.parametrize("x_week_lookback", [1, 2, 4, 8])
+@pytest.mark.parametrize("from_cube", [False, True])
+def test_reconcile_wsr_matches_the_row_by_row_loop(x_week_lookback, from_cube):
+    wsr = _wsr()
+    expected = _reference_reconcile(_invoice(), wsr, _onboarding_tracker(), x_week_lookback)
+
+    wsr_index = WsrIndex(build_wsr_cube(wsr) if from_cube else wsr)
+    reconciled = reconcile_wsr(_invoice(), wsr_index, x_week_lookback)
+
+    pd.testing.assert_frame_equal(reconciled, expected[["WSR Hours", "Contract Rate", "Cost Check"]])
+
+
+def test_names_and_weeks_without_wsr_rows_give_zero():
+    reconciled = reconcile_wsr(_invoice(), WsrIndex(_wsr()), 4)
+    invoice = _invoice()
+
+    # Contractors with no WSR rows at all
+    assert (reconciled.loc[invoice["Name"].isin(["Smith, Alex", "Brown, Casey"])] == 0).all().all()
+    # Windows before the first or after the last Reporting Week of a contractor
+    outside = invoice["Effective Bill Date"].isin(pd.to_datetime(["2022-12-30", "2023-03-31"]))
+    assert (reconciled.loc[outside] == 0).all().all()
+    # Missing weeks inside a window only leave out their own hours
+    assert reconciled.loc[1, "WSR Hours"] == 80.0
+    assert reconciled.loc[2, "WSR Hours"] == 100.0
+
+
+def test_names_differing_by_case_or_spacing_now_match():
+    invoice = _invoice()
+    invoice["Name"] = invoice["Name"].replace({"Doe, Jane": "DOE ,  jane", "Roe, Richard": " roe,Richard "})
+    changed = invoice["Name"] != _invoice()["Name"]
+    expected = _reference_reconcile(invoice, _wsr(), _onboarding_tracker(), 4)
+
+    reconciled = reconcile_wsr(invoice, WsrIndex(_wsr()), 4)
+
+    # The row-by-row loop compared names with ==, so these rows got no WSR Hours
+    assert (expected.loc[changed, "WSR Hours"] == 0).all()
+    # The index matches them on name_key(), like the rows with the exact WSR names
+    exact = reconcile_wsr(_invoice(), WsrIndex(_wsr()), 4)
+    pd.testing.assert_frame_equal(reconciled, exact)
+    assert (reconciled.loc[changed, "WSR Hours"] > 0).any()
+    pd.testing.assert_frame_equal(reconciled[~changed], expected.loc[~changed, ["WSR Hours", "Contract Rate", "Cost Check"]])
+
+
+def test_half_cent_rates_round_like_the_row_by_row_loop():
+    # The window of the second week has 2 hours at 100.015, but the running cost total minus
+    # the first week is a hair below 200.03, which rounded the rate down to 100.01
+    wsr = pd.DataFrame({
+        WSR_VENDOR_COLUMN: "Acme Federal",
+        WSR_NAME_COLUMN: "Doe, Jane",
+        WSR_WEEK_COLUMN: pd.to_datetime(["2023-01-06", "2023-01-13"]),
+        WSR_HOURS_COLUMN: [10.0, 2.0],
+        WSR_COST_COLUMN: [1234.56, 200.03],
+    })
+    invoice = pd.DataFrame({
+        "Unique ID": [1001],
+        "Name": ["Doe, Jane"],
+        "Effective Bill Date": pd.to_datetime(["2023-01-13"]),
+        "Total": [2.0],
+    })
+    expected = _reference_reconcile(invoice, wsr, _onboarding_tracker(), 0)
+
+    reconciled = reconcile_wsr(invoice, WsrIndex(wsr), 0)
+
+    assert reconciled.loc[0, "Contract Rate"] == expected.loc[0, "Contract Rate"] == 100.02
+    pd.testing.assert_frame_equal(reconciled, expected[["WSR Hours", "Contract Rate", "Cost Check"]], check_exact=True)
+
+
+def test_empty_wsr_gives_zero_for_every_row():
+    reconciled = reconcile_wsr(_invoice(), WsrIndex(_wsr().iloc[0:0]), 4)
+
+    assert (reconciled.to_numpy() == 0).all()
+
+
+def test_reconcile_invoice_matches_the_row_by_row_loop(monkeypatch):
+    expected = _reference_reconcile(_invoice(), _wsr(), _onboarding_tracker(), 4)
+    onboarding_lookup = build_onboarding_lookup(_onboarding_tracker(), duplicates="first")
+
+    result = reconcile_invoice(_invoice(), "Total", WsrIndex(_wsr()), onboarding_lookup, 4)
+
+    pd.testing.assert_frame_equal(result.invoice[["WSR Hours", "Contract Rate", "Cost Check"]], expected[["WSR Hours", "Contract Rate", "Cost Check"]])
+    for column in ["Vendor", "TO"]:
+        assert result.invoice[column].astype(object).equals(expected[column].astype(object))
+    flagged = np.where(expected["Total"] != expected["WSR Hours"], "Flagged", "Aligned")
+    assert list(result.misalignment_flags["Misalignment"]) == list(flagged)
+
+    # Reconciling a chunk at a time, as the background jobs do, gives the same result
+    monkeypatch.setattr(task_orders, "PROGRESS_CHUNKS", 4)
+    monkeypatch.setattr(task_orders, "MIN_PROGRESS_CHUNK_ROWS", 1)
+    reported = []
+    chunked = reconcile_invoice(_invoice(), "Total", WsrIndex(_wsr()), onboarding_lookup, 4, progress=reported.append)
+    pd.testing.assert_frame_equal(chunked.invoice, result.invoice)
+    assert reported == [0, 0, 3, 3, 3, 2]
+
+
+@pytest.mark.parametrize("total_rows, chunk_rows", [(0, 200), (1_000, 200), (20_000, 400), (1_000_000, 20_000)])
+def test_progress_is_reported_about_fifty_times(total_rows, chunk_rows):
+    assert task_orders.progress_chunk_rows(total_rows) == chunk_rows
+
+
+def test_cancel_stops_the_reconciliation_after_the_name_matching():
+    onboarding_lookup = build_onboarding_lookup(_onboarding_tracker(), duplicates="first")
+    calls = []
+
+    def progress(rows):
+        calls.append(rows)
+        if len(calls) == 2:
+            raise JobCancelled()
+
+    with pytest.raises(JobCancelled):
+        reconcile_invoice(_invoice(), "Total", WsrIndex(_wsr()), onboarding_lookup, 4, match_index=NameMatchIndex(_wsr()[WSR_NAME_COLUMN]), progress=progress)
+    assert calls == [0, 0]
+
+
+def test_reconcile_invoice_can_leave_the_flags_to_the_caller():
+    onboarding_lookup = build_onboarding_lookup(_onboarding_tracker(), duplicates="first")
+    flagged = reconcile_invoice(_invoice(), "Total", WsrIndex(_wsr()), onboarding_lookup, 4)
+
+    result = reconcile_invoice(_invoice(), "Total", WsrIndex(_wsr()), onboarding_lookup, 4, tolerance=None)
+
+    assert result.misalignment_flags is None
+    pd.testing.assert_frame_equal(result.invoice, flagged.invoice)
@@ -0,0 +1,87 @@
+import pandas as pd
+
+from utils.ingestion import load_onboarding_tracker, load_raw_invoice, load_wsr_consolidated
+from utils.onboarding import build_onboarding_lookup
+from utils.reconciliation import WsrIndex
+from utils.snapshots import SnapshotStore
+from utils.stages import StagedPipeline, clear_stored_stages, parse_stored_stages
+from utils.synthetic import generate_workbooks
+from utils.task_orders import reconcile_invoice
+
+
+def test_parse_stored_stages_runs_the_snapshot_path(tmp_path):
+    paths = generate_workbooks(str(tmp_path / "data"), 200)
+    store = SnapshotStore(str(tmp_path / "snapshots"))
+    pipeline = StagedPipeline()
+    files = {
+        "wsr_consolidated": (store.append_wsr, paths["wsr_consolidated"]),
+        "onboarding_tracker": (store.load_onboarding, paths["onboarding_tracker"]),
+    }
+
+    stages, errors = parse_stored_stages(pipeline, files)
+
+    assert errors == {}
+    pd.testing.assert_frame_equal(
+        stages["wsr_consolidated"].value.reset_index(drop=True),
+        load_wsr_consolidated(paths["wsr_consolidated"], cache=None).reset_index(drop=True),
+        check_categorical=False,
+    )
+    assert len(stages["onboarding_tracker"].value) == len(load_onboarding_tracker(paths["onboarding_tracker"], cache=None))
+
+    # The stored frames reconcile an invoice like the parsed ones
+    wsr_index = pipeline.run("index WSR", WsrIndex, stages["wsr_consolidated"])
+    onboarding_lookup = pipeline.run("index Onboarding", build_onboarding_lookup, stages["onboarding_tracker"], duplicates="first")
+    raw_invoice = load_raw_invoice(paths["raw_invoice_TO29"], cache=None)
+    result = reconcile_invoice(raw_invoice, "Total", wsr_index.value, onboarding_lookup.value, 4)
+    assert result.invoice["WSR Hours"].notna().any()
+
+    # A rerun with the same files reuses the stages and leaves the store untouched
+    pipeline.report()
+    reused, errors = parse_stored_stages(pipeline, files)
+    assert errors == {}
+    assert reused["wsr_consolidated"] is stages["wsr_consolidated"]
+    report = pipeline.report()
+    assert set(report.loc[report["Stage"].str.endswith("from store"), "Status"]) == {"reused"}
+
+
+def test_clearing_the_store_drops_the_stages_read_from_it(tmp_path):
+    paths = generate_workbooks(str(tmp_path / "data"), 200)
+    store = SnapshotStore(str(tmp_path / "snapshots"))
+    pipeline = StagedPipeline()
+    files = {"wsr_consolidated": (store.append_wsr, paths["wsr_consolidated"])}
+    parse_stored_stages(pipeline, files)
+
+    clear_stored_stages(pipeline, store, ["wsr_consolidated", "onboarding_tracker"])
+    assert store.read_wsr() is None
+
+    # The next run merges the upload into the empty store instead of reusing the cleared history
+    pipeline.report()
+    stages, errors = parse_stored_stages(pipeline, files)
+    assert errors == {}
+    report = pipeline.report()
+    assert list(report.loc[report["Stage"] == "parse wsr_consolidated from store", "Status"]) == ["computed"]
+    assert len(store.read_wsr()) == len(stages["wsr_consolidated"].value)
+
+
+def test_parse_stored_stages_reports_errors_per_file(tmp_path):
+    store = SnapshotStore(str(tmp_path / "snapshots"))
+    missing = str(tmp_path / "missing.xlsx")
+
+    stages, errors = parse_stored_stages(StagedPipeline(), {"onboarding_tracker": (store.load_onboarding, missing)})
+
+    assert stages == {}
+    assert list(errors) == ["onboarding_tracker"]
+
+
+def test_stages_with_their_own_names_are_kept_when_switching():
+    pipeline = StagedPipeline()
+    calls = []
+
+    def draw(chart_type):
+        calls.append(chart_type)
+        return chart_type
+
+    for chart_type in ["histogram", "box", "histogram", "box"]:
+        pipeline.run(f"render {chart_type}", draw, chart_type)
+
+    assert calls == ["histogram", "box"]
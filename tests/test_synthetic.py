@@ -0,0 +1,40 @@
+import pandas as pd
+import pyxlsb
+
+from utils.exports import write_excel_sheets
+from utils.loaders import read_wsr_invoice_review
+from utils.synthetic import generate_workbooks, synthetic_contractors, write_xlsb_sheets, wsr_consolidated_frame, wsr_pivot_sheet
+
+
+def test_xlsb_sheet_reads_like_the_xlsx_sheet(tmp_path):
+    sheet = wsr_pivot_sheet(wsr_consolidated_frame(synthetic_contractors(8, 0), 200))
+    preamble = {"Invoice Review": [["Sum of Time Spent (Hours)"], []]}
+    write_xlsb_sheets({"Invoice Review": sheet}, str(tmp_path / "wsr.xlsb"), preamble=preamble)
+    write_excel_sheets({"Invoice Review": sheet}, str(tmp_path / "wsr.xlsx"), preamble=preamble)
+
+    from_xlsb = read_wsr_invoice_review(str(tmp_path / "wsr.xlsb"), cache=None)
+
+    pd.testing.assert_frame_equal(from_xlsb, read_wsr_invoice_review(str(tmp_path / "wsr.xlsx"), cache=None))
+    assert len(from_xlsb) == len(sheet)
+
+
+def test_xlsb_workbook_lists_every_sheet_with_its_cells(tmp_path):
+    frames = {
+        "First": pd.DataFrame({"Name": ["Doe, Jane", None, "Doe, Jane"], "Hours": [1.5, 2.0, None]}),
+        "Second": pd.DataFrame({"Week": pd.to_datetime(["2023-01-06"])}),
+    }
+    write_xlsb_sheets(frames, str(tmp_path / "book.xlsb"))
+
+    with pyxlsb.open_workbook(str(tmp_path / "book.xlsb")) as workbook:
+        assert workbook.sheets == ["First", "Second"]
+        with workbook.get_sheet("First") as sheet:
+            assert [[cell.v for cell in row] for row in sheet.rows()] == [["Name", "Hours"], ["Doe, Jane", 1.5], [None, 2.0], ["Doe, Jane", None]]
+        with workbook.get_sheet("Second") as sheet:
+            assert [[cell.v for cell in row] for row in sheet.rows()] == [["Week"], [44932.0]]
+
+
+def test_generated_wsr_is_an_xlsb_workbook(tmp_path):
+    paths = generate_workbooks(str(tmp_path), 100)
+
+    assert paths["wsr_consolidated"].endswith(".xlsb")
+    assert len(read_wsr_invoice_review(paths["wsr_consolidated"], cache=None)) > 0
@@ -0,0 +1,40 @@
+import pandas as pd
+import pytest
+
+from utils import tripwire
+from utils.jobs import Job, JobCancelled, submit_job
+from utils.synthetic import HOURLY_COST_SHEET_NAME, generate_workbooks
+from utils.tripwire import load_tripwire_inputs
+
+
+def test_cancelling_stops_between_the_workbooks(monkeypatch):
+    read = []
+    job = Job()
+
+    def read_tracker(*args, **kwargs):
+        read.append("tracker")
+        # Cancel while the first workbook is being parsed
+        job.cancel()
+        return {tripwire.TRIPWIRE_SHEET_NAME: pd.DataFrame(), "LCAT Normalization": pd.DataFrame()}
+
+    def read_hourly_cost(*args, **kwargs):
+        read.append("hourly cost")
+        return pd.DataFrame()
+
+    monkeypatch.setattr(tripwire, "read_excel_sheets", read_tracker)
+    monkeypatch.setattr(tripwire, "read_excel_from_header", read_hourly_cost)
+
+    with pytest.raises(JobCancelled):
+        load_tripwire_inputs("tracker.xlsx", "hourly_cost.xlsx", "Sheet1", cache=None, progress=job.progress)
+    assert read == ["tracker"]
+
+
+def test_tripwire_inputs_load_in_a_job(tmp_path):
+    paths = generate_workbooks(str(tmp_path), 200)
+
+    job = submit_job(load_tripwire_inputs, paths["onboarding_tracker"], paths["hourly_cost"], HOURLY_COST_SHEET_NAME, cache=None)
+    tracker_df, hourly_cost_df, lcat_df = job.result()
+
+    assert {"Candidate Name", "Final Approval"} <= set(tracker_df.columns)
+    assert len(hourly_cost_df) > 0
+    assert {"Vendor LCATs", "Correct LCAT Syntax"} <= set(lcat_df.columns)
@@ -0,0 +1 @@
+"""Shared processing helpers used by the Iberia Advisory Streamlit pages."""
@@ -0,0 +1,339 @@
+"""
+Benchmark suite for the pipelines of every page, run on synthetic workbooks.
+
+Each page is run as it runs in Streamlit, stage by stage, in a fresh process so no cache
+is warm, and every stage is measured with the StageRecorder of the page's pipeline. The
+results of a run are saved under a version label so runs of two versions can be compared:
+
+    python -m utils.benchmark run --sizes 1k 10k 100k --label before
+    python -m utils.benchmark run --sizes 1k 10k 100k --label after
+    python -m utils.benchmark compare benchmarks/results/before.jsonl benchmarks/results/after.jsonl
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+
+from utils.charts import chart_png, invoice_chart_stats, tripwire_chart_stats
+from utils.exports import excel_export
+from utils.ingestion import load_onboarding_tracker, load_raw_invoice, load_wsr_consolidated, shutdown_executor
+from utils.instrumentation import STAGE_LOG_FIELDS
+from utils.matching import DEFAULT_MIN_MATCH_SCORE, NameMatchIndex
+from utils.onboarding import build_onboarding_lookup
+from utils.reconciliation import DEFAULT_HOURS_TOLERANCE, WSR_NAME_COLUMN, WsrIndex, flag_misalignment, sweep_lookbacks
+from utils.stages import StagedPipeline, parse_stages
+from utils.synthetic import HOURLY_COST_SHEET_NAME, SYNTHETIC_SIZES, generate_workbooks, synthetic_rows
+from utils.task_orders import TASK_ORDER_PROFILES, reconcile_invoice, reconcile_task_orders, review_workbook, summary_statistics
+from utils.tripwire import load_tripwire_inputs, review_tripwire
+
+# Pages benchmarked by run_benchmarks()
+BENCHMARK_PAGES = ["TO29 Invoice Review", "TO32 Invoice Review", "Tripwire Tracker", "Batch Invoice Review"]
+
+# Sizes run when none are given; "1m" takes a long time and is only run on request
+DEFAULT_BENCHMARK_SIZES = ["1k", "10k", "100k"]
+
+# Folder with the synthetic workbooks ("data") and the results of each run ("results")
+DEFAULT_BENCHMARK_DIR = "benchmarks"
+
+# Settings of the benchmarked reviews, the defaults of the pages
+BENCHMARK_LOOKBACK_WEEKS = 4
+BENCHMARK_SWEEP_WEEKS = [2, 4, 6, 8]
+
+# Columns of compare_benchmarks()
+COMPARISON_COLUMNS = ["Size", "Page", "Stage", "Base (s)", "New (s)", "Change (%)"]
+
+
+def benchmark_invoice_page(paths, task_order):
+    """
+    Run the stages of a TO29 or TO32 Invoice Review page.
+
+    Parameters:
+    - paths (dict): The workbooks returned by generate_workbooks().
+    - task_order (str): The task order of the page, a key of TASK_ORDER_PROFILES.
+
+    Returns:
+    - pd.DataFrame: The report of the page's pipeline, see StagedPipeline.report().
+    """
+    hours_column = TASK_ORDER_PROFILES[task_order]["hours_column"]
+    pipeline = StagedPipeline()
+    page_run = pipeline.recorder.start("page")
+
+    # Parse the three uploads, then index the WSR and the Onboarding Tracker
+    parsed, errors = parse_stages(pipeline, {
+        "raw_invoice": (load_raw_invoice, paths[f"raw_invoice_{task_order}"]),
+        "wsr_consolidated": (load_wsr_consolidated, paths["wsr_consolidated"]),
+        "onboarding_tracker": (load_onboarding_tracker, paths["onboarding_tracker"]),
+    })
+    for error in errors.values():
+        raise error
+    wsr_index = pipeline.run("index WSR", WsrIndex, parsed["wsr_consolidated"])
+    name_match_index = pipeline.run("index WSR names", lambda wsr: NameMatchIndex(wsr[WSR_NAME_COLUMN]), parsed["wsr_consolidated"])
+    onboarding_lookup = pipeline.run("index Onboarding", build_onboarding_lookup, parsed["onboarding_tracker"], duplicates="first")
+
+    # Reconcile as a background job, as after Submit, then flag and sweep the lookbacks
+    reconciled = pipeline.submit(
+        "reconcile", reconcile_invoice, parsed["raw_invoice"], hours_column, wsr_index, onboarding_lookup, BENCHMARK_LOOKBACK_WEEKS,
+        tolerance=None, total_rows=len(parsed["raw_invoice"].value), match_index=name_match_index, min_match_score=DEFAULT_MIN_MATCH_SCORE
+    ).result()
+    pipeline.run("flag", lambda result, tolerance: flag_misalignment(result.invoice, hours_column, tolerance), reconciled, DEFAULT_HOURS_TOLERANCE)
+    pipeline.run(
+        "reconcile lookback sweep", sweep_lookbacks, parsed["raw_invoice"], wsr_index, BENCHMARK_SWEEP_WEEKS,
+        hours_column, DEFAULT_HOURS_TOLERANCE, reconciled.value.name_matches
+    )
+
+    # Summarize, draw every chart of the page and export the review workbook
+    chart_stats = pipeline.run("summarize charts", lambda result: invoice_chart_stats(result.invoice), reconciled)
+    pipeline.run("summarize statistics", lambda result: summary_statistics(result.invoice, hours_column), reconciled)
+    for chart_type in ["wsr_hours_histogram", "contract_rate_box"]:
+        pipeline.run(f"render {chart_type}", chart_png, chart_type, chart_stats)
+    pipeline.run("render hours_vs_rate_scatter", lambda result: chart_png("hours_vs_rate_scatter", result.invoice), reconciled)
+    pipeline.run(
+        "export", lambda result, tolerance: excel_export(*review_workbook(result.invoice, hours_column, tolerance)),
+        reconciled, DEFAULT_HOURS_TOLERANCE
+    )
+
+    pipeline.recorder.finish(page_run)
+    return pipeline.report()
+
+
+def benchmark_tripwire_page(paths):
+    """Runs the stages of the Tripwire Tracker page and returns the report of its pipeline."""
+    pipeline = StagedPipeline()
+    page_run = pipeline.recorder.start("page")
+
+    # Parse the Onboarding Tracker and Hourly Cost sheets and review them
+    inputs = pipeline.run("parse", load_tripwire_inputs, paths["onboarding_tracker"], paths["hourly_cost"], HOURLY_COST_SHEET_NAME)
+    reviewed = pipeline.run("reconcile", lambda inputs: review_tripwire(*inputs), inputs)
+
+    # Summarize, draw every chart of the page and export the result
+    chart_stats = pipeline.run("summarize charts", lambda reviewed: tripwire_chart_stats(*reviewed), reviewed)
+    for chart_type in ["hourly_cost_histogram", "tripwire_box", "lcat_box"]:
+        pipeline.run(f"render {chart_type}", chart_png, chart_type, chart_stats)
+    pipeline.run("render tripwire_pie", lambda reviewed: chart_png("tripwire_pie", reviewed[1]), reviewed)
+    pipeline.run("export", lambda reviewed: excel_export(reviewed[0]), reviewed)
+
+    pipeline.recorder.finish(page_run)
+    return pipeline.report()
+
+
+def benchmark_batch_page(paths):
+    """Runs the stages of the Batch Invoice Review page for every task order and returns the report of its pipeline."""
+    pipeline = StagedPipeline()
+    page_run = pipeline.recorder.start("page")
+
+    # Parse every invoice with the shared WSR and Onboarding Tracker
+    uploads = {task_order: (load_raw_invoice, paths[f"raw_invoice_{task_order}"]) for task_order in TASK_ORDER_PROFILES}
+    uploads["wsr_consolidated"] = (load_wsr_consolidated, paths["wsr_consolidated"])
+    uploads["onboarding_tracker"] = (load_onboarding_tracker, paths["onboarding_tracker"])
+    parsed, errors = parse_stages(pipeline, uploads)
+    for error in errors.values():
+        raise error
+    wsr_index = pipeline.run("index WSR", WsrIndex, parsed["wsr_consolidated"])
+    name_match_index = pipeline.run("index WSR names", lambda wsr: NameMatchIndex(wsr[WSR_NAME_COLUMN]), parsed["wsr_consolidated"])
+    onboarding_lookup = pipeline.run("index Onboarding", build_onboarding_lookup, parsed["onboarding_tracker"], duplicates="first")
+
+    # Reconcile every task order in one background job
+    raw_invoices = {task_order: parsed[task_order] for task_order in TASK_ORDER_PROFILES}
+    pipeline.submit(
+        "reconcile", reconcile_task_orders, raw_invoices, wsr_index, onboarding_lookup, BENCHMARK_LOOKBACK_WEEKS,
+        DEFAULT_HOURS_TOLERANCE, name_match_index, DEFAULT_MIN_MATCH_SCORE,
+        total_rows=sum(len(stage.value) for stage in raw_invoices.values())
+    ).result()
+
+    pipeline.recorder.finish(page_run)
+    return pipeline.report()
+
+
+def benchmark_page(page, paths):
+    """
+    Run the stages of one page.
+
+    Parameters:
+    - page (str): One of BENCHMARK_PAGES.
+    - paths (dict): The workbooks returned by generate_workbooks().
+
+    Returns:
+    - list: One dict per stage with the fields in STAGE_LOG_FIELDS.
+
+    Raises:
+    - ValueError: If 'page' is not one of BENCHMARK_PAGES.
+    """
+    if page == "Tripwire Tracker":
+        report = benchmark_tripwire_page(paths)
+    elif page == "Batch Invoice Review":
+        report = benchmark_batch_page(paths)
+    elif page in BENCHMARK_PAGES:
+        report = benchmark_invoice_page(paths, page.split()[0])
+    else:
+        raise ValueError(f'Unknown page "{page}", expected one of {BENCHMARK_PAGES}.')
+    return report.rename(columns=STAGE_LOG_FIELDS).to_dict("records")
+
+
+def _benchmark_in_worker(page, paths):
+    """Runs benchmark_page() in a worker process, then stops its parse pool so the worker can exit."""
+    try:
+        return benchmark_page(page, paths)
+    finally:
+        shutdown_executor()
+
+
+def _run_in_fresh_process(page, paths):
+    """Runs benchmark_page() in a new process, so every cache starts empty and the peak RSS is that of the page alone."""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(_benchmark_in_worker, page, paths).result()
+
+
+def version_label():
+    """Returns the git description of the working tree, such as "e1ad6c0-dirty", or "unversioned" outside of git."""
+    try:
+        described = subprocess.run(
+            ["git", "describe", "--always", "--dirty"], capture_output=True, text=True, timeout=10,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        )
+    except (OSError, subprocess.SubprocessError):
+        return "unversioned"
+    return described.stdout.strip() or "unversioned"
+
+
+def run_benchmarks(sizes=DEFAULT_BENCHMARK_SIZES, output_dir=DEFAULT_BENCHMARK_DIR, label=None, pages=BENCHMARK_PAGES, repeat=1, seed=0):
+    """
+    Benchmark every stage of the pages on synthetic workbooks of several sizes.
+
+    Parameters:
+    - sizes (list, optional): Keys of SYNTHETIC_SIZES or numbers of rows (default is DEFAULT_BENCHMARK_SIZES).
+    - output_dir (str, optional): Where the workbooks are generated, in "data/<size>-seed<seed>",
+        and the results written, to "results/<label>.jsonl" (default is DEFAULT_BENCHMARK_DIR).
+    - label (str, optional): The name of this run, for example a version (default is version_label()).
+    - pages (list, optional): The pages to run, from BENCHMARK_PAGES (default is all of them).
+    - repeat (int, optional): How many times each page is run (default is 1).
+    - seed (int, optional): The random seed of the workbooks (default is 0).
+
+    Returns:
+    - pd.DataFrame: One row per stage of every run, with the label, size, page and repeat
+        and the fields in STAGE_LOG_FIELDS, as saved to the results file.
+
+    Raises:
+    - ValueError: If a size or page is unknown.
+
+    The workbooks of a size and seed are generated once and reused by later runs, so two
+    versions are benchmarked on the same files. Each page runs in a fresh process.
+
+    Example usage:
+    results = run_benchmarks(["1k", "10k"], label="before")
+    """
+    label = label or version_label()
+    run_at = datetime.now().isoformat(timespec="seconds")
+    records = []
+    for size in sizes:
+        rows = synthetic_rows(size)
+        started = time.perf_counter()
+        paths = generate_workbooks(os.path.join(output_dir, "data", f"{size}-seed{seed}"), rows, seed)
+        print(f"{size}: workbooks ready in {time.perf_counter() - started:.1f}s", flush=True)
+        for page in pages:
+            for run in range(repeat):
+                stages = _run_in_fresh_process(page, paths)
+                records.extend({"label": label, "run_at": run_at, "size": size, "size_rows": rows, "page": page, "repeat": run, **stage} for stage in stages)
+                page_seconds = next((stage["wall_seconds"] for stage in stages if stage["stage"] == "page"), 0.0)
+                print(f"{size}: {page} run {run + 1} of {repeat} in {page_seconds:.2f}s", flush=True)
+
+    # Missing peak RSS values are written as null
+    results = pd.DataFrame(records)
+    os.makedirs(os.path.join(output_dir, "results"), exist_ok=True)
+    with open(os.path.join(output_dir, "results", f"{label}.jsonl"), "w", encoding="utf-8") as results_file:
+        for record in records:
+            results_file.write(json.dumps({key: (None if pd.isna(value) else value) for key, value in record.items()}) + "\n")
+    return results
+
+
+def load_benchmark_results(path):
+    """Returns the results saved by run_benchmarks() as a DataFrame."""
+    return pd.read_json(path, lines=True, dtype={"size": str})
+
+
+def summarize_benchmarks(results):
+    """
+    Return the median wall time of each computed stage of each page, one column per size.
+
+    Parameters:
+    - results (pd.DataFrame): The results of run_benchmarks() or load_benchmark_results().
+
+    Returns:
+    - pd.DataFrame: Indexed by page and stage, in the order they ran.
+    """
+    computed = results[results["status"] == "computed"]
+    medians = computed.groupby(["page", "stage", "size"], sort=False)["wall_seconds"].median().unstack("size")
+    # unstack() sorts the rows and columns, so put them back in the order they ran
+    order = pd.MultiIndex.from_frame(computed[["page", "stage"]].drop_duplicates())
+    return medians.reindex(index=order, columns=computed["size"].unique()).round(3)
+
+
+def compare_benchmarks(base, new):
+    """
+    Compare the wall time of every stage between two benchmark runs.
+
+    Parameters:
+    - base (pd.DataFrame): The results of the earlier version.
+    - new (pd.DataFrame): The results of the later version.
+
+    Returns:
+    - pd.DataFrame: The columns in COMPARISON_COLUMNS, with the median wall time over the
+        repeats of each stage in both runs. A negative change is an improvement. Stages
+        that only ran in one of the two runs are listed with a blank time.
+
+    Example usage:
+    comparison = compare_benchmarks(load_benchmark_results("before.jsonl"), load_benchmark_results("after.jsonl"))
+    """
+    keys = ["size", "page", "stage"]
+    medians = [
+        results[results["status"] == "computed"].groupby(keys, sort=False)["wall_seconds"].median().rename(name)
+        for results, name in [(base, "Base (s)"), (new, "New (s)")]
+    ]
+    comparison = pd.concat(medians, axis=1).reset_index()
+    comparison["Change (%)"] = (comparison["New (s)"] / comparison["Base (s)"] - 1) * 100
+    comparison = comparison.rename(columns={"size": "Size", "page": "Page", "stage": "Stage"})
+    return comparison[COMPARISON_COLUMNS].round({"Base (s)": 3, "New (s)": 3, "Change (%)": 1})
+
+
+def main(argv=None):
+    """Command-line entry point, see the module docstring for usage."""
+    parser = argparse.ArgumentParser(prog="python -m utils.benchmark", description="Benchmark the review pipelines on synthetic workbooks.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Benchmark every stage of the pages and save the results.")
+    run_parser.add_argument("--sizes", nargs="+", default=DEFAULT_BENCHMARK_SIZES, help=f"Sizes to run: {list(SYNTHETIC_SIZES)} or numbers of rows.")
+    run_parser.add_argument("--pages", nargs="+", default=BENCHMARK_PAGES, choices=BENCHMARK_PAGES, metavar="PAGE", help=f"Pages to run, from {BENCHMARK_PAGES}.")
+    run_parser.add_argument("--label", default=None, help="Name of the run (default: the git description of the tree).")
+    run_parser.add_argument("--output", default=DEFAULT_BENCHMARK_DIR, help="Folder for the workbooks and results.")
+    run_parser.add_argument("--repeat", type=int, default=1, help="Runs of each page; the comparison uses the median.")
+    run_parser.add_argument("--seed", type=int, default=0, help="Random seed of the workbooks.")
+
+    compare_parser = commands.add_parser("compare", help="Compare the stage times of two saved runs.")
+    compare_parser.add_argument("base", help="Results file of the earlier version.")
+    compare_parser.add_argument("new", help="Results file of the later version.")
+
+    args = parser.parse_args(argv)
+    with pd.option_context("display.width", 200, "display.max_rows", None, "display.max_columns", None):
+        if args.command == "run":
+            try:
+                for size in args.sizes:
+                    synthetic_rows(size)
+            except ValueError as e:
+                parser.error(str(e))
+            results = run_benchmarks(args.sizes, args.output, args.label, args.pages, args.repeat, args.seed)
+            print(summarize_benchmarks(results).to_string())
+            print(f'Saved to {os.path.join(args.output, "results", results["label"].iloc[0] + ".jsonl")}')
+        else:
+            comparison = compare_benchmarks(load_benchmark_results(args.base), load_benchmark_results(args.new))
+            print(comparison.to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
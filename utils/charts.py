@@ -0,0 +1,347 @@
+import hashlib
+from io import BytesIO
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import seaborn as sns
+from matplotlib.figure import Figure
+
+from utils.exports import ExportCache, frame_digest
+
+# Memory budget of the rendered chart cache shared by every session of the app
+DEFAULT_FIGURE_CACHE_BYTES = 32 * 1024 ** 2
+
+# Resolution of the rendered charts
+FIGURE_DPI = 150
+
+# Largest number of values a density curve is estimated from, and the points it is evaluated at
+KDE_SAMPLE_SIZE = 5_000
+KDE_GRID_POINTS = 200
+
+# Largest number of histogram bins, and of outliers drawn on a box plot
+MAX_HISTOGRAM_BINS = 100
+MAX_FLIERS = 1_000
+
+figure_cache = ExportCache(max_bytes=DEFAULT_FIGURE_CACHE_BYTES)
+
+
+def _kde(sample, grid):
+    """Returns the Gaussian kernel density of 'sample' at the 'grid' points, with Scott's bandwidth."""
+    bandwidth = sample.std(ddof=1) * len(sample) ** (-1 / 5)
+    density = np.zeros(len(grid))
+    # Accumulate one block of the sample at a time so the sample x grid matrix stays small
+    for start in range(0, len(sample), 1_000):
+        block = sample[start:start + 1_000]
+        density += np.exp(-0.5 * ((grid[:, None] - block[None, :]) / bandwidth) ** 2).sum(axis=1)
+    return density / (len(sample) * bandwidth * np.sqrt(2 * np.pi))
+
+
+def _histogram_bin_count(values, bins):
+    """
+    Returns the number of histogram bins for 'values', at most MAX_HISTOGRAM_BINS.
+
+    "auto" is numpy's rule, the narrower of the Freedman-Diaconis and Sturges bin widths,
+    computed from the quartiles so no edges are built before the count is clamped; on wide
+    data with far outliers the unclamped rule can ask for millions of bins.
+    """
+    if not isinstance(bins, str):
+        return max(1, min(int(bins), MAX_HISTOGRAM_BINS))
+    if bins != "auto":
+        raise ValueError(f'Unknown histogram bins "{bins}", expected a number of bins or "auto".')
+    data_range = values.max() - values.min()
+    if data_range == 0:
+        return 1
+    sturges_width = data_range / (np.log2(len(values)) + 1)
+    q1, q3 = np.quantile(values, [0.25, 0.75])
+    fd_width = 2 * (q3 - q1) * len(values) ** (-1 / 3)
+    width = min(fd_width, sturges_width) if fd_width > 0 else sturges_width
+    return max(1, min(int(np.ceil(data_range / width)), MAX_HISTOGRAM_BINS))
+
+
+def distribution_stats(values, bins="auto", seed=0):
+    """
+    Summarize a numeric column into what its histogram, density curve and box plot are drawn from.
+
+    Parameters:
+    - values (pd.Series or array-like): The values to summarize; non-numeric and missing values are ignored.
+    - bins (int or str, optional): The number of histogram bins, or "auto" for numpy's rule,
+        at most MAX_HISTOGRAM_BINS (default is "auto").
+    - seed (int, optional): The seed of the sample the density curve is estimated from (default is 0).
+
+    Returns:
+    - dict: The "count" of values, the histogram "edges" and "counts", the density curve
+        "kde_x" and "kde_y" (scaled to the histogram counts), and the box plot "q1", "med",
+        "q3", "whislo", "whishi" (the furthest values within 1.5 IQR of the quartiles) and
+        "fliers" (the values beyond them, at most MAX_FLIERS distinct ones).
+
+    The histogram and quartiles are computed over every value with numpy; the density curve
+    is estimated from a random sample of at most KDE_SAMPLE_SIZE values, so the cost of
+    drawing the charts does not grow with the number of rows.
+
+    Example usage:
+    stats = distribution_stats(raw_invoice_copy['Contract Rate'])
+    """
+    values = pd.to_numeric(pd.Series(values), errors="coerce").dropna().to_numpy(dtype=float)
+    stats = {"count": len(values)}
+    if len(values) == 0:
+        stats.update(edges=np.array([0.0, 1.0]), counts=np.zeros(1), kde_x=np.array([]), kde_y=np.array([]),
+                     q1=np.nan, med=np.nan, q3=np.nan, whislo=np.nan, whishi=np.nan, fliers=np.array([]))
+        return stats
+
+    # Histogram, with the number of bins clamped before any edges are built
+    counts, edges = np.histogram(values, _histogram_bin_count(values, bins))
+    stats.update(edges=edges, counts=counts)
+
+    # Density curve over the range of the data, estimated on a bounded sample
+    sample = values
+    if len(sample) > KDE_SAMPLE_SIZE:
+        sample = np.random.default_rng(seed).choice(values, KDE_SAMPLE_SIZE, replace=False)
+    if len(sample) > 1 and sample.std() > 0:
+        kde_x = np.linspace(values.min(), values.max(), KDE_GRID_POINTS)
+        kde_y = _kde(sample, kde_x) * len(values) * np.diff(edges).mean()
+    else:
+        kde_x, kde_y = np.array([]), np.array([])
+    stats.update(kde_x=kde_x, kde_y=kde_y)
+
+    # Quartiles, whiskers and outliers
+    q1, med, q3 = np.quantile(values, [0.25, 0.5, 0.75])
+    low, high = q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1)
+    inside = (values >= low) & (values <= high)
+    fliers = np.unique(values[~inside])
+    if len(fliers) > MAX_FLIERS:
+        fliers = fliers[np.linspace(0, len(fliers) - 1, MAX_FLIERS).round().astype(int)]
+    stats.update(q1=q1, med=med, q3=q3, whislo=values[inside].min(), whishi=values[inside].max(), fliers=fliers)
+    return stats
+
+
+def grouped_distribution_stats(frame, column, by):
+    """
+    Summarize a numeric column separately for each value of another column.
+
+    Parameters:
+    - frame (pd.DataFrame): The data.
+    - column (str): The numeric column to summarize.
+    - by (str): The column to group by.
+
+    Returns:
+    - dict: Maps each group, in order of first appearance, to its distribution_stats().
+    """
+    groups = frame.groupby(frame[by].astype(object), sort=False)[column]
+    return {label: distribution_stats(values) for label, values in groups}
+
+
+def invoice_chart_stats(invoice):
+    """
+    Summarize a reconciled invoice for its charts, once per reconciliation.
+
+    Parameters:
+    - invoice (pd.DataFrame): The reconciled invoice.
+
+    Returns:
+    - dict: The distribution_stats() of the "WSR Hours" and "Contract Rate" columns.
+
+    Example usage:
+    st.session_state.chart_stats = invoice_chart_stats(result.invoice)
+    """
+    return {column: distribution_stats(invoice[column]) for column in ['WSR Hours', 'Contract Rate']}
+
+
+def tripwire_chart_stats(result_df, hourly_cost_df):
+    """
+    Summarize a tripwire review for its charts.
+
+    Parameters:
+    - result_df (pd.DataFrame): The candidates above the tripwire rate without approval.
+    - hourly_cost_df (pd.DataFrame): The cleaned Hourly Cost frame.
+
+    Returns:
+    - dict: The 20-bin distribution_stats() of the result's "Hourly Cost $/hr", and the
+        Hourly Cost grouped by "Above Tripwire Rate?" and by "Correct LCAT Syntax".
+
+    Example usage:
+    stats = tripwire_chart_stats(result_df, hourly_cost_df)
+    """
+    return {
+        "Hourly Cost $/hr": distribution_stats(result_df["Hourly Cost $/hr"], bins=20),
+        "Above Tripwire Rate?": grouped_distribution_stats(hourly_cost_df, "Hourly Cost $/hr", "Above Tripwire Rate?"),
+        "Correct LCAT Syntax": grouped_distribution_stats(hourly_cost_df, "Hourly Cost $/hr", "Correct LCAT Syntax"),
+    }
+
+
+def _stats_digest(stats):
+    """Returns a hash of a (possibly nested) dict of statistics."""
+    digest = hashlib.blake2b(digest_size=16)
+    for key, value in stats.items():
+        digest.update(repr(key).encode())
+        if isinstance(value, dict):
+            digest.update(_stats_digest(value).encode())
+        elif isinstance(value, np.ndarray):
+            digest.update(value.tobytes())
+        else:
+            digest.update(repr(value).encode())
+    return digest.hexdigest()
+
+
+def _draw_histogram(ax, stats):
+    """Draws the histogram and density curve of distribution_stats() on 'ax'."""
+    ax.stairs(stats["counts"], stats["edges"], fill=True, alpha=0.75, edgecolor="white")
+    ax.plot(stats["kde_x"], stats["kde_y"], color="C0")
+    ax.set_ylabel("Count")
+
+
+def _draw_boxes(ax, groups, vert=True):
+    """Draws a box plot of each distribution_stats() in 'groups' (a dict of label to stats) on 'ax'."""
+    boxes = [{**stats, "label": str(label)} for label, stats in groups.items() if stats["count"]]
+    if not boxes:
+        return
+    palette = sns.color_palette(n_colors=len(boxes))
+    artists = ax.bxp(boxes, vert=vert, patch_artist=True, widths=0.8,
+                     medianprops={"color": "0.25"}, flierprops={"marker": "d", "markerfacecolor": "0.25", "markersize": 5})
+    for patch, color in zip(artists["boxes"], palette):
+        patch.set_facecolor(color)
+
+
+def draw_wsr_hours_histogram(stats):
+    """Histogram with density curve of the WSR Hours of a reconciled invoice, from invoice_chart_stats()."""
+    figure = Figure()
+    ax = figure.subplots()
+    _draw_histogram(ax, stats['WSR Hours'])
+    ax.set_xlabel('WSR Hours')
+    return figure
+
+
+def draw_hours_vs_rate_scatter(data):
+    """Scatter plot of the WSR Hours against the Contract Rate of a reconciled invoice."""
+    figure = Figure()
+    ax = figure.subplots()
+    sns.scatterplot(x='WSR Hours', y='Contract Rate', data=data, ax=ax)
+    return figure
+
+
+def draw_contract_rate_box(stats):
+    """Box plot of the Contract Rate of a reconciled invoice, from invoice_chart_stats()."""
+    figure = Figure()
+    ax = figure.subplots()
+    _draw_boxes(ax, {"": stats['Contract Rate']}, vert=False)
+    ax.set_yticks([])
+    ax.set_xlabel('Contract Rate')
+    return figure
+
+
+def draw_hourly_cost_histogram(stats):
+    """Histogram with density curve of the tripwire Hourly Cost, from tripwire_chart_stats()."""
+    figure = Figure()
+    ax = figure.subplots()
+    _draw_histogram(ax, stats["Hourly Cost $/hr"])
+    ax.set_title("Hourly Cost Distribution")
+    ax.set_xlabel("Hourly Cost $/hr")
+    ax.set_ylabel("Count")
+    return figure
+
+
+def draw_tripwire_box(stats):
+    """Box plot of the Hourly Cost above and below the tripwire rate, from tripwire_chart_stats()."""
+    figure = Figure()
+    ax = figure.subplots()
+    _draw_boxes(ax, stats["Above Tripwire Rate?"])
+    ax.set_title("Hourly Cost Distribution for Employees Above Tripwire Rate")
+    ax.set_xlabel("Above Tripwire Rate")
+    ax.set_ylabel("Hourly Cost $/hr")
+    return figure
+
+
+def draw_tripwire_pair(data):
+    """Pair plot of the numeric tripwire columns, colored by whether they are above the tripwire rate."""
+    grid = sns.pairplot(data, hue="Above Tripwire Rate?")
+    grid.fig.suptitle("Hourly Cost Relationships", y=1.02)
+    return grid.fig
+
+
+def draw_tripwire_pie(data):
+    """Pie chart of the share of employees above the tripwire rate."""
+    figure = Figure()
+    ax = figure.subplots()
+    data["Above Tripwire Rate?"].value_counts().plot.pie(autopct='%1.1f%%', ax=ax)
+    ax.set_title("Proportion of Employees Above Tripwire Rate")
+    return figure
+
+
+def draw_lcat_box(stats):
+    """Box plot of the Hourly Cost of each Correct LCAT Syntax, from tripwire_chart_stats()."""
+    figure = Figure(figsize=(12, 6))
+    ax = figure.subplots()
+    _draw_boxes(ax, stats["Correct LCAT Syntax"])
+    ax.set_xticklabels(ax.get_xticklabels(), rotation=45, ha="right")
+    ax.set_title("Hourly Cost Distribution by Correct LCAT Syntax")
+    ax.set_xlabel("Correct LCAT Syntax")
+    ax.set_ylabel("Hourly Cost $/hr")
+    return figure
+
+
+# Each chart type: the function drawing it and the columns of the DataFrame it reads (None
+# for every column). The charts drawn from invoice_chart_stats() or tripwire_chart_stats()
+# are given those statistics instead of a DataFrame.
+CHARTS = {
+    "wsr_hours_histogram": (draw_wsr_hours_histogram, None),
+    "hours_vs_rate_scatter": (draw_hours_vs_rate_scatter, ['WSR Hours', 'Contract Rate']),
+    "contract_rate_box": (draw_contract_rate_box, None),
+    "hourly_cost_histogram": (draw_hourly_cost_histogram, None),
+    "tripwire_box": (draw_tripwire_box, None),
+    "tripwire_pair": (draw_tripwire_pair, None),
+    "tripwire_pie": (draw_tripwire_pie, ["Above Tripwire Rate?"]),
+    "lcat_box": (draw_lcat_box, None),
+}
+
+
+def chart_png(chart_type, data, cache=figure_cache):
+    """
+    Return a chart as PNG bytes, drawing it only the first time its data is seen.
+
+    Parameters:
+    - chart_type (str): The chart to draw, one of CHARTS.
+    - data (pd.DataFrame or dict): The data to plot, or for the histograms and box plots the
+        statistics returned by invoice_chart_stats() or tripwire_chart_stats().
+    - cache (ExportCache, optional): Where rendered charts are looked up and stored (default is figure_cache).
+        Pass None to always draw the chart.
+
+    Returns:
+    - bytes: The rendered chart, ready for st.image.
+
+    Raises:
+    - ValueError: If 'chart_type' is not one of CHARTS.
+
+    Charts are keyed by their type and the content hash of the columns or statistics they
+    read, so a rerun of the page, or another session plotting the same data, serves the image
+    that was already rendered. The figure is closed as soon as it is rendered, so no figure
+    outlives the call.
+
+    Example usage:
+    st.image(chart_png("wsr_hours_histogram", st.session_state.chart_stats), use_column_width=True)
+    """
+    if chart_type not in CHARTS:
+        raise ValueError(f'Unknown chart "{chart_type}", expected one of {list(CHARTS)}.')
+    draw, columns = CHARTS[chart_type]
+    if not isinstance(data, pd.DataFrame):
+        key = (chart_type, _stats_digest(data))
+    else:
+        if columns is not None:
+            data = data[columns]
+        key = (chart_type, frame_digest(data))
+    if cache is not None:
+        png = cache.get(key)
+        if png is not None:
+            return png
+
+    figure = draw(data)
+    try:
+        buffer = BytesIO()
+        figure.savefig(buffer, format="png", dpi=FIGURE_DPI, bbox_inches="tight")
+        png = buffer.getvalue()
+    finally:
+        # Release the figure; figures drawn through pyplot would otherwise stay registered for the life of the process
+        plt.close(figure)
+
+    if cache is not None:
+        cache.put(key, png)
+    return png
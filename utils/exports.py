@@ -0,0 +1,223 @@
+import datetime
+import decimal
+import hashlib
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+
+# MIME type of the .xlsx files offered for download
+EXCEL_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Memory budget of the exported workbook cache shared by every session of the app
+DEFAULT_EXPORT_CACHE_BYTES = 128 * 1024 ** 2
+
+# Rows converted to Python values at a time while streaming a sheet
+EXPORT_CHUNK_ROWS = 10_000
+
+# Day zero of Excel's date serial numbers (the 1900 date system, for dates from March 1900)
+_EXCEL_EPOCH = pd.Timestamp("1899-12-30")
+
+# Cell types XlsxWriter writes natively; anything else is written as text
+_EXCEL_TYPES = (str, int, float, bool, decimal.Decimal, datetime.datetime, datetime.date, datetime.time, datetime.timedelta)
+
+
+def frame_digest(frame):
+    """
+    Returns a hash of the contents of a DataFrame: its column names, types and values.
+
+    Example usage:
+    key = frame_digest(result_df)
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr([(str(column), str(dtype)) for column, dtype in frame.dtypes.items()]).encode())
+    digest.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+class ExportCache:
+    """
+    Process-wide cache of exported workbook bytes with a memory budget and LRU eviction.
+
+    Entries are keyed by the content hash of the exported frames, so clicking the export
+    button again (or another analyst exporting the same result) serves the bytes that
+    were already written instead of serializing the workbook again. utils.charts keeps its
+    rendered chart images in a separate instance.
+
+    Example usage:
+    cache = ExportCache(max_bytes=64 * 1024 ** 2)
+    data = cache.get(key)
+    """
+
+    def __init__(self, max_bytes=DEFAULT_EXPORT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._files = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Returns the cached bytes for 'key', or None if they are not cached."""
+        with self._lock:
+            data = self._files.get(key)
+            if data is not None:
+                self._files.move_to_end(key)
+            return data
+
+    def put(self, key, data):
+        """Stores 'data' under 'key', evicting the least recently used files to stay within budget."""
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            self._files.pop(key, None)
+            self._files[key] = data
+            while sum(len(cached) for cached in self._files.values()) > self.max_bytes:
+                self._files.popitem(last=False)
+
+    def clear(self):
+        """Drops every cached file."""
+        with self._lock:
+            self._files.clear()
+
+
+export_cache = ExportCache()
+
+
+def _is_datetime(series):
+    """Returns True for datetime64 columns, timezone-aware or not."""
+    return pd.api.types.is_datetime64_any_dtype(series.dtype)
+
+
+def _cell_values(series):
+    """Returns the values of a column as Python objects XlsxWriter can write, with missing values as None."""
+    if _is_datetime(series):
+        # Dates become Excel serial numbers in one vectorized step instead of one conversion per cell
+        if series.dt.tz is not None:
+            series = series.dt.tz_localize(None)
+        serials = (series - _EXCEL_EPOCH) / pd.Timedelta(days=1)
+        return serials.astype(object).where(series.notna(), None).tolist()
+    values = series.astype(object)
+    values = values.where(series.notna(), None).tolist()
+    if series.dtype == object:
+        values = [value if value is None or isinstance(value, _EXCEL_TYPES) else str(value) for value in values]
+    return values
+
+
+def _row_format_codes(row_formats, n_rows):
+    """Returns, for each row, the position of the first (mask, format) pair matching it, or -1 for none."""
+    if not row_formats:
+        return np.full(n_rows, -1)
+    masks = [np.asarray(mask, dtype=bool) for mask, _ in row_formats]
+    return np.select(masks, np.arange(len(masks)), default=-1)
+
+
+def write_excel_sheets(sheets, target, row_formats=None, preamble=None):
+    """
+    Write DataFrames to an .xlsx workbook, one sheet each, streaming the rows.
+
+    Parameters:
+    - sheets (dict): Maps a sheet name to the DataFrame written on it (without its index).
+    - target (str or file-like): The file path or buffer to write to.
+    - row_formats (dict, optional): Maps a sheet name to a list of (mask, format) pairs,
+        where 'mask' is a boolean array with one value per row of the sheet and 'format'
+        the XlsxWriter format properties of the rows where it is True. The first matching
+        pair wins (default is None, no highlighting).
+    - preamble (dict, optional): Maps a sheet name to a list of rows, each a list of values,
+        written above the header of that sheet, for example a title (default is None).
+
+    The workbook is written in XlsxWriter's constant-memory mode: each row is flushed to
+    disk as soon as the next one starts, and the frame is converted to Python values
+    EXPORT_CHUNK_ROWS rows at a time, so the memory needed does not grow with the number
+    of rows. Which format each row gets is worked out for the whole sheet at once from
+    the masks, so the highlighting is written in the same pass as the values. Date columns
+    are converted to Excel serial numbers a chunk at a time and keep their date format on
+    highlighted rows. Text is always written as text, never as formulas or links.
+
+    Example usage:
+    write_excel_sheets({"Reconciled Invoice": raw_invoice_copy}, "InvoiceReview.xlsx")
+    """
+    workbook = xlsxwriter.Workbook(target, {
+        "constant_memory": True,
+        "strings_to_formulas": False,
+        "strings_to_urls": False,
+        "default_date_format": "yyyy-mm-dd hh:mm:ss",
+        "remove_timezone": True,
+    })
+    header_format = workbook.add_format({"bold": True, "border": 1, "align": "center", "valign": "top"})
+    date_properties = {"num_format": "yyyy-mm-dd hh:mm:ss"}
+    row_formats = row_formats or {}
+    preamble = preamble or {}
+    try:
+        for sheet_name, frame in sheets.items():
+            worksheet = workbook.add_worksheet(sheet_name)
+            for row_number, values in enumerate(preamble.get(sheet_name, [])):
+                worksheet.write_row(row_number, 0, values)
+            header_row = len(preamble.get(sheet_name, []))
+            worksheet.write_row(header_row, 0, [str(column) for column in frame.columns], header_format)
+
+            # Pick the format of every cell of each highlight up front; the last entry is for unhighlighted rows
+            is_date = [_is_datetime(frame.iloc[:, position]) for position in range(frame.shape[1])]
+            highlights = [properties for _, properties in row_formats.get(sheet_name, [])] + [{}]
+            formats = []
+            for properties in highlights:
+                row_format = workbook.add_format(properties) if properties else None
+                date_format = workbook.add_format({**properties, **date_properties})
+                formats.append([date_format if date else row_format for date in is_date])
+            format_codes = _row_format_codes(row_formats.get(sheet_name), len(frame))
+
+            for start in range(0, len(frame), EXPORT_CHUNK_ROWS):
+                chunk = frame.iloc[start:start + EXPORT_CHUNK_ROWS]
+                columns = [_cell_values(chunk.iloc[:, position]) for position in range(chunk.shape[1])]
+                chunk_formats = format_codes[start:start + EXPORT_CHUNK_ROWS].tolist()
+                for offset, row in enumerate(zip(*columns)):
+                    cell_formats = formats[chunk_formats[offset]]
+                    for column, value in enumerate(row):
+                        worksheet.write(header_row + start + offset + 1, column, value, cell_formats[column])
+    finally:
+        workbook.close()
+
+
+def _export_key(sheets, row_formats):
+    """Returns the cache key of an export: the content hash of every sheet and of its row highlighting."""
+    key = []
+    for sheet_name, frame in sheets.items():
+        highlights = row_formats.get(sheet_name, [])
+        codes = _row_format_codes(highlights, len(frame))
+        key.append((sheet_name, frame_digest(frame), repr([properties for _, properties in highlights]),
+                    hashlib.blake2b(codes.tobytes(), digest_size=16).hexdigest()))
+    return tuple(key)
+
+
+def excel_export(sheets, row_formats=None, cache=export_cache):
+    """
+    Return frames as the bytes of an .xlsx file, reusing earlier exports of the same data.
+
+    Parameters:
+    - sheets (pd.DataFrame or dict): The frame to export on a sheet named "Sheet1", or a
+        dict mapping sheet names to frames.
+    - row_formats (dict, optional): The row highlighting, as in write_excel_sheets() (default is None).
+    - cache (ExportCache, optional): Where exports are looked up and stored (default is export_cache).
+        Pass None to always write the file.
+
+    Returns:
+    - bytes: The workbook, ready for st.download_button.
+
+    Example usage:
+    st.download_button("Download Excel File", excel_export(result_df), "result.xlsx", EXCEL_MIME)
+    """
+    if isinstance(sheets, pd.DataFrame):
+        sheets = {"Sheet1": sheets}
+    row_formats = row_formats or {}
+    key = _export_key(sheets, row_formats)
+    if cache is not None:
+        data = cache.get(key)
+        if data is not None:
+            return data
+
+    buffer = BytesIO()
+    write_excel_sheets(sheets, buffer, row_formats)
+    data = buffer.getvalue()
+    if cache is not None:
+        cache.put(key, data)
+    return data
@@ -0,0 +1,202 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+from utils.instrumentation import frame_rows, measured_call
+from utils.loaders import file_digest, parsed_frame_cache, read_excel_from_header, read_wsr_invoice_review
+from utils.memory import compact_frame
+from utils.names import normalize_names
+from utils.reconciliation import WSR_NAME_COLUMN, WSR_VENDOR_COLUMN, build_wsr_cube
+
+# Upper bound on the worker processes; there are at most three uploads per page
+MAX_INGESTION_WORKERS = 3
+
+
+def load_raw_invoice(file_path, cache=parsed_frame_cache):
+    """
+    Load a TO29 or TO32 raw invoice, ready for the reconciliation.
+
+    Parameters:
+    - file_path (str or file-like): The raw invoice Excel file.
+    - cache (ParsedFrameCache, optional): The parsed workbook cache (default is parsed_frame_cache).
+
+    Returns:
+    - pd.DataFrame: The invoice from its "Unique ID" header row, with middle initials
+        removed from "Name" and without the "Grand Total" row or the "Unnamed: 0" column,
+        compacted with compact_frame().
+    """
+    raw_invoice = read_excel_from_header(file_path, "Unique ID", cache=cache)
+    raw_invoice["Name"] = normalize_names(raw_invoice["Name"])
+    raw_invoice = raw_invoice[raw_invoice["Name"] != "Grand Total"]
+
+    # Check if the "Unnamed: 0" column exists
+    if "Unnamed: 0" in raw_invoice.columns:
+        raw_invoice = raw_invoice.drop("Unnamed: 0", axis=1)
+    return compact_frame(raw_invoice)
+
+
+def load_wsr_consolidated(file_path, cache=parsed_frame_cache, skip_weeks=None):
+    """
+    Load the WSR Consolidated file as the (contractor, week) cube used by the reconciliation.
+
+    Parameters:
+    - file_path (str or file-like): The WSR Consolidated Excel file.
+    - cache (ParsedFrameCache, optional): The parsed workbook cache (default is parsed_frame_cache).
+    - skip_weeks (iterable, optional): Reporting Weeks to leave out of the cube (default is None).
+
+    Returns:
+    - pd.DataFrame: The cube returned by build_wsr_cube(), with middle initials removed from
+        the contractor names and the "Grand Total" row left out, compacted with compact_frame().
+    """
+    wsr_consolidated = read_wsr_invoice_review(file_path, cache=cache, skip_weeks=skip_weeks)
+    wsr_consolidated[WSR_NAME_COLUMN] = normalize_names(wsr_consolidated[WSR_NAME_COLUMN])
+    wsr_consolidated = wsr_consolidated[wsr_consolidated[WSR_VENDOR_COLUMN] != "Grand Total"]
+    return compact_frame(build_wsr_cube(wsr_consolidated))
+
+
+def load_onboarding_tracker(file_path, cache=parsed_frame_cache):
+    """
+    Load the "Master List" sheet of the Onboarding Tracker.
+
+    Parameters:
+    - file_path (str or file-like): The Onboarding Tracker Excel file.
+    - cache (ParsedFrameCache, optional): The parsed workbook cache (default is parsed_frame_cache).
+
+    Returns:
+    - pd.DataFrame: The sheet from its "Candidate Unique ID" header row, with middle initials
+        removed from "Candidate Name", compacted with compact_frame().
+    """
+    onboarding_tracker = read_excel_from_header(file_path, "Candidate Unique ID", "Master List", cache=cache)
+    onboarding_tracker["Candidate Name"] = normalize_names(onboarding_tracker["Candidate Name"])
+    return compact_frame(onboarding_tracker)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """Returns the process pool shared by every session, starting it on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Spawn rather than fork: the Streamlit server runs threads that must not be copied
+            _executor = ProcessPoolExecutor(
+                max_workers=min(MAX_INGESTION_WORKERS, os.cpu_count() or 1),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _executor
+
+
+def _reset_executor():
+    """Drops a process pool whose worker died so the next call starts a fresh one."""
+    global _executor
+    with _executor_lock:
+        _executor = None
+
+
+def shutdown_executor():
+    """Stops the worker processes of the shared pool, for processes that exit while it is running; the next load starts a new one."""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown()
+
+
+def _file_bytes(file):
+    """Returns the contents of a file path or an uploaded file."""
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, "rb") as handle:
+            return handle.read()
+    return file.getvalue()
+
+
+def _load_in_worker(loader, data, name, stage):
+    """Runs 'loader' on an in-memory copy of an uploaded file inside a worker process, measured as 'stage'."""
+    file = BytesIO(data)
+    # Keep the file name so the loaders can tell .xlsb from .xlsx
+    file.name = name
+    return measured_call(stage, loader, file, cache=None)
+
+
+def load_files_in_parallel(files, cache=parsed_frame_cache, recorder=None):
+    """
+    Load several uploaded files concurrently in worker processes.
+
+    Parameters:
+    - files (dict): Maps a key to a (loader, file) pair, where 'loader' is one of the load_*
+        functions of this module and 'file' is an uploaded file or a file path.
+    - cache (ParsedFrameCache, optional): Where finished frames are looked up and stored
+        (default is the process-wide parsed_frame_cache). Pass None to always load the files.
+    - recorder (StageRecorder, optional): Records the load of each file as a stage named by
+        its key, with its steps, also when it runs in a worker process (default is None).
+
+    Returns:
+    - tuple: A dict of the loaded DataFrames and a dict of the exceptions raised, both keyed
+        like 'files', so each failed file can be reported on its own.
+
+    Excel parsing is CPU-bound, so running each loader in its own process brings the wall
+    time close to that of the slowest file instead of the sum of all of them. The header
+    detection and name normalization run inside the workers and only the finished frames
+    are sent back. A single file to load is run in this process to skip the start-up cost.
+
+    Example usage:
+    frames, errors = load_files_in_parallel({"raw_invoice": (load_raw_invoice, uploaded_raw_invoice)})
+    """
+    frames = {}
+    errors = {}
+    pending = {}
+
+    # Finished frames are cached per loader, since each loader cleans the file differently
+    keys = {}
+    for key, (loader, file) in files.items():
+        if cache is not None:
+            keys[key] = (file_digest(file), loader.__name__)
+            frame = cache.get(keys[key])
+            if frame is not None:
+                frames[key] = frame
+                if recorder is not None:
+                    recorder.reused(key)
+                continue
+        pending[key] = (loader, file)
+
+    if len(pending) == 1:
+        for key, (loader, file) in pending.items():
+            try:
+                if recorder is None:
+                    frames[key] = loader(file, cache=None)
+                else:
+                    with recorder.measure(key) as record:
+                        frames[key] = loader(file, cache=None)
+                        record["rows"] = frame_rows(frames[key])
+            except Exception as e:
+                errors[key] = e
+    elif pending:
+        futures = {}
+        for key, (loader, file) in pending.items():
+            try:
+                futures[key] = _get_executor().submit(_load_in_worker, loader, _file_bytes(file), getattr(file, "name", str(file)), key)
+            except BrokenProcessPool as e:
+                _reset_executor()
+                errors[key] = e
+        for key, future in futures.items():
+            try:
+                frames[key], records = future.result()
+                if recorder is not None:
+                    recorder.extend(records)
+            except BrokenProcessPool as e:
+                _reset_executor()
+                errors[key] = e
+            except Exception as e:
+                errors[key] = e
+
+    if cache is not None:
+        for key in pending:
+            if key in frames:
+                cache.put(keys[key], frames[key])
+                frames[key] = frames[key].copy()
+    return frames, errors
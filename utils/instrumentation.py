@@ -0,0 +1,217 @@
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows; the peak RSS of a stage is then left blank
+    resource = None
+
+# Columns of StageRecorder.report(), and the key of each column in the JSON lines log
+STAGE_METRIC_COLUMNS = ["Stage", "Status", "Wall (s)", "CPU (s)", "Peak RSS Δ (MB)", "Rows"]
+STAGE_LOG_FIELDS = {
+    "Stage": "stage",
+    "Status": "status",
+    "Wall (s)": "wall_seconds",
+    "CPU (s)": "cpu_seconds",
+    "Peak RSS Δ (MB)": "peak_rss_delta_mb",
+    "Rows": "rows",
+}
+
+# JSON lines file the stage metrics of every page run are appended to; set IBERIA_STAGE_LOG to move it
+STAGE_LOG_PATH = os.environ.get("IBERIA_STAGE_LOG", os.path.join("logs", "stage_metrics.jsonl"))
+
+# The recorder and the name of the stage being measured in the current thread, for nested measurements
+_active_stage = contextvars.ContextVar("active_stage", default=None)
+
+
+def peak_rss_bytes():
+    """Returns the largest resident set size this process has reached, in bytes, or None where it is not available."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def frame_rows(*values):
+    """Returns the rows of the largest DataFrame or Series among 'values', looking one level into tuples, lists and dicts."""
+    rows = 0
+    for value in values:
+        if isinstance(value, dict):
+            value = list(value.values())
+        if isinstance(value, (list, tuple)):
+            rows = max([rows] + [len(item) for item in value if isinstance(item, (pd.DataFrame, pd.Series))])
+        elif isinstance(value, (pd.DataFrame, pd.Series)):
+            rows = max(rows, len(value))
+    return rows
+
+
+class StageRecorder:
+    """
+    Wall time, CPU time, peak RSS growth and rows of each stage of a page run.
+
+    CPU time is that of the thread running the stage, so stages running at the same time
+    in other sessions or jobs are not counted. Peak RSS Δ is how much the stage raised the
+    high-water mark of the process memory: a stage that stays below an earlier peak shows 0.
+    Measurements nested inside a stage, also in other modules through measure(), are
+    recorded as "<stage> / <step>".
+
+    Example usage:
+    recorder = StageRecorder()
+    with recorder.measure("reconcile") as record:
+        result = reconcile_invoice(raw_invoice, "Total", wsr_index, onboarding_lookup, 4)
+        record["rows"] = len(raw_invoice)
+    metrics = recorder.report()
+    """
+
+    def __init__(self):
+        self._records = []
+        self._lock = threading.Lock()
+
+    def start(self, stage, rows=0):
+        """Starts measuring 'stage' and returns its record; pass it to finish(). Stages run meanwhile are not nested under it."""
+        record = {"stage": stage, "status": "computed", "wall_seconds": 0.0, "cpu_seconds": 0.0, "peak_rss_delta_mb": None, "rows": rows}
+        record["_start"] = (time.perf_counter(), time.thread_time(), peak_rss_bytes())
+        with self._lock:
+            # An unfinished record of the same stage was interrupted, for example by a rerun, and is dropped
+            self._records = [other for other in self._records if not ("_start" in other and other["stage"] == stage)]
+            self._records.append(record)
+        return record
+
+    def finish(self, record):
+        """Completes a record returned by start() with the time and memory used since."""
+        wall_start, cpu_start, rss_start = record.pop("_start")
+        record["wall_seconds"] = time.perf_counter() - wall_start
+        record["cpu_seconds"] = time.thread_time() - cpu_start
+        rss_end = peak_rss_bytes()
+        if rss_start is not None and rss_end is not None:
+            record["peak_rss_delta_mb"] = (rss_end - rss_start) / 1024 ** 2
+
+    @contextmanager
+    def measure(self, stage, rows=0):
+        """Measures the enclosed block as 'stage' and yields its record, whose "rows" can be set inside the block."""
+        record = self.start(stage, rows)
+        token = _active_stage.set((self, stage))
+        try:
+            yield record
+        finally:
+            _active_stage.reset(token)
+            self.finish(record)
+
+    def reused(self, stage):
+        """Records that 'stage' was served from memory."""
+        with self._lock:
+            self._records.append({"stage": stage, "status": "reused", "wall_seconds": 0.0, "cpu_seconds": 0.0, "peak_rss_delta_mb": None, "rows": 0})
+
+    def extend(self, records):
+        """Adds finished records measured elsewhere, for example by measured_call() in a worker process."""
+        with self._lock:
+            self._records.extend(dict(record) for record in records)
+
+    def take(self):
+        """Returns the finished records and removes them from the recorder; records still being measured are kept."""
+        with self._lock:
+            finished = [record for record in self._records if "_start" not in record]
+            self._records = [record for record in self._records if "_start" in record]
+        return finished
+
+    def report(self):
+        """
+        Return the stages measured since the last report, and remove them from the recorder.
+
+        Returns:
+        - pd.DataFrame: One row per stage and status with the columns in STAGE_METRIC_COLUMNS,
+            in the order the stages started. A stage measured several times, for example once
+            per chunk, is summed, with the largest peak RSS growth of its runs.
+        """
+        metrics = pd.DataFrame(self.take(), columns=list(STAGE_LOG_FIELDS.values()))
+        metrics = metrics.astype({"wall_seconds": float, "cpu_seconds": float, "peak_rss_delta_mb": float, "rows": int})
+        metrics = metrics.groupby(["stage", "status"], sort=False, as_index=False).agg(
+            {"wall_seconds": "sum", "cpu_seconds": "sum", "peak_rss_delta_mb": "max", "rows": "sum"}
+        )
+        metrics = metrics.rename(columns={field: column for column, field in STAGE_LOG_FIELDS.items()})
+        return metrics.round({"Wall (s)": 3, "CPU (s)": 3, "Peak RSS Δ (MB)": 1})
+
+
+@contextmanager
+def measure(stage, rows=0):
+    """
+    Measure a step of the stage running in this thread.
+
+    Parameters:
+    - stage (str): The name of the step, recorded as "<enclosing stage> / <stage>".
+    - rows (int, optional): The rows the step processes (default is 0).
+
+    Yields:
+    - dict: The record of the step. Outside of a measured stage nothing is recorded and the
+        block runs with only the cost of one lookup.
+
+    Example usage:
+    with measure("WSR windowing", rows=len(names)):
+        hours, cost = wsr_index.window_totals(names, start_dates, end_dates)
+    """
+    active = _active_stage.get()
+    if active is None:
+        yield {"rows": rows}
+        return
+    recorder, parent = active
+    with recorder.measure(f"{parent} / {stage}", rows) as record:
+        yield record
+
+
+def measured_call(stage, func, *args, **kwargs):
+    """
+    Call 'func' as a measured stage of its own, for work run in a worker process.
+
+    Returns:
+    - tuple: The value returned by 'func' and the list of records measured, to pass to
+        StageRecorder.extend() in the process that started the work.
+    """
+    recorder = StageRecorder()
+    with recorder.measure(stage) as record:
+        value = func(*args, **kwargs)
+        record["rows"] = frame_rows(value)
+    return value, recorder.take()
+
+
+def append_stage_log(metrics, page, path=STAGE_LOG_PATH):
+    """
+    Append the computed stages of a page run to a JSON lines log, for trend analysis.
+
+    Parameters:
+    - metrics (pd.DataFrame): The report returned by StageRecorder.report().
+    - page (str): The name of the page, written on every line.
+    - path (str, optional): The log file, created with its folder if missing (default is STAGE_LOG_PATH).
+
+    Returns:
+    - int: The number of lines written. Reruns that only reused stages are not logged.
+
+    Each line holds the time of the run, the page and the fields in STAGE_LOG_FIELDS of one stage.
+
+    Example usage:
+    append_stage_log(pipeline.report(), "TO29 Invoice Review")
+    """
+    computed = metrics[metrics["Status"] == "computed"]
+    if computed["Stage"].isin(["page"]).all():
+        return 0
+
+    # One timestamp per run so its stages can be grouped back together
+    logged_at = datetime.now().isoformat(timespec="seconds")
+    lines = []
+    for row in computed.rename(columns=STAGE_LOG_FIELDS).to_dict("records"):
+        row = {key: (None if pd.isna(value) else value) for key, value in row.items()}
+        lines.append(json.dumps({"logged_at": logged_at, "page": page, **row}))
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a", encoding="utf-8") as log:
+        log.write("\n".join(lines) + "\n")
+    return len(lines)
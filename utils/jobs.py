@@ -0,0 +1,140 @@
+import os
+import threading
+import time
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+
+# Reviews run at the same time across all sessions; set IBERIA_JOB_WORKERS to change it.
+# Further jobs wait in the queue, so the reviews never use more than this many cores
+MAX_JOB_WORKERS = int(os.environ.get("IBERIA_JOB_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+
+# Seconds between two refreshes of a page waiting for its job
+JOB_POLL_SECONDS = 0.5
+
+
+class JobCancelled(Exception):
+    """Raised inside a job, and by Job.result(), once the job has been cancelled."""
+
+
+class Job:
+    """
+    A review running in the background on the shared job pool.
+
+    The function of the job is given a 'progress' keyword argument: calling progress(rows)
+    adds 'rows' to the rows processed and raises JobCancelled once the job was cancelled,
+    so long-running work can stop between two chunks.
+
+    Example usage:
+    job = submit_job(reconcile_invoice, raw_invoice, "Total", wsr_index, onboarding_lookup, 4, total_rows=len(raw_invoice))
+    rows_done, total_rows, rows_per_second = job.progress_info()
+    """
+
+    def __init__(self, total_rows=0):
+        self.total_rows = total_rows
+        self.rows_done = 0
+        self.started = None
+        self.finished = None
+        self.future = Future()
+        self._cancelled = threading.Event()
+
+    def progress(self, rows, total_rows=None):
+        """Records 'rows' more rows processed, and the rows to process once they are known. Raises JobCancelled if the job was cancelled."""
+        if self._cancelled.is_set():
+            raise JobCancelled()
+        if total_rows is not None:
+            self.total_rows = total_rows
+        self.rows_done += rows
+
+    def progress_info(self):
+        """Returns the rows processed, the rows to process and the rows processed per second so far."""
+        if self.started is None:
+            return self.rows_done, self.total_rows, 0.0
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        return self.rows_done, self.total_rows, self.rows_done / elapsed if elapsed > 0 else 0.0
+
+    def cancel(self):
+        """Asks the job to stop: a queued job never starts, a running one stops at its next progress report."""
+        self._cancelled.set()
+        self.future.cancel()
+
+    def cancelled(self):
+        """Returns True if the job was cancelled."""
+        return self._cancelled.is_set()
+
+    def running(self):
+        """Returns True if the job has started and not finished."""
+        return self.started is not None and not self.done()
+
+    def done(self):
+        """Returns True once the job finished, failed or was cancelled."""
+        return self.future.done()
+
+    def result(self):
+        """
+        Return the value of the finished job.
+
+        Raises:
+        - JobCancelled: If the job was cancelled.
+        - Exception: Whatever the job's function raised.
+        """
+        try:
+            return self.future.result()
+        except CancelledError:
+            raise JobCancelled()
+
+    def _run(self, func, args, kwargs):
+        """Runs the job's function on a worker thread and settles its future."""
+        if not self.future.set_running_or_notify_cancel():
+            return
+        self.started = time.perf_counter()
+        try:
+            value = func(*args, progress=self.progress, **kwargs)
+        except BaseException as e:
+            self.future.set_exception(e)
+        else:
+            self.future.set_result(value)
+        finally:
+            self.finished = time.perf_counter()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """Returns the job pool shared by every session, starting it on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_JOB_WORKERS, thread_name_prefix="review-job")
+        return _executor
+
+
+def submit_job(func, *args, total_rows=0, **kwargs):
+    """
+    Run a review in the background on the pool shared by all sessions.
+
+    Parameters:
+    - func (callable): The review to run; it must accept a 'progress' keyword argument, see Job.
+    - *args, **kwargs: The arguments of 'func'.
+    - total_rows (int, optional): The rows the job will process, for the progress bar (default is 0).
+
+    Returns:
+    - Job: The queued job. Poll it with done() and collect its value with result().
+
+    At most MAX_JOB_WORKERS jobs run at a time; the others wait in the queue. Jobs run on
+    threads of the Streamlit process, so they can use the indexes and frames of the session
+    without copying them, and the numpy work of a review releases the interpreter lock.
+
+    Example usage:
+    st.session_state.job = submit_job(review_tripwire, tracker_df, hourly_cost_df, lcat_df, total_rows=len(hourly_cost_df))
+    """
+    job = Job(total_rows)
+    _get_executor().submit(job._run, func, args, kwargs)
+    return job
+
+
+def finished_job(value):
+    """Returns a Job that already finished with 'value', for results that did not need to be computed."""
+    job = Job()
+    job.future.set_result(value)
+    return job
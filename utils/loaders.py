@@ -0,0 +1,419 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pyxlsb
+from openpyxl import load_workbook
+
+from utils.instrumentation import measure
+from utils.reconciliation import WSR_COST_COLUMN, WSR_HOURS_COLUMN, WSR_NAME_COLUMN, WSR_VENDOR_COLUMN, WSR_WEEK_COLUMN
+
+# Memory budget of the parsed workbook cache shared by every session of the app
+DEFAULT_CACHE_BYTES = 512 * 1024 ** 2
+
+# The only WSR Consolidated "Invoice Review" columns the reconciliation uses
+WSR_COLUMNS = [WSR_VENDOR_COLUMN, WSR_NAME_COLUMN, WSR_WEEK_COLUMN, WSR_HOURS_COLUMN, WSR_COST_COLUMN]
+
+# Pivot row labels that Excel only writes on the first row of each merged block
+WSR_MERGED_COLUMNS = [WSR_VENDOR_COLUMN, WSR_NAME_COLUMN, WSR_WEEK_COLUMN]
+
+# Day zero of Excel's serial date numbers
+EXCEL_EPOCH = datetime(1899, 12, 30)
+
+
+class ParsedFrameCache:
+    """
+    Process-wide cache of parsed Excel sheets with a memory budget and LRU eviction.
+
+    Entries are keyed by a hash of the uploaded file's bytes plus the sheet and the
+    column marking the header row that were read, so a second analyst uploading the same file gets the parsed
+    frame without re-reading the workbook. When the cached frames grow past
+    'max_bytes' the least recently used ones are dropped.
+
+    Callers always receive a copy, so changes made by one session never leak into
+    the cached frame or into another session.
+
+    Example usage:
+    cache = ParsedFrameCache(max_bytes=256 * 1024 ** 2)
+    frame = cache.get(key)
+    """
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._frames = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Returns a copy of the cached frame for 'key', or None if it is not cached."""
+        with self._lock:
+            frame = self._frames.get(key)
+            if frame is None:
+                self.misses += 1
+                return None
+            self._frames.move_to_end(key)
+            self.hits += 1
+        return frame.copy()
+
+    def put(self, key, frame):
+        """Stores 'frame' under 'key', evicting the least recently used frames to stay within budget."""
+        size = int(frame.memory_usage(index=True, deep=True).sum())
+        if size > self.max_bytes:
+            # Never let one oversized workbook flush the whole cache
+            return
+        with self._lock:
+            if key in self._frames:
+                del self._frames[key]
+                del self._sizes[key]
+            self._frames[key] = frame
+            self._sizes[key] = size
+            while sum(self._sizes.values()) > self.max_bytes:
+                evicted_key, _ = self._frames.popitem(last=False)
+                del self._sizes[evicted_key]
+
+    def clear(self):
+        """Drops every cached frame and resets the hit and miss counts."""
+        with self._lock:
+            self._frames.clear()
+            self._sizes.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Returns the hit and miss counts, the number of cached frames and their total size in bytes."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._frames),
+                "bytes": sum(self._sizes.values()),
+            }
+
+
+# Cache shared by all pages and sessions in this process
+parsed_frame_cache = ParsedFrameCache()
+
+
+def file_digest(file):
+    """Returns a hash of the contents of a file path or an uploaded file."""
+    digest = hashlib.blake2b(digest_size=20)
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, "rb") as handle:
+            for chunk in iter(lambda: handle.read(1024 ** 2), b""):
+                digest.update(chunk)
+    else:
+        digest.update(file.getbuffer())
+    return digest.hexdigest()
+
+
+def _is_xlsb(file):
+    """Returns `True` if the file (a path or an uploaded file) is a binary .xlsb workbook."""
+    name = file if isinstance(file, (str, os.PathLike)) else getattr(file, "name", "")
+    return str(name).lower().endswith(".xlsb")
+
+
+def _rewind(file):
+    """Moves an uploaded file back to its start so it can be read again."""
+    if hasattr(file, "seek"):
+        file.seek(0)
+
+
+def _iter_book_rows(workbook, sheet_name=None):
+    """
+    Stream the rows of a sheet of an open workbook as (row index, cell values) pairs.
+
+    The workbook is either a pyxlsb workbook or an openpyxl workbook opened in read-only
+    mode, as found on 'pd.ExcelFile.book'. The row index matches the one pandas gives
+    the row when the sheet is read with header=None, so it can be passed straight to
+    'skiprows'. Cells are read lazily, so stopping early avoids parsing the rest of
+    the sheet.
+    """
+    if isinstance(workbook, pyxlsb.Workbook):
+        # pyxlsb sheets are numbered from 1
+        with workbook.get_sheet(1 if sheet_name is None else sheet_name) as sheet:
+            for row in sheet.rows(sparse=True):
+                if not row:
+                    continue
+                # Sparse rows only hold the stored cells, so put each value back at its column
+                values = [None] * (max(cell.c for cell in row) + 1)
+                for cell in row:
+                    values[cell.c] = cell.v
+                yield row[0].r, values
+    else:
+        if sheet_name is None:
+            sheet = workbook.worksheets[0]
+        elif sheet_name in workbook.sheetnames:
+            sheet = workbook[sheet_name]
+        else:
+            raise ValueError(f"Worksheet named '{sheet_name}' not found")
+        sheet.reset_dimensions()
+        for row_number, row in enumerate(sheet.iter_rows(values_only=True)):
+            yield row_number, row
+
+
+def _find_header_row(workbook, column_name, sheet_name=None):
+    """Returns the index of the first row of a sheet of an open workbook that contains 'column_name'."""
+    rows = _iter_book_rows(workbook, sheet_name)
+    with measure("header detection") as record:
+        try:
+            for row_number, values in rows:
+                if column_name in values:
+                    record["rows"] = row_number + 1
+                    return row_number
+        finally:
+            rows.close()
+
+    raise ValueError(f'Column "{column_name}" not found in the sheet "{sheet_name}" of the file.')
+
+
+def find_start_row(file_path, column_name, sheet_name=None):
+    """
+    Find the starting row index containing a specific column name in an Excel sheet.
+
+    Parameters:
+    - file_path (str or file-like): The Excel file (.xlsx or .xlsb) to be searched.
+    - column_name (str): The name of the column to search for within the sheet.
+    - sheet_name (str, optional): The name of the sheet in the Excel file (default is None).
+        If sheet_name is not provided, the function searches the first sheet.
+
+    Returns:
+    - int: The row index where the specified column name is found.
+
+    Raises:
+    - ValueError: If the specified column name is not found in the sheet.
+
+    The sheet is streamed row by row and the search stops at the header, so only the
+    rows above the header are parsed instead of the whole sheet.
+
+    Example usage:
+    start_row = find_start_row("example.xlsx", "Name", "Sheet1")
+    """
+    try:
+        if _is_xlsb(file_path):
+            with pyxlsb.open_workbook(file_path) as workbook:
+                return _find_header_row(workbook, column_name, sheet_name)
+        workbook = load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+        try:
+            return _find_header_row(workbook, column_name, sheet_name)
+        finally:
+            workbook.close()
+    finally:
+        # Hand the file back at its start for the full read
+        _rewind(file_path)
+
+
+def read_excel_sheets(file_path, header_columns, cache=parsed_frame_cache):
+    """
+    Read several sheets of an Excel file, opening the workbook only once.
+
+    Parameters:
+    - file_path (str or file-like): The Excel file (.xlsx or .xlsb) to be read.
+    - header_columns (dict): Maps each sheet name to the name of a column in its header row,
+        or to None if the header is the first row. A sheet name of None means the first sheet.
+    - cache (ParsedFrameCache, optional): The cache to look the sheets up in and store them to
+        (default is the process-wide parsed_frame_cache). Pass None to always parse the file.
+
+    Returns:
+    - dict: Maps each sheet name in 'header_columns' to its DataFrame, starting from the header row.
+
+    Raises:
+    - ValueError: If a sheet or header column is not found in the file.
+
+    Every header row is located by streaming the first rows of its sheet, and every
+    sheet is parsed once, all from the same open workbook. Sheets that were already
+    parsed by any session are served from the cache without opening the file.
+
+    Example usage:
+    sheets = read_excel_sheets(tracker_file, {"Tripwire Tracker": "Candidate Name", "LCAT Normalization": None})
+    """
+    frames = {}
+    keys = {}
+
+    # The column name fixes the header row for a given file, so it stands in for it in the key
+    if cache is not None:
+        digest = file_digest(file_path)
+        for sheet_name, column_name in header_columns.items():
+            keys[sheet_name] = (digest, sheet_name, column_name)
+            frame = cache.get(keys[sheet_name])
+            if frame is not None:
+                frames[sheet_name] = frame
+
+    missing = [sheet_name for sheet_name in header_columns if sheet_name not in frames]
+    if not missing:
+        return frames
+
+    try:
+        with pd.ExcelFile(file_path) as workbook:
+            for sheet_name in missing:
+                column_name = header_columns[sheet_name]
+                start_row = 0 if column_name is None else _find_header_row(workbook.book, column_name, sheet_name)
+                frame = workbook.parse(0 if sheet_name is None else sheet_name, skiprows=range(start_row))
+                if cache is not None:
+                    cache.put(keys[sheet_name], frame)
+                    frame = frame.copy()
+                frames[sheet_name] = frame
+    finally:
+        _rewind(file_path)
+
+    return frames
+
+
+def _excel_serial(value):
+    """Returns an Excel cell value as a serial date number, or NaN if it is not a date."""
+    if isinstance(value, datetime):
+        return (value - EXCEL_EPOCH).total_seconds() / 86400
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return np.nan
+
+
+def _read_projected_rows(rows, columns, header_column, fill_columns=(), keep_row=None):
+    """
+    Collect the values of 'columns' from streamed (row index, values) pairs.
+
+    The header is the first row containing 'header_column'. Rows with none of the
+    projected columns filled are skipped, like pandas skips blank lines. Blank cells
+    of 'fill_columns' take the last value seen above them as the rows are read, and
+    'keep_row', if given, is called with each filled row to decide whether to keep it.
+    """
+    for _, header in rows:
+        if header_column in header:
+            break
+    else:
+        raise ValueError(f'Column "{header_column}" not found in the sheet.')
+
+    header = list(header)
+    missing = [column for column in columns if column not in header]
+    if missing:
+        raise ValueError(f"Columns {missing} not found in the header row of the sheet.")
+    positions = [header.index(column) for column in columns]
+    fill = [column in fill_columns for column in columns]
+    last_values = [None] * len(columns)
+
+    data = [[] for _ in columns]
+    for _, values in rows:
+        width = len(values)
+        projected = [values[position] if position < width else None for position in positions]
+        if all(value is None or value == "" for value in projected):
+            continue
+
+        # Forward-fill the merged cells as we go, so skipped rows still pass their labels on
+        for i, value in enumerate(projected):
+            if not fill[i]:
+                continue
+            if value is None or value == "":
+                projected[i] = last_values[i]
+            else:
+                last_values[i] = value
+
+        if keep_row is not None and not keep_row(projected):
+            continue
+        for column_values, value in zip(data, projected):
+            column_values.append(value)
+    return data
+
+
+def read_wsr_invoice_review(file_path, sheet_name="Invoice Review", cache=parsed_frame_cache, skip_weeks=None):
+    """
+    Read only the columns of the WSR Consolidated "Invoice Review" sheet that the reconciliation uses.
+
+    Parameters:
+    - file_path (str or file-like): The WSR Consolidated file (.xlsb, or .xlsx).
+    - sheet_name (str, optional): The name of the pivot sheet (default is "Invoice Review").
+    - cache (ParsedFrameCache, optional): The cache to look the sheet up in and store it to
+        (default is the process-wide parsed_frame_cache). Pass None to always parse the file.
+    - skip_weeks (iterable, optional): Reporting Weeks whose rows are left out, for example the
+        weeks already kept elsewhere (default is None). The cache is not used when this is given.
+        The whole sheet is still streamed; only the rows of these weeks are not kept.
+
+    Returns:
+    - pd.DataFrame: The WSR_COLUMNS of the sheet, with the Reporting Week as datetime64,
+        the hours and cost as floats, and the merged pivot labels forward-filled.
+
+    Raises:
+    - ValueError: If the header row or one of WSR_COLUMNS is not found in the sheet.
+
+    The sheet is streamed row by row in a single pass: the header row is the first row
+    containing "Vendor Name", and from then on only the cells of WSR_COLUMNS are kept.
+    Only WSR_MERGED_COLUMNS are forward-filled, as the rows are read, so a blank hours or
+    cost cell stays blank instead of repeating the row above it. Reporting Weeks are kept
+    as Excel serial numbers while reading and converted to datetime64 once at the end.
+
+    Example usage:
+    wsr_consolidated = read_wsr_invoice_review(uploaded_wsr_consolidated)
+    """
+    keep_row = None
+    if skip_weeks is not None:
+        cache = None
+        skipped_serials = {_excel_serial(week) for week in pd.to_datetime(pd.Series(list(skip_weeks), dtype=object)).dropna()}
+        week_position = WSR_COLUMNS.index(WSR_WEEK_COLUMN)
+
+        def keep_row(row):
+            return _excel_serial(row[week_position]) not in skipped_serials
+
+    key = (file_digest(file_path), sheet_name, tuple(WSR_COLUMNS)) if cache is not None else None
+    if key is not None:
+        frame = cache.get(key)
+        if frame is not None:
+            return frame
+
+    try:
+        if _is_xlsb(file_path):
+            with pyxlsb.open_workbook(file_path) as workbook:
+                data = _read_projected_rows(_iter_book_rows(workbook, sheet_name), WSR_COLUMNS, WSR_VENDOR_COLUMN, WSR_MERGED_COLUMNS, keep_row)
+        else:
+            workbook = load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+            try:
+                data = _read_projected_rows(_iter_book_rows(workbook, sheet_name), WSR_COLUMNS, WSR_VENDOR_COLUMN, WSR_MERGED_COLUMNS, keep_row)
+            finally:
+                workbook.close()
+    finally:
+        _rewind(file_path)
+
+    vendors, names, weeks, hours, cost = data
+    frame = pd.DataFrame({
+        WSR_VENDOR_COLUMN: pd.Series(vendors, dtype=object),
+        WSR_NAME_COLUMN: pd.Series(names, dtype=object),
+        WSR_WEEK_COLUMN: pd.to_datetime(np.array([_excel_serial(value) for value in weeks], dtype=float), unit="D", origin=EXCEL_EPOCH),
+        WSR_HOURS_COLUMN: pd.to_numeric(pd.Series(hours, dtype=object), errors="coerce").astype(float),
+        WSR_COST_COLUMN: pd.to_numeric(pd.Series(cost, dtype=object), errors="coerce").astype(float),
+    })
+
+    if key is not None:
+        cache.put(key, frame)
+        return frame.copy()
+    return frame
+
+
+def read_excel_from_header(file_path, column_name, sheet_name=None, cache=parsed_frame_cache):
+    """
+    Read an Excel sheet whose header row is the one containing a specific column name.
+
+    Parameters:
+    - file_path (str or file-like): The Excel file (.xlsx or .xlsb) to be read.
+    - column_name (str): The name of a column in the header row.
+    - sheet_name (str, optional): The name of the sheet in the Excel file (default is None).
+        If sheet_name is not provided, the first sheet is read.
+    - cache (ParsedFrameCache, optional): The cache to look the sheet up in and store it to
+        (default is the process-wide parsed_frame_cache). Pass None to always parse the file.
+
+    Returns:
+    - pd.DataFrame: The sheet, starting from the header row.
+
+    Raises:
+    - ValueError: If the specified column name is not found in the sheet.
+
+    The header is located by streaming the first rows of the sheet, so the full sheet
+    is only parsed once. Files that were already parsed by any session are served from
+    the cache without being read again.
+
+    Example usage:
+    raw_invoice = read_excel_from_header(uploaded_raw_invoice, "Unique ID")
+    """
+    return read_excel_sheets(file_path, {sheet_name: column_name}, cache=cache)[sheet_name]
@@ -0,0 +1,158 @@
+import re
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from utils.names import name_keys
+
+# Smallest score for a suggested match to be used by the reconciliation
+DEFAULT_MIN_MATCH_SCORE = 0.85
+
+# Length of the character n-grams compared between names
+NGRAM_SIZE = 3
+
+# Columns of the name match review table
+MATCH_COLUMNS = ["Invoice Name", "WSR Name", "Match Score", "Accepted"]
+
+# Everything but letters and the comma between last and first name is ignored when comparing names
+_not_letters = re.compile(r"[^\w,]|[\d_]")
+
+
+def _compact(key):
+    """Returns a name key with only its letters and comma, so "smith-jones,ann" and "smith jones,ann" are equal."""
+    return _not_letters.sub("", key)
+
+
+def _ngrams(compact):
+    """Returns the set of character n-grams of a compacted name, padded so its first and last letters count."""
+    padded = f" {compact} "
+    return {padded[i:i + NGRAM_SIZE] for i in range(max(len(padded) - NGRAM_SIZE + 1, 1))}
+
+
+class NameMatchIndex:
+    """
+    Approximate-match index over the contractor names of the WSR.
+
+    Names are compared on their name_key() with spaces and punctuation removed, and scored
+    by the Dice coefficient of their character trigrams (1.0 for the same letters, 0.0 for
+    no trigram in common). To avoid comparing every invoice name with every WSR name:
+    - a name whose letters match a WSR name exactly is resolved with a dictionary lookup,
+    - otherwise the WSR names with the same last name are scored first,
+    - and only if none of them is good enough, the WSR names sharing a trigram are scored
+      from an inverted index, with the shared trigrams of all candidates counted in one
+      numpy pass.
+
+    Example usage:
+    match_index = NameMatchIndex(wsr_consolidated[WSR_NAME_COLUMN])
+    wsr_name, score = match_index.best_match("Smith-Jones, Ann")
+    """
+
+    def __init__(self, names):
+        names = pd.Series(pd.unique(pd.Series(names).dropna().astype(object).to_numpy()))
+        names = names[names.map(type).eq(str)].reset_index(drop=True)
+        compacts = [_compact(key) for key in name_keys(names)]
+
+        self.names = names.to_numpy(dtype=object)
+        self._ngrams = [_ngrams(compact) for compact in compacts]
+        self._by_compact = {}
+        self._by_last_name = defaultdict(list)
+        postings = defaultdict(list)
+        ngram_counts = np.zeros(len(compacts))
+        for position, (compact, ngrams) in enumerate(zip(compacts, self._ngrams)):
+            self._by_compact.setdefault(compact, position)
+            self._by_last_name[compact.split(",")[0]].append(position)
+            ngram_counts[position] = len(ngrams)
+            for ngram in ngrams:
+                postings[ngram].append(position)
+
+        self._ngram_counts = ngram_counts
+        self._postings = {ngram: np.array(positions, dtype=np.int64) for ngram, positions in postings.items()}
+
+    def __len__(self):
+        return len(self.names)
+
+    def _best_of(self, positions, shared, query_count):
+        """Returns the position and Dice score of the best of 'positions', given their shared trigram counts."""
+        scores = 2 * shared / (query_count + self._ngram_counts[positions])
+        best = int(np.argmax(scores))
+        return positions[best], float(scores[best])
+
+    def best_match(self, name, min_score=DEFAULT_MIN_MATCH_SCORE):
+        """
+        Find the WSR name most likely to be the same contractor as 'name'.
+
+        Parameters:
+        - name (str): The name to resolve, for example an invoice "Name".
+        - min_score (float, optional): The score that stops the search after the last-name block (default is DEFAULT_MIN_MATCH_SCORE).
+
+        Returns:
+        - tuple: The best WSR name and its score, or (NaN, 0.0) if no WSR name shares a trigram with 'name'.
+        """
+        keys = name_keys([name])
+        if len(self.names) == 0 or not isinstance(keys.iloc[0], str):
+            return np.nan, 0.0
+        compact = _compact(keys.iloc[0])
+        if compact in self._by_compact:
+            return self.names[self._by_compact[compact]], 1.0
+
+        ngrams = _ngrams(compact)
+        query_postings = [self._postings[ngram] for ngram in ngrams if ngram in self._postings]
+        if not query_postings:
+            return np.nan, 0.0
+
+        # Score the contractors with the same last name first
+        block = self._by_last_name.get(compact.split(",")[0])
+        if block:
+            block = np.array(block, dtype=np.int64)
+            shared = np.array([len(ngrams & self._ngrams[position]) for position in block], dtype=float)
+            position, score = self._best_of(block, shared, len(ngrams))
+            if score >= min_score:
+                return self.names[position], score
+
+        # Otherwise count the trigrams shared with every WSR name at once from the inverted index
+        shared = np.bincount(np.concatenate(query_postings), minlength=len(self.names)).astype(float)
+        candidates = np.flatnonzero(shared)
+        position, score = self._best_of(candidates, shared[candidates], len(ngrams))
+        return self.names[position], score
+
+
+def review_name_matches(invoice_names, wsr_index, match_index, min_score=DEFAULT_MIN_MATCH_SCORE):
+    """
+    Suggest a WSR contractor for every invoice name that has no exact match in the WSR.
+
+    Parameters:
+    - invoice_names (pd.Series): The invoice "Name" column.
+    - wsr_index (WsrIndex): The index the reconciliation looks names up in.
+    - match_index (NameMatchIndex): The approximate-match index of the same WSR names.
+    - min_score (float, optional): The smallest score that is accepted (default is DEFAULT_MIN_MATCH_SCORE).
+
+    Returns:
+    - pd.DataFrame: One row per distinct unmatched name with the columns in MATCH_COLUMNS,
+        best matches first. "Accepted" is True where the score is at least 'min_score'.
+
+    Example usage:
+    name_match_review = review_name_matches(raw_invoice["Name"], wsr_index, match_index)
+    """
+    names = pd.Series(pd.unique(pd.Series(invoice_names).dropna().astype(object).to_numpy()))
+    unmatched = names[~wsr_index.contains(names)]
+    rows = []
+    for name in unmatched:
+        wsr_name, score = match_index.best_match(name, min_score)
+        rows.append((name, wsr_name, round(score, 3), score >= min_score))
+    review = pd.DataFrame(rows, columns=MATCH_COLUMNS)
+    return review.sort_values("Match Score", ascending=False, ignore_index=True)
+
+
+def accepted_name_matches(review):
+    """
+    Return the accepted rows of a name match review as the mapping used by reconcile_wsr().
+
+    Parameters:
+    - review (pd.DataFrame): The table returned by review_name_matches(), possibly edited.
+
+    Returns:
+    - dict: Maps each accepted invoice name to its WSR name.
+    """
+    accepted = review[review["Accepted"].astype(bool) & review["WSR Name"].notna()]
+    return dict(zip(accepted["Invoice Name"], accepted["WSR Name"]))
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+
+# Text columns with at most this share of distinct values are stored as categoricals
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+
+
+def frame_bytes(frame):
+    """Returns the memory used by a DataFrame in bytes, including the text it holds."""
+    return int(frame.memory_usage(index=True, deep=True).sum())
+
+
+def _is_text(series):
+    """Returns `True` if every non-missing value of an object column is a string."""
+    values = series.dropna()
+    return len(values) > 0 and values.map(type).eq(str).all()
+
+
+def compact_frame(frame):
+    """
+    Return a memory-compact version of a DataFrame with the same values.
+
+    Parameters:
+    - frame (pd.DataFrame): The frame to compact.
+
+    Returns:
+    - pd.DataFrame: The compacted frame. Its attrs["loaded_bytes"] holds the size of the
+        frame before compaction, for the session memory report.
+
+    Text columns that repeat their values (names, vendors, LCATs) become categoricals,
+    which store each distinct string once plus an integer code per row, and integer
+    columns use the smallest integer type that holds their values. Float columns, such
+    as hours and rates, stay float64: sums, means and standard deviations computed in
+    float32 differ from those of the loaded values.
+
+    Example usage:
+    raw_invoice = compact_frame(raw_invoice)
+    """
+    loaded_bytes = frame.attrs["loaded_bytes"] if "loaded_bytes" in frame.attrs else frame_bytes(frame)
+    compacted = []
+    for position in range(frame.shape[1]):
+        series = frame.iloc[:, position]
+        if series.dtype == object and _is_text(series) and series.nunique() <= CATEGORY_MAX_UNIQUE_RATIO * len(series):
+            series = series.astype("category")
+        elif series.dtype == np.int64:
+            series = pd.to_numeric(series, downcast="integer")
+        compacted.append(series)
+
+    # Columns are taken by position so duplicate column names are kept as they are
+    frame = pd.concat(compacted, axis=1) if compacted else frame.copy()
+    frame.attrs["loaded_bytes"] = loaded_bytes
+    return frame
+
+
+def memory_report(frames):
+    """
+    Summarize the memory held by the frames of a session.
+
+    Parameters:
+    - frames (dict): Maps a label to a DataFrame (or None, which is skipped).
+
+    Returns:
+    - pd.DataFrame: One row per frame with its size as loaded, its size in the session
+        and the difference, in megabytes.
+    """
+    rows = []
+    for label, frame in frames.items():
+        if frame is None:
+            continue
+        in_session = frame_bytes(frame)
+        loaded = frame.attrs.get("loaded_bytes", in_session)
+        rows.append({
+            "Frame": label,
+            "Loaded (MB)": loaded / 1024 ** 2,
+            "In Session (MB)": in_session / 1024 ** 2,
+            "Saved (MB)": (loaded - in_session) / 1024 ** 2,
+        })
+    return pd.DataFrame(rows, columns=["Frame", "Loaded (MB)", "In Session (MB)", "Saved (MB)"]).round(2)
@@ -0,0 +1,124 @@
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+from utils.instrumentation import measure
+
+# Middle initials ("Smith, John A" -> "Smith, John") are dropped so names match across files
+MIDDLE_INITIAL_PATTERN = r' [A-Z]\b'
+
+# Upper bound on the names remembered by the process-wide memo before it starts over
+MAX_MEMO_NAMES = 200_000
+
+_middle_initial = re.compile(MIDDLE_INITIAL_PATTERN)
+_spaces = re.compile(r'\s+')
+_comma = re.compile(r'\s*,\s*')
+
+# Raw name -> (normalized name, join key), shared by every upload and session of the process
+_name_memo = {}
+_memo_lock = threading.Lock()
+
+
+def normalize_name(name):
+    """
+    Remove the middle initials from a contractor name.
+
+    Parameters:
+    - name (str): The name as it appears in the uploaded file.
+
+    Returns:
+    - str: The name without middle initials, or NaN if 'name' is not a string.
+
+    Example usage:
+    normalize_name("Smith, John A")  # "Smith, John"
+    """
+    if not isinstance(name, str):
+        return np.nan
+    return _middle_initial.sub('', name)
+
+
+def name_key(name):
+    """
+    Build the canonical join key of a contractor name.
+
+    Parameters:
+    - name (str): The name as it appears in the uploaded file.
+
+    Returns:
+    - str: The normalized name in lower case, with surrounding spaces removed, runs of
+        spaces collapsed and no spaces around the comma, or NaN if 'name' is not a string.
+
+    Example usage:
+    name_key(" SMITH ,  John A")  # "smith,john"
+    """
+    normalized = normalize_name(name)
+    if not isinstance(normalized, str):
+        return np.nan
+    return _comma.sub(',', _spaces.sub(' ', normalized).strip()).casefold()
+
+
+def _lookup_names(uniques):
+    """Returns the (normalized name, join key) pairs of 'uniques', computing only those not memoized yet."""
+    missing = [name for name in uniques if name not in _name_memo]
+    if missing:
+        with _memo_lock:
+            if len(_name_memo) + len(missing) > MAX_MEMO_NAMES:
+                _name_memo.clear()
+            for name in missing:
+                _name_memo[name] = (normalize_name(name), name_key(name))
+    return [_name_memo.get(name) or (normalize_name(name), name_key(name)) for name in uniques]
+
+
+def _map_unique_names(names, part):
+    """Applies the memoized normalization to the distinct values of 'names' and maps it back to every row."""
+    names = pd.Series(names)
+    codes, uniques = pd.factorize(names)
+    uniques = np.asarray(uniques, dtype=object)
+
+    # The extra NaN at the end is what the code -1 (a missing name) picks up
+    mapped = np.empty(len(uniques) + 1, dtype=object)
+    mapped[:-1] = [pair[part] for pair in _lookup_names(uniques)]
+    mapped[-1] = np.nan
+    return pd.Series(mapped.take(codes), index=names.index, name=names.name)
+
+
+def normalize_names(names):
+    """
+    Remove the middle initials from a column of contractor names.
+
+    Parameters:
+    - names (pd.Series): The names as they appear in the uploaded file.
+
+    Returns:
+    - pd.Series: The normalized names, indexed like 'names'. Values that are not strings become NaN.
+
+    Names repeat on every row of a contractor, so the column is factorized and only its
+    distinct values are normalized. Results are remembered across uploads and sessions,
+    so names already seen by the app are not normalized again.
+
+    Example usage:
+    raw_invoice["Name"] = normalize_names(raw_invoice["Name"])
+    """
+    with measure("name normalization", rows=len(names)):
+        return _map_unique_names(names, 0)
+
+
+def name_keys(names):
+    """
+    Build the canonical join key of every name in a column.
+
+    Parameters:
+    - names (pd.Series or array-like): The contractor names, raw or normalized.
+
+    Returns:
+    - pd.Series: The name_key() of each name, indexed like 'names'.
+
+    Two names that only differ by middle initials, letter case or spacing get the same key,
+    so the keys can be compared or joined on directly across the invoice, WSR and trackers.
+
+    Example usage:
+    approved = name_keys(hourly_cost_df["Name"]).isin(name_keys(tracker_df["Candidate Name"]))
+    """
+    return _map_unique_names(names, 1)
@@ -0,0 +1,85 @@
+import pandas as pd
+
+from utils.instrumentation import measure
+
+# Invoice column -> Onboarding Tracker "Master List" column filled in by the enrichment
+ONBOARDING_COLUMNS = {
+    "Vendor": "Vendor",
+    "TO": "Task Order #",
+    "Onboard Date": "Vendor Submission Date",
+    "Onboard LCAT": "Candidate Proposed LCAT",
+}
+
+# How to pick the onboarding row when a Candidate Unique ID appears more than once:
+# - "first": the first row in the sheet (the behaviour of the original row-by-row lookup)
+# - "latest": the row with the latest Vendor Submission Date
+# - "error": refuse to build the lookup and report the duplicated IDs
+DUPLICATE_POLICIES = ["first", "latest", "error"]
+
+
+class DuplicateCandidateError(ValueError):
+    """Raised by the "error" policy when a Candidate Unique ID appears more than once."""
+
+
+def build_onboarding_lookup(onboarding_tracker, duplicates="first"):
+    """
+    Build a lookup of the Onboarding Tracker keyed by Candidate Unique ID.
+
+    Parameters:
+    - onboarding_tracker (pd.DataFrame): The "Master List" sheet of the Onboarding Tracker.
+    - duplicates (str, optional): The policy for repeated IDs, one of DUPLICATE_POLICIES (default is "first").
+
+    Returns:
+    - pd.DataFrame: The columns in ONBOARDING_COLUMNS, renamed to their invoice names and
+        indexed by a unique Candidate Unique ID.
+
+    Raises:
+    - DuplicateCandidateError: If 'duplicates' is "error" and an ID appears more than once.
+    - ValueError: If 'duplicates' is not one of DUPLICATE_POLICIES.
+
+    Rows without a Candidate Unique ID are dropped since they can never be matched.
+
+    Example usage:
+    onboarding_lookup = build_onboarding_lookup(onboarding_tracker, "latest")
+    """
+    if duplicates not in DUPLICATE_POLICIES:
+        raise ValueError(f'Unknown duplicate policy "{duplicates}", expected one of {DUPLICATE_POLICIES}.')
+
+    tracker = onboarding_tracker.dropna(subset=["Candidate Unique ID"])
+    repeated = tracker["Candidate Unique ID"].duplicated(keep=False)
+
+    if duplicates == "error" and repeated.any():
+        duplicated_ids = tracker.loc[repeated, "Candidate Unique ID"].unique().tolist()
+        raise DuplicateCandidateError(f"Candidate Unique IDs appear more than once in the Onboarding Tracker: {duplicated_ids}")
+
+    if duplicates == "latest":
+        # Stable sort so rows with the same submission date keep their sheet order; rows without one go first
+        submission_dates = pd.to_datetime(tracker["Vendor Submission Date"], errors="coerce").reset_index(drop=True)
+        tracker = tracker.iloc[submission_dates.sort_values(kind="stable", na_position="first").index]
+        tracker = tracker.drop_duplicates(subset="Candidate Unique ID", keep="last")
+    else:
+        tracker = tracker.drop_duplicates(subset="Candidate Unique ID", keep="first")
+
+    lookup = tracker.set_index("Candidate Unique ID")[list(ONBOARDING_COLUMNS.values())]
+    return lookup.rename(columns={source: target for target, source in ONBOARDING_COLUMNS.items()})
+
+
+def enrich_from_onboarding(raw_invoice, onboarding_lookup):
+    """
+    Look up the onboarding details of every invoice row by its Unique ID in one step.
+
+    Parameters:
+    - raw_invoice (pd.DataFrame): The invoice with a "Unique ID" column.
+    - onboarding_lookup (pd.DataFrame): The lookup returned by build_onboarding_lookup().
+
+    Returns:
+    - pd.DataFrame: A frame indexed like 'raw_invoice' with the keys of ONBOARDING_COLUMNS.
+        Invoice rows without a matching Candidate Unique ID are left empty.
+
+    Example usage:
+    enriched = enrich_from_onboarding(raw_invoice, onboarding_lookup)
+    """
+    with measure("onboarding join", rows=len(raw_invoice)):
+        enriched = onboarding_lookup.reindex(raw_invoice["Unique ID"].to_numpy())
+        enriched.index = raw_invoice.index
+    return enriched
@@ -0,0 +1,277 @@
+"""
+Headless runner for the invoice review and tripwire pipelines.
+
+Runs the same processing as the Streamlit pages without a browser session, for example
+for nightly processing of a folder of invoices:
+
+    python -m utils.pipeline invoices --wsr WSR.xlsb --onboarding Tracker.xlsx --output results/ invoices/
+    python -m utils.pipeline tripwire --tracker Tracker.xlsx --hourly-cost Cost.xlsx --sheet Sheet1 --output tripwire.xlsx
+"""
+import argparse
+import glob
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from utils.exports import write_excel_sheets
+from utils.ingestion import load_files_in_parallel, load_onboarding_tracker, load_raw_invoice, load_wsr_consolidated
+from utils.matching import DEFAULT_MIN_MATCH_SCORE, NameMatchIndex
+from utils.onboarding import DUPLICATE_POLICIES, build_onboarding_lookup
+from utils.reconciliation import DEFAULT_HOURS_TOLERANCE, WSR_NAME_COLUMN, WsrIndex
+from utils.task_orders import COMBINED_FLAG_COLUMNS, TASK_ORDER_PROFILES, flagged_rows, reconcile_invoice, review_workbook
+from utils.tripwire import load_tripwire_inputs, review_tripwire
+
+# Columns of the timing summary written by run_invoice_reviews()
+TIMING_COLUMNS = ["File", "Task Order", "Rows", "Flagged Rows", "Load (s)", "Reconcile (s)", "Write (s)", "Total (s)", "Error"]
+
+# Columns of the timing summary written by run_tripwire()
+TRIPWIRE_TIMING_COLUMNS = ["File", "Rows", "Flagged Rows", "Load (s)", "Review (s)", "Write (s)", "Total (s)"]
+
+# The WSR index, onboarding lookup and settings used by review_invoice_file(), set once per worker process
+_shared = {}
+
+
+def _init_invoice_worker(shared):
+    """Stores the state shared by every invoice of a run in this (worker) process."""
+    _shared.clear()
+    _shared.update(shared)
+
+
+def review_invoice_file(invoice_path, task_order, output_dir):
+    """
+    Load, reconcile and write the review of one raw invoice file.
+
+    Parameters:
+    - invoice_path (str): The raw invoice Excel file.
+    - task_order (str): Its task order, a key of TASK_ORDER_PROFILES.
+    - output_dir (str): The folder the "<invoice name>_review.xlsx" workbook is written to.
+
+    Returns:
+    - tuple: The timing row (a dict with the keys in TIMING_COLUMNS) and the flagged rows
+        (a frame with the columns in COMBINED_FLAG_COLUMNS). A file that fails is reported
+        in the "Error" of its timing row instead of stopping the run.
+
+    Uses the WSR index, onboarding lookup and settings stored by _init_invoice_worker().
+    """
+    timing = dict.fromkeys(TIMING_COLUMNS, 0.0)
+    timing.update({"File": invoice_path, "Task Order": task_order, "Rows": 0, "Flagged Rows": 0, "Error": ""})
+    flagged = pd.DataFrame(columns=COMBINED_FLAG_COLUMNS)
+    started = time.perf_counter()
+    try:
+        raw_invoice = load_raw_invoice(invoice_path, cache=None)
+        loaded = time.perf_counter()
+
+        hours_column = TASK_ORDER_PROFILES[task_order]["hours_column"]
+        result = reconcile_invoice(
+            raw_invoice, hours_column, _shared["wsr_index"], _shared["onboarding_lookup"], _shared["x_week_lookback"],
+            _shared["tolerance"], _shared["match_index"], _shared["min_match_score"]
+        )
+        flagged = flagged_rows(task_order, result, hours_column)
+        reconciled = time.perf_counter()
+
+        stem = os.path.splitext(os.path.basename(invoice_path))[0]
+        sheets, row_formats = review_workbook(result.invoice, hours_column, _shared["tolerance"], result.name_match_review)
+        write_excel_sheets(sheets, os.path.join(output_dir, f"{stem}_review.xlsx"), row_formats)
+        written = time.perf_counter()
+
+        timing.update({
+            "Rows": len(raw_invoice),
+            "Flagged Rows": len(flagged),
+            "Load (s)": loaded - started,
+            "Reconcile (s)": reconciled - loaded,
+            "Write (s)": written - reconciled,
+        })
+    except Exception as e:
+        timing["Error"] = f"{type(e).__name__}: {e}"
+    timing["Total (s)"] = time.perf_counter() - started
+    return timing, flagged
+
+
+def run_invoice_reviews(invoices, wsr_path, onboarding_path, output_dir, x_week_lookback=4,
+                        tolerance=DEFAULT_HOURS_TOLERANCE, min_match_score=DEFAULT_MIN_MATCH_SCORE,
+                        duplicates="first", workers=None):
+    """
+    Review many raw invoices against one WSR Consolidated file and Onboarding Tracker.
+
+    Parameters:
+    - invoices (list): (invoice path, task order) pairs.
+    - wsr_path (str): The WSR Consolidated Excel file.
+    - onboarding_path (str): The Onboarding Tracker Excel file.
+    - output_dir (str): The folder for the per-invoice workbooks, "flags.csv" (the flagged
+        rows of every invoice) and "timing_summary.csv".
+    - x_week_lookback, tolerance, min_match_score: As in reconcile_invoice().
+    - duplicates (str, optional): The duplicate Candidate Unique ID policy (default is "first").
+    - workers (int, optional): The number of worker processes (default is the number of CPUs).
+
+    Returns:
+    - pd.DataFrame: The timing summary, with the columns in TIMING_COLUMNS: a first row for
+        the shared WSR and Onboarding Tracker, then one row per invoice.
+
+    Raises:
+    - Exception: Whatever loading the WSR or Onboarding Tracker raised, since no invoice can
+        be reviewed without them.
+
+    The WSR and Onboarding Tracker are parsed concurrently and indexed once. The index is
+    then handed to each worker process once, and the invoices are spread over the workers.
+
+    Example usage:
+    summary = run_invoice_reviews([("TO29.xlsx", "TO29")], "WSR.xlsb", "Tracker.xlsx", "results")
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    started = time.perf_counter()
+
+    # Parse the shared files concurrently, then build the indexes once for every invoice
+    frames, errors = load_files_in_parallel({
+        "wsr_consolidated": (load_wsr_consolidated, wsr_path),
+        "onboarding_tracker": (load_onboarding_tracker, onboarding_path),
+    }, cache=None)
+    for error in errors.values():
+        raise error
+    loaded = time.perf_counter()
+    shared = {
+        "wsr_index": WsrIndex(frames["wsr_consolidated"]),
+        "match_index": NameMatchIndex(frames["wsr_consolidated"][WSR_NAME_COLUMN]),
+        "onboarding_lookup": build_onboarding_lookup(frames["onboarding_tracker"], duplicates),
+        "x_week_lookback": x_week_lookback,
+        "tolerance": tolerance,
+        "min_match_score": min_match_score,
+    }
+    timings = [{
+        "File": f"{wsr_path}, {onboarding_path}", "Task Order": "", "Rows": len(frames["wsr_consolidated"]), "Flagged Rows": 0,
+        "Load (s)": loaded - started, "Reconcile (s)": time.perf_counter() - loaded, "Write (s)": 0.0,
+        "Total (s)": time.perf_counter() - started, "Error": "",
+    }]
+    del frames
+
+    # Spread the invoices over worker processes; a single invoice or worker runs in this process
+    workers = min(workers or os.cpu_count() or 1, len(invoices))
+    if workers <= 1:
+        _init_invoice_worker(shared)
+        results = [review_invoice_file(path, task_order, output_dir) for path, task_order in invoices]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_invoice_worker, initargs=(shared,)
+        ) as executor:
+            futures = [executor.submit(review_invoice_file, path, task_order, output_dir) for path, task_order in invoices]
+            results = [future.result() for future in futures]
+
+    timings.extend(timing for timing, _ in results)
+    flags = [flagged for _, flagged in results if not flagged.empty]
+    combined_flags = pd.concat(flags, ignore_index=True) if flags else pd.DataFrame(columns=COMBINED_FLAG_COLUMNS)
+    combined_flags.to_csv(os.path.join(output_dir, "flags.csv"), index=False)
+
+    summary = pd.DataFrame(timings, columns=TIMING_COLUMNS)
+    summary.to_csv(os.path.join(output_dir, "timing_summary.csv"), index=False)
+    return summary
+
+
+def run_tripwire(tracker_path, hourly_cost_path, hourly_cost_sheet_name, output_path):
+    """
+    Run the tripwire review and write its result to an Excel file.
+
+    Parameters:
+    - tracker_path (str): The Onboarding Tracker Excel file.
+    - hourly_cost_path (str): The Hourly Cost Excel file.
+    - hourly_cost_sheet_name (str): The sheet of the Hourly Cost file to read.
+    - output_path (str): The .xlsx file to write. The timing summary is written next to it,
+        as "<output name>_timing_summary.csv".
+
+    Returns:
+    - tuple: The candidates exceeding the tripwire without approval, and the timing summary
+        with the columns in TRIPWIRE_TIMING_COLUMNS.
+
+    Example usage:
+    result_df, summary = run_tripwire("Tracker.xlsx", "Cost.xlsx", "Sheet1", "tripwire.xlsx")
+    """
+    started = time.perf_counter()
+    tracker_df, hourly_cost_df, lcat_df = load_tripwire_inputs(tracker_path, hourly_cost_path, hourly_cost_sheet_name, cache=None)
+    loaded = time.perf_counter()
+    result_df, _ = review_tripwire(tracker_df, hourly_cost_df, lcat_df)
+    reviewed = time.perf_counter()
+    result_df.to_excel(output_path, index=False)
+    written = time.perf_counter()
+
+    summary = pd.DataFrame([{
+        "File": f"{tracker_path}, {hourly_cost_path}", "Rows": len(hourly_cost_df), "Flagged Rows": len(result_df),
+        "Load (s)": loaded - started, "Review (s)": reviewed - loaded, "Write (s)": written - reviewed, "Total (s)": written - started,
+    }], columns=TRIPWIRE_TIMING_COLUMNS)
+    summary.to_csv(f"{os.path.splitext(output_path)[0]}_timing_summary.csv", index=False)
+    return result_df, summary
+
+
+def _expand_invoices(entries, default_task_order):
+    """
+    Turn the invoice arguments into (path, task order) pairs.
+
+    Each entry is an Excel file or a folder of them, optionally prefixed with its task
+    order as in "TO32=invoices/to32/"; entries without a prefix use 'default_task_order'.
+    """
+    invoices = []
+    for entry in entries:
+        task_order, separator, path = entry.partition("=")
+        if not separator:
+            task_order, path = default_task_order, entry
+        if task_order not in TASK_ORDER_PROFILES:
+            raise ValueError(f'Unknown task order "{task_order}", expected one of {list(TASK_ORDER_PROFILES)}.')
+        if os.path.isdir(path):
+            paths = sorted(p for p in glob.glob(os.path.join(path, "*.xlsx")) if not os.path.basename(p).startswith("~$"))
+        else:
+            paths = [path]
+        invoices.extend((p, task_order) for p in paths)
+    return invoices
+
+
+def main(argv=None):
+    """Command-line entry point, see the module docstring for usage."""
+    parser = argparse.ArgumentParser(prog="python -m utils.pipeline", description="Run the Iberia Advisory review pipelines without Streamlit.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    invoices_parser = commands.add_parser("invoices", help="Reconcile raw invoices against the WSR and Onboarding Tracker.")
+    invoices_parser.add_argument("invoices", nargs="+", help='Raw invoice files or folders, optionally prefixed with the task order, e.g. "TO32=invoices/".')
+    invoices_parser.add_argument("--wsr", required=True, help="WSR Consolidated Excel file.")
+    invoices_parser.add_argument("--onboarding", required=True, help="Onboarding Tracker Excel file.")
+    invoices_parser.add_argument("--output", required=True, help="Folder for the results.")
+    invoices_parser.add_argument("--task-order", default="TO29", choices=list(TASK_ORDER_PROFILES), help="Task order of invoices without a prefix.")
+    invoices_parser.add_argument("--lookback", type=int, default=4, help="Number of weeks lookback.")
+    invoices_parser.add_argument("--tolerance", type=float, default=DEFAULT_HOURS_TOLERANCE, help="Hour flag tolerance.")
+    invoices_parser.add_argument("--min-match-score", type=float, default=DEFAULT_MIN_MATCH_SCORE, help="Name match score.")
+    invoices_parser.add_argument("--duplicates", default="first", choices=DUPLICATE_POLICIES, help="Duplicate Candidate Unique ID policy.")
+    invoices_parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: number of CPUs).")
+
+    tripwire_parser = commands.add_parser("tripwire", help="Find candidates above the tripwire rate without approval.")
+    tripwire_parser.add_argument("--tracker", required=True, help="Onboarding Tracker Excel file.")
+    tripwire_parser.add_argument("--hourly-cost", required=True, help="Hourly Cost Excel file.")
+    tripwire_parser.add_argument("--sheet", required=True, help="Sheet of the Hourly Cost file.")
+    tripwire_parser.add_argument("--output", required=True, help="Excel file for the result.")
+
+    args = parser.parse_args(argv)
+    started = time.perf_counter()
+    if args.command == "invoices":
+        try:
+            invoices = _expand_invoices(args.invoices, args.task_order)
+        except ValueError as e:
+            parser.error(str(e))
+        if not invoices:
+            parser.error("No invoice files found.")
+        summary = run_invoice_reviews(
+            invoices, args.wsr, args.onboarding, args.output, args.lookback, args.tolerance,
+            args.min_match_score, args.duplicates, args.workers
+        )
+        print(summary.to_string(index=False, float_format=lambda seconds: f"{seconds:.2f}"))
+        failed = int((summary["Error"] != "").sum())
+    else:
+        result_df, summary = run_tripwire(args.tracker, args.hourly_cost, args.sheet, args.output)
+        print(summary.to_string(index=False, float_format=lambda seconds: f"{seconds:.2f}"))
+        print(f"{len(result_df)} candidates exceed the tripwire without approval.")
+        failed = 0
+    print(f"Finished in {time.perf_counter() - started:.2f}s")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
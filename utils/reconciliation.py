@@ -0,0 +1,326 @@
+import numpy as np
+import pandas as pd
+
+from utils.instrumentation import measure
+from utils.names import name_keys
+
+# Column names used in the WSR Consolidated "Invoice Review" sheet
+WSR_VENDOR_COLUMN = "Vendor Name"
+WSR_NAME_COLUMN = "Contractor (Last Name, First Name)2"
+WSR_WEEK_COLUMN = "Reporting Week (MM/DD/YYYY)"
+WSR_HOURS_COLUMN = "Sum of Time Spent (Hours) "
+WSR_COST_COLUMN = "Sum of Cost Calc"
+
+# Columns added to the invoice by the reconciliation
+RECONCILED_COLUMNS = ["WSR Hours", "Contract Rate", "Cost Check"]
+
+# Largest difference in hours between the invoice and the WSR that is not flagged
+DEFAULT_HOURS_TOLERANCE = 0.01
+
+# Contract Rate above which invoice rows are listed as "High Contract Rate Rows"
+HIGH_CONTRACT_RATE = 187.50
+
+# Decimals the window totals are rounded to, dropping the float noise of subtracting running totals
+WINDOW_TOTAL_DECIMALS = 9
+
+
+def build_wsr_cube(wsr_consolidated):
+    """
+    Collapse the WSR Consolidated "Invoice Review" sheet to one row per contractor and Reporting Week.
+
+    Parameters:
+    - wsr_consolidated (pd.DataFrame): The "Invoice Review" sheet, with normalized contractor names.
+
+    Returns:
+    - pd.DataFrame: The columns WSR_NAME_COLUMN (categorical, so contractors are stored as
+        integer codes), WSR_WEEK_COLUMN, WSR_HOURS_COLUMN and WSR_COST_COLUMN, with the total
+        hours and cost of each (contractor, week), sorted by contractor and week.
+
+    The sheet has a row per contractor, week, task and project, but the reconciliation only
+    ever needs the totals per contractor and week, so the cube is typically many times
+    smaller than the sheet and answers the same lookback queries. Rows without a
+    contractor or week are dropped since they never match an invoice row.
+
+    Example usage:
+    wsr_cube = build_wsr_cube(wsr_consolidated)
+    """
+    names = wsr_consolidated[WSR_NAME_COLUMN].astype("category")
+    weeks = pd.to_datetime(wsr_consolidated[WSR_WEEK_COLUMN], errors="coerce")
+    values = pd.DataFrame({
+        WSR_HOURS_COLUMN: pd.to_numeric(wsr_consolidated[WSR_HOURS_COLUMN], errors="coerce").astype(float),
+        WSR_COST_COLUMN: pd.to_numeric(wsr_consolidated[WSR_COST_COLUMN], errors="coerce").astype(float),
+    })
+    cube = values.groupby([names, weeks], observed=True, sort=True).sum()
+    return cube.reset_index()
+
+
+def _datetimes(dates):
+    """Returns 'dates' as a datetime64 array; dates that are already datetime64 are not parsed again."""
+    dates = pd.Series(dates)
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = pd.to_datetime(dates, errors="coerce")
+    return dates.to_numpy()
+
+
+class WsrIndex:
+    """
+    Per-contractor prefix-sum index over the WSR Consolidated "Invoice Review" sheet.
+
+    The WSR rows are sorted by contractor and Reporting Week, and running totals of the
+    hours and cost are kept for each contractor. The hours and cost for any
+    (name, start date, end date) window then come from two binary searches instead of
+    a scan of the whole sheet, so the index only needs to be built once per upload and
+    can be reused for every lookback value.
+
+    Contractors are matched on their name_key() rather than on the exact name. The
+    original row-by-row reconciliation compared names with ==, so an invoice row whose
+    name only differed from the WSR by letter case or spacing (for example "DOE ,  jane"
+    and "Doe, Jane") got 0 WSR Hours; it now gets the hours of that contractor.
+
+    Example usage:
+    wsr_index = WsrIndex(wsr_consolidated)
+    hours, cost = wsr_index.window_totals(names, start_dates, end_dates)
+    """
+
+    def __init__(self, wsr_consolidated):
+        # Keep only the columns needed for the lookups; rows without a name or week never match
+        wsr = pd.DataFrame({
+            "name": name_keys(wsr_consolidated[WSR_NAME_COLUMN]).to_numpy(),
+            "week": pd.to_datetime(wsr_consolidated[WSR_WEEK_COLUMN], errors="coerce").to_numpy(),
+            "hours": pd.to_numeric(wsr_consolidated[WSR_HOURS_COLUMN], errors="coerce").to_numpy(dtype=float),
+            "cost": pd.to_numeric(wsr_consolidated[WSR_COST_COLUMN], errors="coerce").to_numpy(dtype=float),
+        }).dropna(subset=["name", "week"])
+
+        # Encode the names and weeks as integers so (name, week) becomes one sortable key
+        name_codes, names = pd.factorize(wsr["name"])
+        self.names = pd.Index(names)
+        self.weeks = np.unique(wsr["week"].to_numpy())
+        week_ranks = np.searchsorted(self.weeks, wsr["week"].to_numpy())
+        self._width = len(self.weeks) + 1
+
+        # Sort by name, then by week
+        order = np.lexsort((week_ranks, name_codes))
+        sorted_codes = name_codes[order]
+        self._keys = sorted_codes * self._width + week_ranks[order]
+
+        # Position of the first row of each contractor in the sorted rows
+        self._group_starts = np.searchsorted(sorted_codes, np.arange(len(self.names)))
+
+        # Running totals per contractor, treating missing values as 0 like a sum would
+        by_name = pd.DataFrame({
+            "hours": wsr["hours"].to_numpy()[order],
+            "cost": wsr["cost"].to_numpy()[order],
+        }).fillna(0).groupby(sorted_codes)
+        self._hours_cumsum = by_name["hours"].cumsum().to_numpy(dtype=float)
+        self._cost_cumsum = by_name["cost"].cumsum().to_numpy(dtype=float)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def contains(self, names):
+        """Returns a boolean array telling which of 'names' have rows in the WSR."""
+        return self.names.get_indexer(pd.Index(name_keys(names))) >= 0
+
+    def window_totals(self, names, start_dates, end_dates):
+        """
+        Sum the WSR hours and cost for each (name, start date, end date) window.
+
+        Parameters:
+        - names (array-like): The contractor names to look up.
+        - start_dates (array-like): The first Reporting Week to include for each name.
+        - end_dates (array-like): The last Reporting Week to include for each name.
+
+        Returns:
+        - tuple: Two float arrays with the total hours and total cost of each window.
+            Names that are not in the WSR and missing dates give 0.
+
+        A difference of two running totals can be off from the direct sum of the window in
+        its last bits, enough to round a Contract Rate that falls on a half cent the other
+        way, so the totals are rounded to WINDOW_TOTAL_DECIMALS decimals.
+        """
+        start_dates = _datetimes(start_dates)
+        end_dates = _datetimes(end_dates)
+        hours = np.zeros(len(start_dates))
+        cost = np.zeros(len(start_dates))
+        if len(self._keys) == 0:
+            return hours, cost
+
+        # Find the first row at or after the start date and the first row after the end date
+        codes = self.names.get_indexer(pd.Index(name_keys(names)))
+        low = np.searchsorted(self._keys, codes * self._width + np.searchsorted(self.weeks, start_dates, side="left"))
+        high = np.searchsorted(self._keys, codes * self._width + np.searchsorted(self.weeks, end_dates, side="right"))
+        found = (codes >= 0) & (high > low) & ~np.isnat(start_dates) & ~np.isnat(end_dates)
+        if not found.any():
+            return hours, cost
+
+        # Window total = running total at the last row minus the running total before the first row
+        low, high, group_starts = low[found], high[found], self._group_starts[codes[found]]
+        before = low > group_starts
+        hours[found] = self._hours_cumsum[high - 1] - np.where(before, self._hours_cumsum[np.maximum(low - 1, 0)], 0)
+        cost[found] = self._cost_cumsum[high - 1] - np.where(before, self._cost_cumsum[np.maximum(low - 1, 0)], 0)
+        return np.round(hours, WINDOW_TOTAL_DECIMALS), np.round(cost, WINDOW_TOTAL_DECIMALS)
+
+
+def _lookup_names(raw_invoice, name_matches):
+    """Returns the invoice names to look up in the WSR, with the accepted fuzzy matches swapped in."""
+    names = raw_invoice["Name"]
+    if name_matches:
+        names = names.astype(object)
+        names = names.map(name_matches).fillna(names)
+    return names
+
+
+def _contract_rate(total_hours, total_cost):
+    """Returns Sum of Cost Calc / Sum of Time Spent (Hours) rounded to cents, or 0 where there are no hours."""
+    contract_rate = np.zeros(np.shape(total_hours))
+    np.divide(total_cost, total_hours, out=contract_rate, where=total_hours > 0)
+    return np.round(contract_rate, 2)
+
+
+def reconcile_wsr(raw_invoice, wsr_index, x_week_lookback, name_matches=None):
+    """
+    Calculate the WSR Hours, Contract Rate and Cost Check for every invoice row in one pass.
+
+    Parameters:
+    - raw_invoice (pd.DataFrame): The invoice with "Name" and "Effective Bill Date" columns.
+    - wsr_index (WsrIndex): The index built from the WSR Consolidated "Invoice Review" sheet.
+    - x_week_lookback (int): The number of weeks before the Effective Bill Date to include.
+    - name_matches (dict, optional): Maps invoice names to the WSR name to look up instead,
+        for example from accepted_name_matches() (default is None).
+
+    Returns:
+    - pd.DataFrame: A frame indexed like 'raw_invoice' with the columns in RECONCILED_COLUMNS.
+
+    Each invoice row is matched to the WSR rows with the same contractor name, ignoring
+    letter case and spacing (see WsrIndex), whose Reporting Week falls between the
+    Effective Bill Date minus the lookback and the Effective Bill Date (both inclusive).
+
+    Example usage:
+    reconciled = reconcile_wsr(raw_invoice, WsrIndex(wsr_consolidated), 4)
+    """
+    # The window ends on the effective date and starts x weeks before it
+    effective_dates = _datetimes(raw_invoice["Effective Bill Date"])
+    start_dates = effective_dates - np.timedelta64(7 * x_week_lookback, "D")
+    with measure("WSR windowing", rows=len(raw_invoice)):
+        total_hours, total_cost = wsr_index.window_totals(_lookup_names(raw_invoice, name_matches), start_dates, effective_dates)
+    contract_rate = _contract_rate(total_hours, total_cost)
+
+    return pd.DataFrame({
+        "WSR Hours": total_hours,
+        "Contract Rate": contract_rate,
+        "Cost Check": contract_rate * total_hours,
+    }, index=raw_invoice.index)
+
+
+def flag_misalignment(raw_invoice, hours_column, tolerance=DEFAULT_HOURS_TOLERANCE):
+    """
+    Compare the invoiced hours against the WSR Hours for every invoice row at once.
+
+    Parameters:
+    - raw_invoice (pd.DataFrame): The reconciled invoice with "Name", "WSR Hours" and 'hours_column'.
+    - hours_column (str): The invoice column with the billed hours ("Total" for TO29,
+        "Sum of Transaction Hours" for TO32).
+    - tolerance (float, optional): The largest difference in hours still treated as aligned
+        (default is DEFAULT_HOURS_TOLERANCE).
+
+    Returns:
+    - pd.DataFrame: A frame indexed like 'raw_invoice' with the columns "Name" and
+        "Misalignment" ("Flagged" or "Aligned"). Rows with missing hours are flagged.
+
+    Example usage:
+    misalignment_flags = flag_misalignment(raw_invoice, "Total", 0.01)
+    """
+    invoice_hours = pd.to_numeric(raw_invoice[hours_column], errors="coerce")
+    aligned = (invoice_hours - raw_invoice["WSR Hours"]).abs() <= tolerance
+    return pd.DataFrame({
+        "Name": raw_invoice["Name"],
+        "Misalignment": np.where(aligned, "Aligned", "Flagged"),
+    }, index=raw_invoice.index)
+
+
+def parse_lookbacks(text):
+    """
+    Parse a list of lookback weeks such as "2, 4, 6, 8" or "2-8".
+
+    Parameters:
+    - text (str): Comma-separated week counts and inclusive ranges written as "start-end".
+
+    Returns:
+    - list: The distinct week counts in increasing order.
+
+    Raises:
+    - ValueError: If an entry is not a whole number of weeks of at least 1.
+
+    Example usage:
+    parse_lookbacks("2, 4, 6-8")  # [2, 4, 6, 7, 8]
+    """
+    lookbacks = set()
+    for entry in text.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        start, _, end = entry.partition("-")
+        try:
+            start, end = int(start), int(end or start)
+        except ValueError:
+            raise ValueError(f'"{entry}" is not a number of weeks or a range like "2-8".')
+        if start < 1 or end < start:
+            raise ValueError(f'"{entry}" must be at least 1 week, with ranges written from low to high.')
+        lookbacks.update(range(start, end + 1))
+    if not lookbacks:
+        raise ValueError("Enter at least one number of weeks.")
+    return sorted(lookbacks)
+
+
+def sweep_lookbacks(raw_invoice, wsr_index, lookbacks, hours_column, tolerance=DEFAULT_HOURS_TOLERANCE, name_matches=None):
+    """
+    Reconcile the invoice against the WSR for several lookback windows in one pass.
+
+    Parameters:
+    - raw_invoice (pd.DataFrame): The invoice with "Name", "Effective Bill Date" and 'hours_column'.
+    - wsr_index (WsrIndex): The index built from the WSR Consolidated "Invoice Review" sheet.
+    - lookbacks (list): The numbers of weeks before the Effective Bill Date to try.
+    - hours_column (str): The invoice column with the billed hours ("Total" for TO29,
+        "Sum of Transaction Hours" for TO32).
+    - tolerance (float, optional): The largest difference in hours still treated as aligned
+        (default is DEFAULT_HOURS_TOLERANCE).
+    - name_matches (dict, optional): Accepted fuzzy name matches, as in reconcile_wsr() (default is None).
+
+    Returns:
+    - pd.DataFrame: A wide frame indexed like 'raw_invoice' with "Name", 'hours_column', and
+        for each lookback "WSR Hours (Nw)", "Contract Rate (Nw)" and "Misalignment (Nw)",
+        followed by "Best Lookback": the lookback whose WSR Hours are closest to the invoice
+        (the shortest one on ties; empty where the invoice hours are missing).
+
+    Every (invoice row, lookback) window is looked up in a single call to the WSR index,
+    so trying more lookbacks does not re-run the reconciliation.
+
+    Example usage:
+    lookback_sweep = sweep_lookbacks(raw_invoice, wsr_index, [2, 4, 6, 8], "Total")
+    """
+    lookbacks = sorted(set(lookbacks))
+    effective_dates = _datetimes(raw_invoice["Effective Bill Date"])
+    names = _lookup_names(raw_invoice, name_matches).to_numpy()
+
+    # Stack one block of invoice rows per lookback and look every window up at once
+    start_dates = np.concatenate([effective_dates - np.timedelta64(7 * weeks, "D") for weeks in lookbacks])
+    with measure("WSR windowing", rows=len(start_dates)):
+        total_hours, total_cost = wsr_index.window_totals(
+            np.tile(names, len(lookbacks)), start_dates, np.tile(effective_dates, len(lookbacks))
+        )
+    total_hours = total_hours.reshape(len(lookbacks), len(raw_invoice))
+    contract_rate = _contract_rate(total_hours, total_cost.reshape(len(lookbacks), len(raw_invoice)))
+
+    invoice_hours = pd.to_numeric(raw_invoice[hours_column], errors="coerce").to_numpy(dtype=float)
+    differences = np.abs(invoice_hours - total_hours)
+
+    sweep = {"Name": raw_invoice["Name"].to_numpy(), hours_column: raw_invoice[hours_column].to_numpy()}
+    for position, weeks in enumerate(lookbacks):
+        sweep[f"WSR Hours ({weeks}w)"] = total_hours[position]
+        sweep[f"Contract Rate ({weeks}w)"] = contract_rate[position]
+        sweep[f"Misalignment ({weeks}w)"] = np.where(differences[position] <= tolerance, "Aligned", "Flagged")
+
+    # argmin keeps the first (shortest) lookback on ties
+    best_lookback = np.array(lookbacks, dtype=float)[np.argmin(np.nan_to_num(differences, nan=np.inf), axis=0)]
+    sweep["Best Lookback"] = np.where(np.isnan(invoice_hours), np.nan, best_lookback)
+    return pd.DataFrame(sweep, index=raw_invoice.index)
@@ -0,0 +1,161 @@
+import os
+import threading
+
+import pandas as pd
+import pyarrow as pa
+from pyarrow import feather
+
+from utils.ingestion import load_onboarding_tracker, load_wsr_consolidated
+from utils.loaders import file_digest
+from utils.reconciliation import WSR_NAME_COLUMN, WSR_WEEK_COLUMN
+
+# Folder of the on-disk store; set IBERIA_SNAPSHOT_DIR to keep it somewhere else
+DEFAULT_SNAPSHOT_DIR = os.environ.get(
+    "IBERIA_SNAPSHOT_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "snapshots"),
+)
+
+# Sessions share the store files, so writes are serialized across the process
+_store_lock = threading.Lock()
+
+
+def _to_arrow_compatible(frame):
+    """
+    Prepare a frame to be written to Feather.
+
+    Feather needs a default index, string column names and one type per column, so the
+    index is dropped, column names are turned into strings, and the values of object
+    columns mixing types (for example numbers and text) are stored as text.
+    """
+    frame = frame.reset_index(drop=True)
+    frame.columns = [str(column) for column in frame.columns]
+    for column in frame.columns[frame.dtypes == object]:
+        try:
+            pa.array(frame[column], from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            frame[column] = frame[column].map(lambda value: value if pd.isna(value) else str(value))
+    return frame
+
+
+def _write_feather(frame, path):
+    """Writes 'frame' uncompressed (so it can be memory-mapped) and swaps it in atomically."""
+    temporary_path = f"{path}.tmp"
+    feather.write_feather(_to_arrow_compatible(frame), temporary_path, compression="uncompressed")
+    os.replace(temporary_path, path)
+
+
+def _read_feather(path):
+    """Reads a Feather file through a memory map, or returns None if it does not exist."""
+    if not os.path.exists(path):
+        return None
+    return feather.read_table(path, memory_map=True).to_pandas()
+
+
+class SnapshotStore:
+    """
+    Local columnar store of the parsed WSR history and the latest Onboarding Tracker.
+
+    The WSR (contractor, week) cube is kept in one Feather file. A new WSR Consolidated
+    file is still streamed in full, but only the rows of Reporting Weeks that are not in
+    the store yet are kept, cubed and appended. A file that was already merged is not
+    read at all, so reloading the full history is a memory-mapped read instead of a
+    parse of the .xlsb.
+
+    The Onboarding Tracker has no weeks to append, so the store keeps the parsed
+    "Master List" of the last uploaded tracker and reuses it while the same file is
+    uploaded again.
+
+    Weeks already in the store are never re-read, so hours entered late for a past week
+    are not picked up; use clear() and upload the latest file to rebuild the history.
+
+    Example usage:
+    store = SnapshotStore()
+    wsr_consolidated = store.append_wsr(uploaded_wsr_consolidated)
+    """
+
+    def __init__(self, directory=DEFAULT_SNAPSHOT_DIR):
+        self.directory = directory
+        self.wsr_path = os.path.join(directory, "wsr_cube.feather")
+        self.wsr_sources_path = os.path.join(directory, "wsr_sources.txt")
+        self.onboarding_path = os.path.join(directory, "onboarding_tracker.feather")
+        self.onboarding_digest_path = os.path.join(directory, "onboarding_tracker.digest")
+
+    def _read_lines(self, path):
+        """Returns the lines of a text file of the store, or an empty list if it does not exist."""
+        if not os.path.exists(path):
+            return []
+        with open(path) as handle:
+            return handle.read().split()
+
+    def read_wsr(self):
+        """Returns the stored WSR cube, or None if nothing has been stored yet."""
+        wsr_cube = _read_feather(self.wsr_path)
+        if wsr_cube is not None:
+            wsr_cube[WSR_NAME_COLUMN] = wsr_cube[WSR_NAME_COLUMN].astype("category")
+        return wsr_cube
+
+    def append_wsr(self, file_path):
+        """
+        Add the new Reporting Weeks of a WSR Consolidated file to the store.
+
+        Parameters:
+        - file_path (str or file-like): The WSR Consolidated Excel file.
+
+        Returns:
+        - pd.DataFrame: The full stored WSR cube, including the weeks of this file.
+        """
+        digest = file_digest(file_path)
+        with _store_lock:
+            os.makedirs(self.directory, exist_ok=True)
+            history = self.read_wsr()
+            sources = self._read_lines(self.wsr_sources_path)
+            if history is not None and digest in sources:
+                return history
+
+            # Only keep the weeks that are not in the store yet; the file is still streamed in full
+            known_weeks = [] if history is None else history[WSR_WEEK_COLUMN].unique()
+            new_weeks = load_wsr_consolidated(file_path, cache=None, skip_weeks=known_weeks)
+            if history is None:
+                history = new_weeks
+            elif not new_weeks.empty:
+                history = pd.concat([history, new_weeks], ignore_index=True)
+                history[WSR_NAME_COLUMN] = history[WSR_NAME_COLUMN].astype("category")
+                history = history.sort_values([WSR_NAME_COLUMN, WSR_WEEK_COLUMN], ignore_index=True)
+
+            _write_feather(history, self.wsr_path)
+            with open(self.wsr_sources_path, "a") as handle:
+                handle.write(f"{digest}\n")
+            return history
+
+    def load_onboarding(self, file_path):
+        """
+        Return the parsed "Master List" of an Onboarding Tracker, parsing it only if it is not stored.
+
+        Parameters:
+        - file_path (str or file-like): The Onboarding Tracker Excel file.
+
+        Returns:
+        - pd.DataFrame: The frame returned by load_onboarding_tracker().
+        """
+        digest = file_digest(file_path)
+        with _store_lock:
+            if self._read_lines(self.onboarding_digest_path) == [digest]:
+                onboarding_tracker = _read_feather(self.onboarding_path)
+                if onboarding_tracker is not None:
+                    return onboarding_tracker
+
+            os.makedirs(self.directory, exist_ok=True)
+            onboarding_tracker = load_onboarding_tracker(file_path, cache=None)
+            _write_feather(onboarding_tracker, self.onboarding_path)
+            with open(self.onboarding_digest_path, "w") as handle:
+                handle.write(f"{digest}\n")
+
+            # Hand back what later loads will read, so every session sees the same types
+            return _read_feather(self.onboarding_path)
+
+    def clear(self):
+        """Deletes everything in the store."""
+        with _store_lock:
+            for path in (self.wsr_path, self.wsr_sources_path, self.onboarding_path, self.onboarding_digest_path):
+                if os.path.exists(path):
+                    os.remove(path)
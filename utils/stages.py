@@ -0,0 +1,263 @@
+import hashlib
+import os
+import threading
+from collections import namedtuple
+
+import pandas as pd
+
+from utils.exports import frame_digest
+from utils.ingestion import load_files_in_parallel
+from utils.instrumentation import STAGE_METRIC_COLUMNS, StageRecorder, frame_rows
+from utils.jobs import finished_job, submit_job
+from utils.loaders import file_digest
+
+# Order of the stages of a review; a stage only depends on the stages before it
+PIPELINE_STAGES = ["parse", "normalize", "index", "reconcile", "flag", "summarize", "render", "export"]
+
+# Columns of StagedPipeline.report()
+STAGE_REPORT_COLUMNS = STAGE_METRIC_COLUMNS
+
+# The result of a stage: its value and the fingerprint of the inputs and parameters it was computed from
+Stage = namedtuple("Stage", ["name", "value", "fingerprint"])
+
+
+def fingerprint(value):
+    """
+    Returns a short hash identifying a stage input.
+
+    Stages are identified by their own fingerprint, uploaded files by their upload id (so
+    reruns do not hash their contents), file paths by their size and modification time,
+    DataFrames by their contents, containers by their items and anything else by its repr().
+    """
+    if isinstance(value, Stage):
+        token = value.fingerprint
+    elif hasattr(value, "file_id"):
+        token = f"upload:{value.file_id}:{value.size}"
+    elif isinstance(value, (str, os.PathLike)) and os.path.isfile(value):
+        stat = os.stat(value)
+        token = f"path:{os.fspath(value)}:{stat.st_size}:{stat.st_mtime_ns}"
+    elif hasattr(value, "getbuffer"):
+        token = f"file:{file_digest(value)}"
+    elif isinstance(value, pd.DataFrame):
+        token = f"frame:{frame_digest(value)}"
+    elif isinstance(value, dict):
+        token = repr([(key, fingerprint(item)) for key, item in value.items()])
+    elif isinstance(value, (list, tuple)):
+        token = repr([fingerprint(item) for item in value])
+    elif callable(value):
+        token = f"{getattr(value, '__module__', '')}.{getattr(value, '__qualname__', repr(value))}"
+    else:
+        token = repr(value)
+    return hashlib.blake2b(token.encode(), digest_size=16).hexdigest()
+
+
+def _value(item):
+    """Returns the value of a stage input: Stage inputs, also inside a dict, are replaced by their value."""
+    if isinstance(item, Stage):
+        return item.value
+    if isinstance(item, dict):
+        return {key: _value(value) for key, value in item.items()}
+    return item
+
+
+class StagedPipeline:
+    """
+    Memoized stages of a review, recomputed only when their inputs or parameters change.
+
+    Each stage is named, for example "index WSR" or "reconcile", and keeps its latest
+    result with the fingerprint of the inputs and parameters it was computed from. Inputs
+    that are themselves stages are identified by their fingerprint, so a change anywhere
+    flows to every later stage, while a stage whose inputs did not change is served from
+    memory. Keep one pipeline per page in the session state: Streamlit reruns the page on
+    every interaction, and changing the lookback then only recomputes the reconcile stage
+    and the ones after it, and changing the chart only the render stage. Every stage run
+    is measured by the pipeline's StageRecorder, see report().
+
+    Example usage:
+    pipeline = StagedPipeline()
+    wsr_index = pipeline.run("index WSR", WsrIndex, wsr_stage)
+    result = pipeline.run("reconcile", reconcile_invoice, invoice_stage, "Total", wsr_index, lookup_stage, 4)
+    """
+
+    def __init__(self):
+        self._results = {}
+        self._lock = threading.Lock()
+        self.recorder = StageRecorder()
+
+    def _fingerprint(self, name, inputs, params):
+        """Returns the fingerprint of a stage computed from 'inputs' and 'params'."""
+        return fingerprint([name, list(inputs), sorted(params.items())])
+
+    def lookup(self, name, *inputs, **params):
+        """Returns the stored result of stage 'name' if it was computed from the same inputs and parameters, else None."""
+        key = self._fingerprint(name, inputs, params)
+        with self._lock:
+            stage = self._results.get(name)
+            if stage is not None and stage.fingerprint == key:
+                self.recorder.reused(name)
+                return stage
+        return None
+
+    def store(self, name, value, *inputs, **params):
+        """Stores 'value' as the result of stage 'name' computed from 'inputs' and 'params', and returns it as a Stage."""
+        stage = Stage(name, value, self._fingerprint(name, inputs, params))
+        with self._lock:
+            self._results[name] = stage
+        return stage
+
+    def _compute(self, name, func, inputs, params, progress=None):
+        """Computes and stores stage 'name', measuring its time, memory and rows."""
+        values = [_value(item) for item in inputs]
+        keywords = {key: _value(item) for key, item in params.items()}
+        with self.recorder.measure(name) as record:
+            value = func(*values, **keywords) if progress is None else func(*values, progress=progress, **keywords)
+            # Rows of the frames the stage produced, or else of those it read
+            record["rows"] = frame_rows(value) or frame_rows(*values)
+        return self.store(name, value, *inputs, **params)
+
+    def run(self, name, func, *inputs, **params):
+        """
+        Return the result of a stage, computing it only if its inputs or parameters changed.
+
+        Parameters:
+        - name (str): The name of the stage, unique within the pipeline.
+        - func (callable): Computes the stage from the values of 'inputs' and 'params'.
+        - *inputs: The positional arguments of 'func'; Stage inputs, and Stages in dict inputs, are passed as their value.
+        - **params: The keyword arguments of 'func'; Stage parameters are passed as their value.
+
+        Returns:
+        - Stage: The result, with its value and fingerprint.
+
+        Raises:
+        - Exception: Whatever 'func' raises; a failed stage keeps no result.
+        """
+        stage = self.lookup(name, *inputs, **params)
+        if stage is not None:
+            return stage
+        return self._compute(name, func, inputs, params)
+
+    def submit(self, name, func, *inputs, total_rows=0, **params):
+        """
+        Like run(), but compute the stage in the background on the shared job pool.
+
+        Parameters:
+        - name, func, *inputs, **params: As in run(); 'func' must also accept a 'progress' keyword argument, see Job.
+        - total_rows (int, optional): The rows the stage will process, for the progress bar (default is 0).
+
+        Returns:
+        - Job: A job whose result is the Stage. It is already finished if the stage is current.
+        """
+        stage = self.lookup(name, *inputs, **params)
+        if stage is not None:
+            return finished_job(stage)
+
+        def compute(progress):
+            return self._compute(name, func, inputs, params, progress)
+
+        return submit_job(compute, total_rows=total_rows)
+
+    def discard(self, name):
+        """Drops the stored result of stage 'name', for example when its input was removed."""
+        with self._lock:
+            self._results.pop(name, None)
+
+    def report(self):
+        """
+        Return whether each stage run since the last report was computed or reused, with its
+        wall time, CPU time, peak RSS growth and rows, see StageRecorder.report().
+
+        Stages are listed in PIPELINE_STAGES order by the first word of their name, each followed
+        by its nested steps; other measurements, such as the whole page run, come last.
+        """
+        report = self.recorder.report()
+        # List the stages in pipeline order, by the first word of their name
+        order = report["Stage"].str.split().str[0].map({stage: position for position, stage in enumerate(PIPELINE_STAGES)})
+        return report.iloc[order.fillna(len(PIPELINE_STAGES)).argsort(kind="stable")].reset_index(drop=True)
+
+
+def parse_stages(pipeline, files, **params):
+    """
+    Run the parse stage of several uploaded files, loading only the new or changed ones.
+
+    Parameters:
+    - pipeline (StagedPipeline): The pipeline the stages are stored in.
+    - files (dict): Maps a key to a (loader, file) pair, as in load_files_in_parallel().
+    - **params: Parameters the loaded frames depend on besides the file, added to the fingerprint.
+
+    Returns:
+    - tuple: A dict of the Stage of each loaded file, and a dict of the exceptions raised,
+        both keyed like 'files'. The stage of a key is named "parse <key>".
+
+    The files whose stage is current are not read again; the others are loaded together
+    with load_files_in_parallel().
+
+    Example usage:
+    stages, errors = parse_stages(pipeline, {"raw_invoice": (load_raw_invoice, uploaded_raw_invoice)})
+    """
+    stages = {}
+    pending = {}
+    for key, (loader, file) in files.items():
+        stage = pipeline.lookup(f"parse {key}", loader, file, **params)
+        if stage is not None:
+            stages[key] = stage
+        else:
+            pending[key] = (loader, file)
+
+    # Each file is measured as its own parse stage, in the worker process that loads it
+    frames, errors = load_files_in_parallel({f"parse {key}": pending[key] for key in pending}, recorder=pipeline.recorder)
+    for key, (loader, file) in pending.items():
+        if f"parse {key}" in frames:
+            stages[key] = pipeline.store(f"parse {key}", frames[f"parse {key}"], loader, file, **params)
+    errors = {key[len("parse "):]: error for key, error in errors.items()}
+    for key in errors:
+        pipeline.discard(f"parse {key}")
+    return stages, errors
+
+
+def parse_stored_stages(pipeline, files):
+    """
+    Run the parse stage of uploaded files kept in the local SnapshotStore.
+
+    Parameters:
+    - pipeline (StagedPipeline): The pipeline the stages are stored in.
+    - files (dict): Maps a key to a (load_from_store, file) pair, where 'load_from_store' is
+        SnapshotStore.append_wsr or SnapshotStore.load_onboarding.
+
+    Returns:
+    - tuple: A dict of the Stage of each loaded file, and a dict of the exceptions raised,
+        both keyed like 'files'. The stage of a key is named "parse <key> from store", so it
+        is kept apart from the "parse <key>" stage of parse_stages().
+
+    A file whose stage is current is neither merged into the store nor read from it again.
+
+    Example usage:
+    stages, errors = parse_stored_stages(pipeline, {"wsr_consolidated": (snapshot_store.append_wsr, uploaded_wsr_consolidated)})
+    """
+    stages = {}
+    errors = {}
+    for key, (load_from_store, file) in files.items():
+        try:
+            stages[key] = pipeline.run(f"parse {key} from store", load_from_store, file)
+        except Exception as e:
+            errors[key] = e
+    return stages, errors
+
+
+def clear_stored_stages(pipeline, snapshot_store, keys):
+    """
+    Clear a SnapshotStore and drop the stages that were read from it.
+
+    Parameters:
+    - pipeline (StagedPipeline): The pipeline the stages are stored in.
+    - snapshot_store (SnapshotStore): The store to clear.
+    - keys (iterable): The keys passed to parse_stored_stages(), such as "wsr_consolidated".
+
+    Without dropping the "parse <key> from store" stages, the session would keep the cleared
+    history until an upload changes; now the next run merges the uploads into the empty store.
+
+    Example usage:
+    clear_stored_stages(pipeline, snapshot_store, ["wsr_consolidated", "onboarding_tracker"])
+    """
+    snapshot_store.clear()
+    for key in keys:
+        pipeline.discard(f"parse {key} from store")
@@ -0,0 +1,514 @@
+"""
+Synthetic input workbooks for benchmarking the review pipelines without client files.
+
+The workbooks have the layout of the real uploads: title rows above the header of the
+raw invoices, the Onboarding Tracker and the Hourly Cost sheet, middle initials on some
+names, a "Grand Total" row, and the WSR "Invoice Review" pivot with its merged Vendor
+and Contractor cells left blank below their first row. The WSR is a binary .xlsb
+workbook like the uploaded one; the other workbooks are .xlsx.
+
+    python -m utils.synthetic --rows 100k --output benchmarks/data/100k
+"""
+import argparse
+import os
+import struct
+import sys
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from utils.exports import write_excel_sheets
+from utils.reconciliation import WSR_COST_COLUMN, WSR_HOURS_COLUMN, WSR_NAME_COLUMN, WSR_VENDOR_COLUMN, WSR_WEEK_COLUMN, WsrIndex
+from utils.task_orders import TASK_ORDER_PROFILES
+from utils.tripwire import TRIPWIRE_SHEET_NAME
+
+# Benchmark sizes: the rows of each raw invoice, of the WSR and of the Hourly Cost sheet
+SYNTHETIC_SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+# Sheet of the synthetic Hourly Cost workbook, named like the real ones
+HOURLY_COST_SHEET_NAME = "Hourly Cost_TO29OY1_BVN0001"
+
+# Invoice rows per contractor; the WSR has as many Reporting Weeks per contractor
+ROWS_PER_CONTRACTOR = 25
+
+# Invoice lines bill the WSR hours of this many weeks before their Effective Bill Date, except
+# for the share of lines that bill other hours and are flagged
+ALIGNED_LOOKBACK_WEEKS = 4
+MISALIGNED_SHARE = 0.1
+
+LAST_NAMES = [
+    "Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez", "Martinez",
+    "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson", "Thomas", "Taylor", "Moore", "Jackson", "Martin",
+    "Lee", "Perez", "Thompson", "White", "Harris", "Sanchez", "Clark", "Ramirez", "Lewis", "Robinson",
+    "Walker", "Young", "Allen", "King", "Wright", "Scott", "Torres", "Nguyen", "Hill", "Flores",
+    "Green", "Adams", "Nelson", "Baker", "Hall", "Rivera", "Campbell", "Mitchell", "Carter", "Roberts",
+]
+FIRST_NAMES = [
+    "James", "Mary", "Robert", "Patricia", "John", "Jennifer", "Michael", "Linda", "David", "Elizabeth",
+    "William", "Barbara", "Richard", "Susan", "Joseph", "Jessica", "Thomas", "Sarah", "Charles", "Karen",
+    "Christopher", "Lisa", "Daniel", "Nancy", "Matthew", "Betty", "Anthony", "Margaret", "Mark", "Sandra",
+    "Donald", "Ashley", "Steven", "Kimberly", "Paul", "Emily", "Andrew", "Donna", "Joshua", "Michelle",
+    "Kenneth", "Carol", "Kevin", "Amanda", "Brian", "Melissa", "George", "Deborah", "Timothy", "Stephanie",
+]
+VENDORS = [
+    "Alder Systems LLC", "Beacon Federal Group", "Cedar Analytics Inc", "Delta Mission Partners", "Evergreen Consulting",
+    "Falcon Technical Services", "Granite Solutions", "Harbor Point Advisors", "Ironwood Data", "Juniper Federal",
+]
+# Correct LCAT Syntax -> the spellings vendors use for it
+LCATS = {
+    "Program Manager": ["Program Manager", "PROGRAM MANAGER", "Prog. Manager\n"],
+    "Project Manager II": ["Project Manager II", "Project Mgr 2", "PM II"],
+    "Business Analyst I": ["Business Analyst I", "Bus. Analyst 1"],
+    "Business Analyst III": ["Business Analyst III", "Sr Business Analyst\n"],
+    "Data Scientist II": ["Data Scientist II", "Data Scientist 2"],
+    "Software Developer II": ["Software Developer II", "Developer II\n", "SW Dev 2"],
+    "Software Developer IV": ["Software Developer IV", "Sr. Software Developer"],
+    "Systems Engineer III": ["Systems Engineer III", "Sys Eng III"],
+    "Financial Analyst II": ["Financial Analyst II", "Fin Analyst 2"],
+    "Subject Matter Expert": ["Subject Matter Expert", "SME"],
+}
+
+# Record types of the binary workbook (.xlsb) parts written by write_xlsb_sheets(), numbered as in [MS-XLSB]
+_XLSB_ROW_HEADER = 0
+_XLSB_CELL_REAL = 5
+_XLSB_CELL_SHARED_STRING = 7
+_XLSB_SHARED_STRING = 19
+_XLSB_BEGIN_SHEET = 129
+_XLSB_END_SHEET = 130
+_XLSB_BEGIN_BOOK = 131
+_XLSB_END_BOOK = 132
+_XLSB_BEGIN_SHEETS = 143
+_XLSB_END_SHEETS = 144
+_XLSB_BEGIN_SHEET_DATA = 145
+_XLSB_END_SHEET_DATA = 146
+_XLSB_DIMENSION = 148
+_XLSB_SHEET = 156
+_XLSB_BEGIN_SHARED_STRINGS = 159
+_XLSB_END_SHARED_STRINGS = 160
+
+# Rows of a sheet converted to records at a time by write_xlsb_sheets()
+XLSB_CHUNK_ROWS = 10_000
+
+
+def synthetic_rows(size):
+    """
+    Returns the number of rows of a benchmark size.
+
+    Parameters:
+    - size (str or int): A key of SYNTHETIC_SIZES, or a number of rows such as "25000".
+
+    Raises:
+    - ValueError: If 'size' is neither.
+    """
+    if size in SYNTHETIC_SIZES:
+        return SYNTHETIC_SIZES[size]
+    try:
+        rows = int(size)
+    except (TypeError, ValueError):
+        rows = 0
+    if rows <= 0:
+        raise ValueError(f'Unknown size "{size}", expected one of {list(SYNTHETIC_SIZES)} or a number of rows.')
+    return rows
+
+
+def synthetic_contractors(count, seed=0):
+    """
+    Build the contractors shared by every synthetic workbook.
+
+    Parameters:
+    - count (int): The number of contractors, at most 125,000.
+    - seed (int, optional): The random seed (default is 0).
+
+    Returns:
+    - pd.DataFrame: One row per contractor with a "Unique ID", a unique "Name" as
+        "Last, First", a "Middle Initial", a "Vendor", a "Correct LCAT", a vendor
+        spelling of it ("Vendor LCAT") and an hourly "Rate".
+    """
+    rng = np.random.default_rng(seed)
+    positions = np.arange(count)
+    last_names = np.array(LAST_NAMES, dtype=object)
+    first_names = np.array(FIRST_NAMES, dtype=object)
+
+    # Every (last, first) pair is used once, then double-barrelled last names keep the names unique
+    last = last_names[positions % len(LAST_NAMES)]
+    barrel = positions // (len(LAST_NAMES) * len(FIRST_NAMES))
+    last = np.where(barrel > 0, last + "-" + last_names[barrel % len(LAST_NAMES)], last)
+    first = first_names[(positions // len(LAST_NAMES)) % len(FIRST_NAMES)]
+
+    lcats = list(LCATS)
+    correct = rng.integers(0, len(lcats), count)
+    spelling = [LCATS[lcats[position]][rng.integers(0, len(LCATS[lcats[position]]))] for position in correct]
+    return pd.DataFrame({
+        "Unique ID": 100_000 + positions,
+        "Name": last + ", " + first,
+        # A third of the contractors carry a middle initial that the loaders have to remove
+        "Middle Initial": np.where(rng.random(count) < 1 / 3, " " + pd.Series(rng.integers(65, 91, count)).map(chr).to_numpy(), ""),
+        "Vendor": np.array(VENDORS, dtype=object)[rng.integers(0, len(VENDORS), count)],
+        "Correct LCAT": np.array(lcats, dtype=object)[correct],
+        "Vendor LCAT": spelling,
+        "Rate": rng.uniform(85, 240, count).round(2),
+    })
+
+
+def _reporting_weeks(count):
+    """Returns 'count' consecutive Fridays, the WSR Reporting Weeks, ending in early 2024."""
+    return pd.date_range(end="2024-03-29", periods=count, freq="W-FRI")
+
+
+def _misspell(names, rng, share):
+    """Drops one letter from the first name of a 'share' of 'names', as typed by hand on some invoices."""
+    names = names.copy()
+    chosen = np.flatnonzero(rng.random(len(names)) < share)
+    for position in chosen:
+        name = names[position]
+        cut = name.index(", ") + 3
+        if cut < len(name):
+            names[position] = name[:cut] + name[cut + 1:]
+    return names
+
+
+def raw_invoice_frame(contractors, rows, task_order, seed=0, wsr=None):
+    """
+    Build a synthetic raw invoice.
+
+    Parameters:
+    - contractors (pd.DataFrame): The frame returned by synthetic_contractors().
+    - rows (int): The number of invoice lines, not counting the "Grand Total" row.
+    - task_order (str): A key of TASK_ORDER_PROFILES; it picks the hours column.
+    - seed (int, optional): The random seed (default is 0).
+    - wsr (pd.DataFrame, optional): The frame returned by wsr_consolidated_frame(). When given,
+        lines bill the WSR hours of the ALIGNED_LOOKBACK_WEEKS before their date, except for
+        a MISALIGNED_SHARE of them (default is None, random hours).
+
+    Returns:
+    - pd.DataFrame: The invoice lines, with an unnamed empty column first and the
+        "Grand Total" row last, as exported by the vendors.
+    """
+    rng = np.random.default_rng(seed)
+    picked = contractors.iloc[rng.integers(0, len(contractors), rows)]
+    weeks = _reporting_weeks(max(ROWS_PER_CONTRACTOR, 8))
+    bill_dates = weeks[rng.integers(4, len(weeks), rows)]
+    hours = rng.integers(0, 49 * 4, rows) / 4
+    if wsr is not None:
+        aligned = rng.random(rows) >= MISALIGNED_SHARE
+        window_hours, _ = WsrIndex(wsr).window_totals(picked["Name"], bill_dates - pd.Timedelta(weeks=ALIGNED_LOOKBACK_WEEKS), bill_dates)
+        hours = np.where(aligned, window_hours, hours)
+    names = _misspell(picked["Name"].to_numpy(), rng, 0.01) + picked["Middle Initial"].to_numpy()
+    invoice = pd.DataFrame({
+        # Vendors leave the first column empty; the loader drops it as "Unnamed: 0"
+        "": None,
+        "Unique ID": picked["Unique ID"].to_numpy(),
+        "Name": names,
+        "PLC Description": picked["Vendor LCAT"].to_numpy(),
+        "Effective Bill Date": bill_dates,
+        TASK_ORDER_PROFILES[task_order]["hours_column"]: hours,
+    })
+    grand_total = pd.DataFrame({"Name": ["Grand Total"], TASK_ORDER_PROFILES[task_order]["hours_column"]: [hours.sum()]})
+    return pd.concat([invoice, grand_total], ignore_index=True)
+
+
+def wsr_consolidated_frame(contractors, rows, seed=0):
+    """
+    Build the rows of a synthetic WSR Consolidated "Invoice Review" pivot.
+
+    Parameters:
+    - contractors (pd.DataFrame): The frame returned by synthetic_contractors().
+    - rows (int): The number of (contractor, Reporting Week) rows.
+    - seed (int, optional): The random seed (default is 0).
+
+    Returns:
+    - pd.DataFrame: The WSR columns sorted by vendor, contractor and week, every cell
+        filled in; wsr_pivot_sheet() lays them out as in the uploaded file.
+    """
+    rng = np.random.default_rng(seed)
+    weeks_per_contractor = max(1, -(-rows // len(contractors)))
+    weeks = _reporting_weeks(weeks_per_contractor)
+    pivot = contractors.loc[contractors.index.repeat(weeks_per_contractor), ["Vendor", "Name", "Rate"]].iloc[:rows]
+    pivot["Week"] = np.tile(weeks, len(contractors))[:rows]
+    pivot = pivot.sort_values(["Vendor", "Name", "Week"], kind="stable")
+    hours = rng.integers(0, 49 * 4, rows) / 4
+    return pd.DataFrame({
+        WSR_VENDOR_COLUMN: pivot["Vendor"].to_numpy(),
+        WSR_NAME_COLUMN: pivot["Name"].to_numpy(),
+        WSR_WEEK_COLUMN: pivot["Week"].to_numpy(),
+        WSR_HOURS_COLUMN: hours,
+        WSR_COST_COLUMN: (hours * pivot["Rate"].to_numpy()).round(2),
+    })
+
+
+def wsr_pivot_sheet(wsr):
+    """Returns the rows of wsr_consolidated_frame() as a pivot sheet: merged Vendor and Contractor cells blank below their first row, and a "Grand Total" row."""
+    sheet = wsr.copy()
+    for column in [WSR_VENDOR_COLUMN, WSR_NAME_COLUMN]:
+        sheet[column] = sheet[column].where(sheet[column].ne(sheet[column].shift()))
+    grand_total = pd.DataFrame({WSR_VENDOR_COLUMN: ["Grand Total"], WSR_HOURS_COLUMN: [wsr[WSR_HOURS_COLUMN].sum()], WSR_COST_COLUMN: [wsr[WSR_COST_COLUMN].sum()]})
+    return pd.concat([sheet, grand_total], ignore_index=True)
+
+
+def onboarding_tracker_frames(contractors, seed=0):
+    """
+    Build the sheets of a synthetic Onboarding Tracker.
+
+    Parameters:
+    - contractors (pd.DataFrame): The frame returned by synthetic_contractors().
+    - seed (int, optional): The random seed (default is 0).
+
+    Returns:
+    - dict: The "Master List" (one row per contractor plus 2% resubmitted candidates that
+        repeat their Candidate Unique ID), the "Tripwire Tracker" (a third of the contractors,
+        most with a Final Approval) and the "LCAT Normalization" sheets.
+    """
+    rng = np.random.default_rng(seed)
+    repeated = contractors.iloc[np.flatnonzero(rng.random(len(contractors)) < 0.02)]
+    listed = pd.concat([contractors, repeated], ignore_index=True)
+    master_list = pd.DataFrame({
+        "Candidate Unique ID": listed["Unique ID"],
+        "Candidate Name": listed["Name"] + listed["Middle Initial"],
+        "Vendor": listed["Vendor"],
+        "Task Order #": np.where(rng.random(len(listed)) < 0.5, "TO29", "TO32"),
+        "Vendor Submission Date": pd.Timestamp("2022-01-03") + pd.to_timedelta(rng.integers(0, 730, len(listed)), unit="D"),
+        "Candidate Proposed LCAT": listed["Correct LCAT"],
+        "Status": "Onboarded",
+    })
+
+    tracked = contractors.iloc[np.flatnonzero(rng.random(len(contractors)) < 1 / 3)]
+    tripwire_tracker = pd.DataFrame({
+        "Candidate Name": tracked["Name"] + tracked["Middle Initial"],
+        "Final Approval": np.where(rng.random(len(tracked)) < 0.8, "Y", "N"),
+    })
+
+    lcat_normalization = pd.DataFrame(
+        [(spelling, correct) for correct, spellings in LCATS.items() for spelling in spellings],
+        columns=["Vendor LCATs", "Correct LCAT Syntax"],
+    )
+    return {"Master List": master_list, TRIPWIRE_SHEET_NAME: tripwire_tracker, "LCAT Normalization": lcat_normalization}
+
+
+def hourly_cost_frame(contractors, rows, seed=0):
+    """
+    Build a synthetic Hourly Cost sheet.
+
+    Parameters:
+    - contractors (pd.DataFrame): The frame returned by synthetic_contractors().
+    - rows (int): The number of cost lines.
+    - seed (int, optional): The random seed (default is 0).
+
+    Returns:
+    - pd.DataFrame: One cost line per row, a quarter of them above the tripwire rate.
+    """
+    rng = np.random.default_rng(seed)
+    picked = contractors.iloc[rng.integers(0, len(contractors), rows)]
+    cost = picked["Rate"].to_numpy() * rng.uniform(0.9, 1.1, rows)
+    tripwire_rate = np.quantile(cost, 0.75)
+    return pd.DataFrame({
+        "Unique ID": picked["Unique ID"].to_numpy(),
+        "Name": picked["Name"].to_numpy() + picked["Middle Initial"].to_numpy(),
+        "PLC Desc": picked["Vendor LCAT"].to_numpy(),
+        "Hourly Cost $/hr": cost,
+        "Above Tripwire Rate?": np.where(cost > tripwire_rate, "Yes", "No"),
+    })
+
+
+def _xlsb_record(record_type, payload=b""):
+    """Returns one binary workbook record: its type and length, each in 7-bit groups, then its payload."""
+    header = bytes([record_type]) if record_type < 0x80 else bytes([(record_type & 0x7F) | 0x80, record_type >> 7])
+    size, length = len(payload), bytearray()
+    while True:
+        length.append((size & 0x7F) | (0x80 if size >= 0x80 else 0))
+        size >>= 7
+        if not size:
+            return header + bytes(length) + payload
+
+
+def _xlsb_string(text):
+    """Returns a string as stored in binary workbook records: its length in characters, then UTF-16."""
+    encoded = text.encode("utf-16-le")
+    return struct.pack("<I", len(encoded) // 2) + encoded
+
+
+def _xlsb_columns(frame):
+    """Returns the values of each column of 'frame' as Python objects, with dates as Excel serial numbers and missing values as None."""
+    columns = []
+    for position in range(frame.shape[1]):
+        series = frame.iloc[:, position]
+        if pd.api.types.is_datetime64_any_dtype(series.dtype):
+            series = (series - pd.Timestamp("1899-12-30")) / pd.Timedelta(days=1)
+        columns.append(series.astype(object).where(series.notna(), None).tolist())
+    return columns
+
+
+def write_xlsb_sheets(sheets, target, preamble=None):
+    """
+    Write DataFrames to a binary .xlsb workbook, one sheet each.
+
+    Parameters:
+    - sheets (dict): Maps a sheet name to the DataFrame written on it (without its index).
+    - target (str): The file path to write to.
+    - preamble (dict, optional): Maps a sheet name to a list of rows, each a list of values,
+        written above the header of that sheet, as in write_excel_sheets() (default is None).
+
+    No .xlsb writer is installed, so the records are written directly. The file holds only
+    the parts the loaders read through pyxlsb: the workbook with its sheet names, the
+    shared strings and the cells of each sheet, with text as shared strings and numbers
+    and dates (as Excel serial numbers) as floats. It has no styles, so it is a fixture for
+    the .xlsb loaders rather than a file to open in Excel. Blank cells are not stored, as in
+    the merged pivot cells of the WSR.
+
+    Example usage:
+    write_xlsb_sheets({"Invoice Review": wsr_pivot_sheet(wsr)}, "WSR_Consolidated.xlsb")
+    """
+    preamble = preamble or {}
+    strings = {}
+
+    def cell(column, value):
+        # Each cell stores its column and a style of 0, then its value
+        if isinstance(value, str):
+            return _xlsb_record(_XLSB_CELL_SHARED_STRING, struct.pack("<III", column, 0, strings.setdefault(value, len(strings))))
+        return _xlsb_record(_XLSB_CELL_REAL, struct.pack("<IId", column, 0, float(value)))
+
+    def row_records(row_number, values, width):
+        records = [_xlsb_record(_XLSB_ROW_HEADER, struct.pack("<IIH3xIII", row_number, 0, 300, 1, 0, width - 1))]
+        records.extend(cell(column, value) for column, value in enumerate(values) if value is not None)
+        return b"".join(records)
+
+    with zipfile.ZipFile(target, "w", zipfile.ZIP_DEFLATED) as package:
+        sheet_list = []
+        for number, (sheet_name, frame) in enumerate(sheets.items(), start=1):
+            rows_above = preamble.get(sheet_name, [])
+            width = max([frame.shape[1]] + [len(values) for values in rows_above] + [1])
+            header_row = len(rows_above)
+            with package.open(f"xl/worksheets/sheet{number}.bin", "w") as sheet:
+                sheet.write(_xlsb_record(_XLSB_BEGIN_SHEET))
+                sheet.write(_xlsb_record(_XLSB_DIMENSION, struct.pack("<IIII", 0, header_row + len(frame), 0, width - 1)))
+                sheet.write(_xlsb_record(_XLSB_BEGIN_SHEET_DATA))
+                for row_number, values in enumerate(rows_above):
+                    sheet.write(row_records(row_number, values, width))
+                sheet.write(row_records(header_row, [str(column) for column in frame.columns], width))
+                for start in range(0, len(frame), XLSB_CHUNK_ROWS):
+                    columns = _xlsb_columns(frame.iloc[start:start + XLSB_CHUNK_ROWS])
+                    sheet.write(b"".join(
+                        row_records(header_row + start + offset + 1, values, width) for offset, values in enumerate(zip(*columns))
+                    ))
+                sheet.write(_xlsb_record(_XLSB_END_SHEET_DATA) + _xlsb_record(_XLSB_END_SHEET))
+            sheet_list.append(_xlsb_record(_XLSB_SHEET, struct.pack("<II", 0, number) + _xlsb_string(f"rId{number}") + _xlsb_string(sheet_name)))
+
+        # The workbook lists the sheets, each found through its relationship id
+        package.writestr("xl/workbook.bin", b"".join([
+            _xlsb_record(_XLSB_BEGIN_BOOK), _xlsb_record(_XLSB_BEGIN_SHEETS), *sheet_list, _xlsb_record(_XLSB_END_SHEETS), _xlsb_record(_XLSB_END_BOOK),
+        ]))
+        package.writestr("xl/sharedStrings.bin", b"".join([
+            _xlsb_record(_XLSB_BEGIN_SHARED_STRINGS, struct.pack("<II", len(strings), len(strings))),
+            *(_xlsb_record(_XLSB_SHARED_STRING, b"\x00" + _xlsb_string(text)) for text in strings),
+            _xlsb_record(_XLSB_END_SHARED_STRINGS),
+        ]))
+
+        # Package parts: the content types, the workbook relationship and those of its sheets and strings
+        relationship = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+        overrides = "".join(
+            f'<Override PartName="/xl/worksheets/sheet{number}.bin" ContentType="application/vnd.ms-excel.worksheet"/>'
+            for number in range(1, len(sheets) + 1)
+        )
+        package.writestr("[Content_Types].xml", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Override PartName="/xl/workbook.bin" ContentType="application/vnd.ms-excel.sheet.binary.macroEnabled.main"/>'
+            f'{overrides}<Override PartName="/xl/sharedStrings.bin" ContentType="application/vnd.ms-excel.sharedStrings"/></Types>'
+        ))
+        package.writestr("_rels/.rels", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            f'<Relationship Id="rId1" Type="{relationship}/officeDocument" Target="xl/workbook.bin"/></Relationships>'
+        ))
+        sheet_relationships = "".join(
+            f'<Relationship Id="rId{number}" Type="{relationship}/worksheet" Target="worksheets/sheet{number}.bin"/>'
+            for number in range(1, len(sheets) + 1)
+        )
+        package.writestr("xl/_rels/workbook.bin.rels", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            f'{sheet_relationships}<Relationship Id="rId{len(sheets) + 1}" Type="{relationship}/sharedStrings" Target="sharedStrings.bin"/>'
+            '</Relationships>'
+        ))
+
+
+def synthetic_paths(directory):
+    """Returns the path of each synthetic workbook in 'directory', keyed like generate_workbooks()."""
+    paths = {f"raw_invoice_{task_order}": os.path.join(directory, f"{task_order}_Invoice.xlsx") for task_order in TASK_ORDER_PROFILES}
+    paths.update({
+        # The WSR is uploaded as .xlsb, so it is written as one to go through the pyxlsb loader
+        "wsr_consolidated": os.path.join(directory, "WSR_Consolidated.xlsb"),
+        "onboarding_tracker": os.path.join(directory, "Onboarding_Tracker.xlsx"),
+        "hourly_cost": os.path.join(directory, "Hourly_Cost.xlsx"),
+    })
+    return paths
+
+
+def generate_workbooks(directory, rows, seed=0, overwrite=False):
+    """
+    Write a set of synthetic input workbooks.
+
+    Parameters:
+    - directory (str): The folder to write to, created if missing.
+    - rows (int): The rows of each raw invoice, of the WSR and of the Hourly Cost sheet.
+        The Onboarding Tracker has one row per contractor, a contractor for every
+        ROWS_PER_CONTRACTOR rows.
+    - seed (int, optional): The random seed; the same rows and seed give the same files (default is 0).
+    - overwrite (bool, optional): Write the files again even if they exist (default is False).
+
+    Returns:
+    - dict: The path of each workbook, see synthetic_paths(). Files that already exist are
+        kept, so a folder per size and seed can be reused by every benchmark run.
+
+    Example usage:
+    paths = generate_workbooks("benchmarks/data/10k", 10_000)
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = synthetic_paths(directory)
+    if not overwrite and all(os.path.exists(path) for path in paths.values()):
+        return paths
+
+    contractors = synthetic_contractors(max(20, rows // ROWS_PER_CONTRACTOR), seed)
+    wsr = wsr_consolidated_frame(contractors, rows, seed)
+    titles = [["Iberia Advisory"], ["Synthetic benchmark data, not client data"], []]
+
+    for position, task_order in enumerate(TASK_ORDER_PROFILES):
+        invoice = raw_invoice_frame(contractors, rows, task_order, seed + position + 1, wsr)
+        write_excel_sheets({"Sheet1": invoice}, paths[f"raw_invoice_{task_order}"], preamble={"Sheet1": titles})
+
+    write_xlsb_sheets(
+        {"Invoice Review": wsr_pivot_sheet(wsr)}, paths["wsr_consolidated"],
+        preamble={"Invoice Review": [["Sum of Time Spent (Hours) by Vendor, Contractor and Reporting Week"], []]},
+    )
+    tracker = onboarding_tracker_frames(contractors, seed)
+    write_excel_sheets(
+        tracker, paths["onboarding_tracker"],
+        preamble={"Master List": [["Onboarding Tracker - Master List"]], TRIPWIRE_SHEET_NAME: [["Tripwire Exceptions"], []]},
+    )
+    write_excel_sheets(
+        {HOURLY_COST_SHEET_NAME: hourly_cost_frame(contractors, rows, seed)}, paths["hourly_cost"],
+        preamble={HOURLY_COST_SHEET_NAME: titles[:2]},
+    )
+    return paths
+
+
+def main(argv=None):
+    """Command-line entry point, see the module docstring for usage."""
+    parser = argparse.ArgumentParser(prog="python -m utils.synthetic", description="Write synthetic input workbooks for benchmarking.")
+    parser.add_argument("--rows", required=True, help=f"Rows per workbook: one of {list(SYNTHETIC_SIZES)} or a number.")
+    parser.add_argument("--output", required=True, help="Folder for the workbooks.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+    parser.add_argument("--overwrite", action="store_true", help="Write the workbooks again if they exist.")
+    args = parser.parse_args(argv)
+    try:
+        rows = synthetic_rows(args.rows)
+    except ValueError as e:
+        parser.error(str(e))
+    for key, path in generate_workbooks(args.output, rows, args.seed, args.overwrite).items():
+        print(f"{key}: {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
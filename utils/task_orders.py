@@ -0,0 +1,236 @@
+from collections import namedtuple
+
+import pandas as pd
+
+from utils.matching import DEFAULT_MIN_MATCH_SCORE, MATCH_COLUMNS, accepted_name_matches, review_name_matches
+from utils.onboarding import ONBOARDING_COLUMNS, enrich_from_onboarding
+from utils.reconciliation import DEFAULT_HOURS_TOLERANCE, HIGH_CONTRACT_RATE, RECONCILED_COLUMNS, flag_misalignment, reconcile_wsr
+
+# Column schema of the raw invoice of each task order: the column with the billed hours
+TASK_ORDER_PROFILES = {
+    "TO29": {"hours_column": "Total"},
+    "TO32": {"hours_column": "Sum of Transaction Hours"},
+}
+
+# Columns of the combined flags table of reconcile_task_orders()
+COMBINED_FLAG_COLUMNS = ["Task Order", "Unique ID", "Name", "Invoice Hours", "WSR Hours", "Misalignment"]
+
+# Excel's "Light red fill with dark red text" and "Yellow fill with dark yellow text" highlights
+FLAGGED_ROW_FORMAT = {"bg_color": "#FFC7CE", "font_color": "#9C0006"}
+HIGH_RATE_ROW_FORMAT = {"bg_color": "#FFEB9C", "font_color": "#9C5700"}
+
+# reconcile_invoice() reports its progress about PROGRESS_CHUNKS times per invoice, in chunks of at
+# least MIN_PROGRESS_CHUNK_ROWS rows so small invoices are not split into needlessly tiny lookups
+PROGRESS_CHUNKS = 50
+MIN_PROGRESS_CHUNK_ROWS = 200
+
+# What reconcile_invoice() returns:
+# - invoice: the raw invoice joined with the derived columns
+# - derived_columns: only the onboarding and reconciled columns added to the invoice
+# - misalignment_flags: the frame returned by flag_misalignment(), or None if the invoice was not flagged
+# - name_match_review: the frame returned by review_name_matches()
+# - name_matches: the accepted name matches that were used for the WSR lookups
+ReconciledInvoice = namedtuple(
+    "ReconciledInvoice", ["invoice", "derived_columns", "misalignment_flags", "name_match_review", "name_matches"]
+)
+
+
+def join_derived_columns(raw_invoice, derived_columns):
+    """
+    Add the derived columns to an invoice without copying the invoice's own columns.
+
+    Parameters:
+    - raw_invoice (pd.DataFrame): The invoice as loaded.
+    - derived_columns (pd.DataFrame): The columns to add, indexed like 'raw_invoice'. They
+        replace invoice columns of the same name.
+
+    Returns:
+    - pd.DataFrame: The joined frame, sharing its invoice columns with 'raw_invoice'.
+    """
+    if raw_invoice.columns.isin(derived_columns.columns).any():
+        raw_invoice = raw_invoice.drop(columns=derived_columns.columns, errors="ignore")
+    return pd.concat([raw_invoice, derived_columns], axis=1, copy=False)
+
+
+def progress_chunk_rows(total_rows):
+    """Returns the invoice rows reconciled between two progress reports, see PROGRESS_CHUNKS."""
+    return max(MIN_PROGRESS_CHUNK_ROWS, -(-total_rows // PROGRESS_CHUNKS))
+
+
+def reconcile_invoice(raw_invoice, hours_column, wsr_index, onboarding_lookup, x_week_lookback,
+                      tolerance=DEFAULT_HOURS_TOLERANCE, match_index=None, min_match_score=DEFAULT_MIN_MATCH_SCORE, progress=None):
+    """
+    Run the full review of one raw invoice against a WSR index and onboarding lookup.
+
+    Parameters:
+    - raw_invoice (pd.DataFrame): The invoice returned by load_raw_invoice().
+    - hours_column (str): The invoice column with the billed hours, see TASK_ORDER_PROFILES.
+    - wsr_index (WsrIndex): The index built from the WSR Consolidated file.
+    - onboarding_lookup (pd.DataFrame): The lookup returned by build_onboarding_lookup().
+    - x_week_lookback (int): The number of weeks before the Effective Bill Date to include.
+    - tolerance (float, optional): The largest difference in hours still treated as aligned (default is DEFAULT_HOURS_TOLERANCE).
+        Pass None to leave the flags to the caller, for example a page that flags in a stage of its own
+        so a new tolerance does not re-run the reconciliation; misalignment_flags is then None.
+    - match_index (NameMatchIndex, optional): Resolves invoice names missing from the WSR (default is None, exact names only).
+    - min_match_score (float, optional): The smallest accepted name match score (default is DEFAULT_MIN_MATCH_SCORE).
+    - progress (callable, optional): Called with the number of rows reconciled after every chunk
+        of progress_chunk_rows() rows, and with 0 before and after the name matching, for example
+        Job.progress, which stops a cancelled job at its next call (default is None, one pass).
+
+    Returns:
+    - ReconciledInvoice: The reconciled invoice, its derived columns, the misalignment flags
+        and the name match review.
+
+    Example usage:
+    result = reconcile_invoice(raw_invoice, "Total", wsr_index, onboarding_lookup, 4)
+    """
+    # Fill in Vendor, TO, Onboard Date and Onboard LCAT for every row from the onboarding lookup
+    enriched = enrich_from_onboarding(raw_invoice, onboarding_lookup)
+
+    # Suggest a WSR contractor for the invoice names with no exact match in the WSR; the progress
+    # reports around it let a cancelled job stop before and after the matching
+    if progress is not None:
+        progress(0)
+    if match_index is not None:
+        name_match_review = review_name_matches(raw_invoice["Name"], wsr_index, match_index, min_match_score)
+    else:
+        name_match_review = pd.DataFrame(columns=MATCH_COLUMNS)
+    name_matches = accepted_name_matches(name_match_review)
+    if progress is not None:
+        progress(0)
+
+    # Calculate WSR Hours, Contract Rate and Cost Check for every row, using the accepted name matches;
+    # when progress is reported the rows are reconciled a chunk at a time
+    if progress is None or raw_invoice.empty:
+        reconciled = reconcile_wsr(raw_invoice, wsr_index, x_week_lookback, name_matches)
+    else:
+        chunk_rows = progress_chunk_rows(len(raw_invoice))
+        chunks = []
+        for start in range(0, len(raw_invoice), chunk_rows):
+            chunk = raw_invoice.iloc[start:start + chunk_rows]
+            chunks.append(reconcile_wsr(chunk, wsr_index, x_week_lookback, name_matches))
+            progress(len(chunk))
+        reconciled = pd.concat(chunks)
+
+    # Only the new columns are stored; the uploaded invoice columns are shared rather than copied
+    derived_columns = pd.concat([enriched[list(ONBOARDING_COLUMNS)], reconciled[RECONCILED_COLUMNS]], axis=1)
+    invoice = join_derived_columns(raw_invoice, derived_columns)
+
+    # Check for misalignment between the invoiced hours and the WSR Hours
+    misalignment_flags = flag_misalignment(invoice, hours_column, tolerance) if tolerance is not None else None
+    return ReconciledInvoice(invoice, derived_columns, misalignment_flags, name_match_review, name_matches)
+
+
+def flagged_rows(task_order, result, hours_column):
+    """
+    Return the flagged rows of a reconciled invoice under column names shared by every task order.
+
+    Parameters:
+    - task_order (str): The task order of the invoice.
+    - result (ReconciledInvoice): The result of reconcile_invoice().
+    - hours_column (str): The invoice column with the billed hours.
+
+    Returns:
+    - pd.DataFrame: The flagged rows with the columns in COMBINED_FLAG_COLUMNS.
+    """
+    rows = result.misalignment_flags["Misalignment"] == "Flagged"
+    return pd.DataFrame({
+        "Task Order": task_order,
+        "Unique ID": result.invoice.loc[rows, "Unique ID"],
+        "Name": result.invoice.loc[rows, "Name"].astype(object),
+        "Invoice Hours": pd.to_numeric(result.invoice.loc[rows, hours_column], errors="coerce"),
+        "WSR Hours": result.invoice.loc[rows, "WSR Hours"],
+        "Misalignment": "Flagged",
+    }, columns=COMBINED_FLAG_COLUMNS)
+
+
+def summary_statistics(invoice, hours_column):
+    """
+    Describe the invoiced hours, WSR Hours, Contract Rate and Cost Check of a reconciled invoice.
+
+    Parameters:
+    - invoice (pd.DataFrame): The reconciled invoice.
+    - hours_column (str): The invoice column with the billed hours.
+
+    Returns:
+    - pd.DataFrame: The count, mean, standard deviation, minimum, quartiles and maximum of each column.
+    """
+    return invoice[[hours_column, 'WSR Hours', 'Contract Rate', 'Cost Check']].describe()
+
+
+def review_workbook(invoice, hours_column, tolerance=DEFAULT_HOURS_TOLERANCE, name_match_review=None):
+    """
+    Lay out the review workbook of a reconciled invoice.
+
+    Parameters:
+    - invoice (pd.DataFrame): The reconciled invoice.
+    - hours_column (str): The invoice column with the billed hours.
+    - tolerance (float, optional): The largest difference in hours still treated as aligned (default is DEFAULT_HOURS_TOLERANCE).
+    - name_match_review (pd.DataFrame, optional): Adds a "Name Matches" sheet when given (default is None).
+
+    Returns:
+    - tuple: The sheets and the row formats to pass to excel_export() or write_excel_sheets().
+
+    The workbook has the reconciled invoice (flagged rows in red, rows above HIGH_CONTRACT_RATE
+    in yellow), the rows of each highlight on their own "Total Hour Flags" and "High Contract
+    Rate Rows" sheets, and the "Summary Statistics". The highlighted rows are found with one
+    vectorized comparison per rule and reused by every sheet.
+
+    Example usage:
+    sheets, row_formats = review_workbook(raw_invoice_copy, "Total", 0.01)
+    """
+    flagged = (flag_misalignment(invoice, hours_column, tolerance)["Misalignment"] == "Flagged").to_numpy()
+    high_rate = (pd.to_numeric(invoice['Contract Rate'], errors="coerce") > HIGH_CONTRACT_RATE).to_numpy()
+
+    sheets = {
+        "Reconciled Invoice": invoice,
+        "Total Hour Flags": invoice[flagged],
+        "High Contract Rate Rows": invoice[high_rate],
+        "Summary Statistics": summary_statistics(invoice, hours_column).rename_axis("Statistic").reset_index(),
+    }
+    if name_match_review is not None:
+        sheets["Name Matches"] = name_match_review
+    row_formats = {
+        "Reconciled Invoice": [(flagged, FLAGGED_ROW_FORMAT), (high_rate, HIGH_RATE_ROW_FORMAT)],
+        "Total Hour Flags": [(high_rate[flagged], HIGH_RATE_ROW_FORMAT)],
+    }
+    return sheets, row_formats
+
+
+def reconcile_task_orders(raw_invoices, wsr_index, onboarding_lookup, x_week_lookback,
+                          tolerance=DEFAULT_HOURS_TOLERANCE, match_index=None, min_match_score=DEFAULT_MIN_MATCH_SCORE, progress=None):
+    """
+    Review the invoices of several task orders against one shared WSR index and onboarding lookup.
+
+    Parameters:
+    - raw_invoices (dict): Maps a task order in TASK_ORDER_PROFILES to its raw invoice.
+    - wsr_index, onboarding_lookup, x_week_lookback, tolerance, match_index, min_match_score, progress:
+        As in reconcile_invoice(), shared by every task order.
+
+    Returns:
+    - tuple: A dict of the ReconciledInvoice of each task order, and a frame with the
+        flagged rows of all task orders with the columns in COMBINED_FLAG_COLUMNS.
+
+    Raises:
+    - ValueError: If a task order has no profile in TASK_ORDER_PROFILES.
+
+    The WSR and Onboarding Tracker are parsed and indexed once, and each invoice is
+    reconciled with the hours column of its own profile.
+
+    Example usage:
+    results, combined_flags = reconcile_task_orders({"TO29": to29_invoice, "TO32": to32_invoice}, wsr_index, onboarding_lookup, 4)
+    """
+    results = {}
+    flagged = []
+    for task_order, raw_invoice in raw_invoices.items():
+        if task_order not in TASK_ORDER_PROFILES:
+            raise ValueError(f'Unknown task order "{task_order}", expected one of {list(TASK_ORDER_PROFILES)}.')
+        hours_column = TASK_ORDER_PROFILES[task_order]["hours_column"]
+        result = reconcile_invoice(
+            raw_invoice, hours_column, wsr_index, onboarding_lookup, x_week_lookback, tolerance, match_index, min_match_score, progress
+        )
+        results[task_order] = result
+        flagged.append(flagged_rows(task_order, result, hours_column))
+
+    combined_flags = pd.concat(flagged, ignore_index=True) if flagged else pd.DataFrame(columns=COMBINED_FLAG_COLUMNS)
+    return results, combined_flags
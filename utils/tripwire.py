@@ -0,0 +1,96 @@
+import pandas as pd
+
+from utils.loaders import parsed_frame_cache, read_excel_from_header, read_excel_sheets
+from utils.names import name_keys, normalize_names
+
+# Sheet of the Onboarding Tracker listing the approved tripwire exceptions
+TRIPWIRE_SHEET_NAME = "Tripwire Tracker"
+
+# Columns of the tripwire review result
+TRIPWIRE_RESULT_COLUMNS = ["Unique ID", "Name", "PLC Desc", "Correct LCAT Syntax", "Hourly Cost $/hr", "Above Tripwire Rate?"]
+
+
+def load_tripwire_inputs(tracker_file, hourly_cost_file, hourly_cost_sheet_name, cache=parsed_frame_cache, progress=None):
+    """
+    Load the sheets used by the tripwire review.
+
+    Parameters:
+    - tracker_file (str or file-like): The Onboarding Tracker Excel file.
+    - hourly_cost_file (str or file-like): The Hourly Cost Excel file.
+    - hourly_cost_sheet_name (str): The sheet of the Hourly Cost file to read.
+    - cache (ParsedFrameCache, optional): The parsed workbook cache (default is parsed_frame_cache).
+    - progress (callable, optional): Called with 0 rows before and after each workbook is read,
+        for example Job.progress, so a cancelled job stops between the workbooks (default is None).
+
+    Returns:
+    - tuple: The Tripwire Tracker sheet (from its "Candidate Name" header row), the Hourly
+        Cost sheet (from its "Name" header row) and the LCAT Normalization sheet.
+
+    The Onboarding Tracker is opened once for both of its sheets.
+
+    Example usage:
+    tracker_df, hourly_cost_df, lcat_df = load_tripwire_inputs(tracker_file, hourly_cost_file, "Sheet1")
+    """
+    if progress is not None:
+        progress(0)
+    tracker_sheets = read_excel_sheets(tracker_file, {TRIPWIRE_SHEET_NAME: "Candidate Name", "LCAT Normalization": None}, cache=cache)
+    if progress is not None:
+        progress(0)
+    hourly_cost_df = read_excel_from_header(hourly_cost_file, "Name", hourly_cost_sheet_name, cache=cache)
+    if progress is not None:
+        progress(0)
+    return tracker_sheets[TRIPWIRE_SHEET_NAME], hourly_cost_df, tracker_sheets["LCAT Normalization"]
+
+
+def review_tripwire(tracker_df, hourly_cost_df, lcat_df, progress=None):
+    """
+    Find the candidates above the tripwire rate without a Final Approval.
+
+    Parameters:
+    - tracker_df (pd.DataFrame): The Tripwire Tracker sheet of the Onboarding Tracker.
+    - hourly_cost_df (pd.DataFrame): The Hourly Cost sheet.
+    - lcat_df (pd.DataFrame): The LCAT Normalization sheet of the Onboarding Tracker.
+    - progress (callable, optional): Called with the number of Hourly Cost rows once they are
+        reviewed, for example Job.progress (default is None).
+
+    Returns:
+    - tuple: The result with the columns in TRIPWIRE_RESULT_COLUMNS, and the cleaned Hourly
+        Cost frame (with "Correct LCAT Syntax") used by the charts.
+
+    Raises:
+    - KeyError: If a sheet is missing one of the columns used by the review.
+
+    Example usage:
+    result_df, hourly_cost_df = review_tripwire(tracker_df, hourly_cost_df, lcat_df)
+    """
+    tracker_df = tracker_df.reset_index(drop=True)[["Candidate Name", "Final Approval"]].copy()
+    hourly_cost_df = hourly_cost_df.reset_index(drop=True)[["Unique ID", "Name", "PLC Desc", "Hourly Cost $/hr", "Above Tripwire Rate?"]].copy()
+
+    # Convert the "Hourly Cost $/hr" column to numeric and round it to two decimal places
+    hourly_cost_df["Hourly Cost $/hr"] = pd.to_numeric(hourly_cost_df["Hourly Cost $/hr"], errors="coerce").round(2)
+
+    # Keep the LCAT Normalization columns from the Onboarding Tracker
+    lcat_df = lcat_df[["Vendor LCATs", "Correct LCAT Syntax"]]
+
+    # Remove middle initials from names in both DataFrames
+    tracker_df["Candidate Name"] = normalize_names(tracker_df["Candidate Name"])
+    hourly_cost_df["Name"] = normalize_names(hourly_cost_df["Name"])
+
+    # Filter Data
+    filtered_tripwire_df = tracker_df[tracker_df["Final Approval"] == "Y"]
+    names_above_tripwire = hourly_cost_df[hourly_cost_df["Above Tripwire Rate?"] == "Yes"]["Name"]
+    names_allow_exceed_tripwire = filtered_tripwire_df["Candidate Name"]
+    names_not_in_tripwire = names_above_tripwire[~name_keys(names_above_tripwire).isin(name_keys(names_allow_exceed_tripwire))]
+
+    # Remove newline characters from the "PLC Desc" column
+    hourly_cost_df["PLC Desc"] = hourly_cost_df["PLC Desc"].str.strip()
+
+    # Map the "PLC Desc" column to the corrected LCAT syntax
+    lcat_mapping = lcat_df.set_index("Vendor LCATs")["Correct LCAT Syntax"].to_dict()
+    hourly_cost_df["Correct LCAT Syntax"] = hourly_cost_df["PLC Desc"].map(lcat_mapping)
+
+    # Filter again
+    filtered_hourly_cost_df = hourly_cost_df[hourly_cost_df["Unique ID"].isin(names_not_in_tripwire)]
+    if progress is not None:
+        progress(len(hourly_cost_df))
+    return filtered_hourly_cost_df[TRIPWIRE_RESULT_COLUMNS], hourly_cost_df